@@ -1,17 +1,27 @@
 # prompts/stage4.py
 
-def get_prompt4_layout_feedback(section, position_table):
+def get_prompt4_layout_feedback(section, position_table, keyframes=False, layout_conflicts=""):
+    media_note = (
+        "- 视频以关键帧形式提供：按时间顺序排列，每帧左上角标注了序号和时间戳，最后一帧是视频结束时的画面。\n"
+        if keyframes
+        else ""
+    )
+    conflicts_note = (
+        f"- 静态布局检查发现以下具体问题，请在画面中逐条核实，并优先给出修复方案:\n{layout_conflicts}\n"
+        if layout_conflicts
+        else ""
+    )
     return f"""
 1. 分析要求 (ANALYSIS REQUIREMENTS):
 - 请仅从**布局(Layout)**和**空间位置(Spatial Positioning)**的角度分析这个 Manim 教育视频。
-- 参考提供的网格图进行精确的空间分析。
+{media_note}- 参考提供的网格图进行精确的空间分析。
 - 核心目标：消除遮挡、重叠，并优化网格空间的利用率。
 
 2. 内容上下文 (Content Context):
 - 标题: {section.title}
 - 讲解词: {'; '.join(section.lecture_lines)}
 - 当前网格占用情况: {position_table}
-
+{conflicts_note}
 3. 视觉锚点系统 (6*6 grid, 仅右侧区域):
 lecture | A1 A2 A3 A4 A5 A6 | B1 B2 B3 B4 B5 B6 | C1 C2 C3 C4 C5 C6 | D1 D2 D3 D4 D5 D6 | E1 E2 E3 E4 E5 E6 | F1 F2 F3 F4 F5 F6
 
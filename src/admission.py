@@ -0,0 +1,173 @@
+import threading
+from typing import Any, Dict, Optional
+
+
+RENDER_MEMORY_MB = 1024  # 单个 Manim 渲染的初始内存估计，运行中按实测 RSS 修正
+MEMORY_RESERVE_FRACTION = 0.1  # 始终留给系统和其他进程的内存比例
+HIGH_LOAD = 95.0  # CPU 使用率高于该值时每次采样收缩一个渲染名额
+LOW_LOAD = 80.0  # 低于该值且内存允许时每次采样放开一个名额
+SAMPLE_INTERVAL = 1.0
+
+
+class AdmissionController:
+    """Admits Manim renders and LLM-bound tasks only while memory headroom and CPU load allow.
+
+    A daemon thread samples system CPU, available memory and the RSS of the render processes
+    (the children of the pool workers) every `interval` seconds. The number of renders allowed
+    to run at once moves between `min_renders` and `max_renders`: it drops at once to what the
+    memory headroom can hold, shrinks by one while the CPU is saturated and grows back one step
+    at a time. LLM tasks only wait while memory is below the reserve. Without psutil every
+    task is admitted, up to `max_renders` renders.
+    """
+
+    def __init__(
+        self,
+        max_renders: int,
+        min_renders: int = 1,
+        render_memory_mb: float = RENDER_MEMORY_MB,
+        reserve_fraction: float = MEMORY_RESERVE_FRACTION,
+        high_load: float = HIGH_LOAD,
+        low_load: float = LOW_LOAD,
+        interval: float = SAMPLE_INTERVAL,
+    ):
+        try:
+            import psutil
+        except ImportError:
+            print("⚠️ 未安装 psutil，渲染准入控制退化为固定并发")
+            psutil = None
+        self._psutil = psutil
+        self.max_renders = max(1, max_renders)
+        self.min_renders = max(1, min(min_renders, self.max_renders))
+        self.render_memory = render_memory_mb * 2**20
+        self.reserve_fraction = reserve_fraction
+        self.high_load = high_load
+        self.low_load = low_load
+        self.interval = interval
+
+        self.limit = self.max_renders
+        self.memory_ok = True
+        self.cpu_percent = 0.0
+        self.available = None
+        self.active = {"render": 0, "llm": 0}
+        self.waits = {"render": 0, "llm": 0}
+        self.shrinks = 0
+        self.grows = 0
+        self.lowest_limit = self.limit
+
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = None
+        if psutil is not None:
+            psutil.cpu_percent(None)  # 第一次调用只建立基准
+            self._thread = threading.Thread(target=self._run, name="admission", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.sample()
+            except Exception as e:
+                print(f"⚠️ 资源采样失败: {e}")
+
+    def _largest_render_rss(self) -> int:
+        """RSS of the biggest process below the pool workers: a forked render or a manim CLI"""
+        psutil = self._psutil
+        largest = 0
+        try:
+            workers = psutil.Process().children()
+        except psutil.Error:
+            return 0
+        for worker in workers:
+            try:
+                for proc in worker.children(recursive=True):
+                    largest = max(largest, proc.memory_info().rss)
+            except psutil.Error:
+                continue
+        return largest
+
+    def sample(self) -> None:
+        """Take one reading and recompute the render limit"""
+        psutil = self._psutil
+        cpu = psutil.cpu_percent(None)
+        memory = psutil.virtual_memory()
+        largest = self._largest_render_rss()
+        with self._cond:
+            # 估计值向实测峰值看齐：涨得快、降得慢
+            if largest:
+                self.render_memory = max(largest, 0.95 * self.render_memory)
+            headroom = memory.available - self.reserve_fraction * memory.total
+            memory_limit = self.active["render"] + int(max(headroom, 0) // self.render_memory)
+
+            limit = self.limit
+            if cpu > self.high_load:
+                limit -= 1
+            elif cpu < self.low_load:
+                limit += 1
+            limit = max(self.min_renders, min(self.max_renders, limit, memory_limit))
+            if limit < self.limit:
+                self.shrinks += 1
+            elif limit > self.limit:
+                self.grows += 1
+            self.limit = limit
+            self.lowest_limit = min(self.lowest_limit, limit)
+            self.memory_ok = headroom > 0
+            self.cpu_percent = cpu
+            self.available = memory.available
+            self._cond.notify_all()
+
+    def _admissible(self, kind: str) -> bool:
+        if kind == "render":
+            return self.active["render"] < self.limit
+        # LLM 任务几乎不占 CPU，只在内存见底时排队；总保证至少一个在跑
+        return self.memory_ok or self.active["llm"] == 0
+
+    def acquire(self, kind: str = "render") -> None:
+        """Block until a task of `kind` ("render" or "llm") may start"""
+        with self._cond:
+            waited = False
+            while not self._admissible(kind):
+                waited = True
+                self._cond.wait(self.interval)
+            self.active[kind] += 1
+            if waited:
+                self.waits[kind] += 1
+
+    def release(self, kind: str = "render") -> None:
+        with self._cond:
+            self.active[kind] -= 1
+            self._cond.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "render_limit": self.limit,
+                "render_limit_lowest": self.lowest_limit,
+                "render_memory_mb": round(self.render_memory / 2**20),
+                "cpu_percent": self.cpu_percent,
+                "available_mb": round(self.available / 2**20) if self.available is not None else None,
+                "render_waits": self.waits["render"],
+                "llm_waits": self.waits["llm"],
+                "shrinks": self.shrinks,
+                "grows": self.grows,
+            }
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+
+def create_admission_controller(max_renders: int) -> Optional[AdmissionController]:
+    """Controller configured from the "admission" section of api_config.json, or None when disabled"""
+    from llm_client import cfg
+
+    if str(cfg("admission", "enabled", "1")).lower() in ("0", "false", "no", "off"):
+        return None
+    return AdmissionController(
+        max_renders,
+        min_renders=int(cfg("admission", "min_renders", 1)),
+        render_memory_mb=float(cfg("admission", "render_memory_mb", RENDER_MEMORY_MB)),
+        reserve_fraction=float(cfg("admission", "reserve_fraction", MEMORY_RESERVE_FRACTION)),
+        high_load=float(cfg("admission", "high_load", HIGH_LOAD)),
+        low_load=float(cfg("admission", "low_load", LOW_LOAD)),
+    )
@@ -7,19 +7,32 @@ import re
 import argparse
 import json
 import time
-import random
 import subprocess
 import shutil
+import asyncio
+import threading
+from collections import OrderedDict
+from functools import lru_cache
 from typing import List, Dict, Any, Optional, Tuple, Callable
 from dataclasses import dataclass
 from pathlib import Path
-from concurrent.futures import ProcessPoolExecutor, as_completed, ThreadPoolExecutor
+from concurrent.futures import ProcessPoolExecutor, as_completed, ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 from gpt_request import *
+from llm_client import llm_usage_stats, response_cache_stats
 from prompts import *
 from utils import *
 from scope_refine import *
 from external_assets import process_storyboard_with_assets
+from scheduler import WorkScheduler
+from render_pool import DRY_RUN_TIMEOUT, QUALITY_FPS, QUALITY_HEIGHTS, RenderResult, dry_run_scene, init_render_worker, render_scene
+from render_cache import get_render_cache
+from render_budget import get_render_budget
+from run_manifest import RunManifest, atomic_write_json, atomic_write_text, content_hash
+from layout_check import LayoutReport, check_layout
+from local_fixer import get_local_fixer
+from fix_memo import get_fix_memo
+from code_validator import ValidationResult, validate_section_code
 
 
 @dataclass
@@ -46,6 +59,13 @@ class VideoFeedback:
     raw_response: Optional[str] = None
 
 
+# 第 2、3、... 份候选代码的采样温度
+CANDIDATE_TEMPERATURES = [0.7, 0.9, 1.0]
+PREVIEW_RENDER_TIMEOUT = 300
+FINAL_RENDER_TIMEOUT = 1800  # 成品画质渲染比调试时慢得多
+FINAL_RENDER_ATTEMPTS = 2  # 成品渲染失败（非超时）时重试一次
+
+
 @dataclass
 class RunConfig:
     use_feedback: bool = True
@@ -58,6 +78,38 @@ class RunConfig:
     max_regenerate_tries: int = 10
     max_feedback_gen_code_tries: int = 3
     max_mllm_fix_bugs_tries: int = 3
+    async_api: Callable = None
+    feedback_max_frames: int = 8
+    static_layout_check: bool = True
+    feedback_mode: str = "mllm"  # "mllm": 多模态模型评审；"local": 本地逐帧像素分析，不调用 API
+    speculative_fixes: int = 1  # > 1 时 ScopeRefine 并发请求多个候选修复，取第一个通过验证的
+    code_candidates: int = 1  # > 1 时每个小节并发生成多份代码，取第一份通过校验和试运行的
+    render_ladder: bool = True  # 调试阶段只试运行 / 渲染低帧率预览，代码定稿后再渲染一次成品
+    preview_fps: int = 5  # 供反馈评审的预览视频帧率
+    final_quality: str = "h"  # 成品渲染画质 (manim -q 标志)
+
+
+@dataclass
+class RenderTask:
+    """One section for a render worker: only what differs per section is pickled.
+
+    The agent class and RunConfig are installed in each worker once by init_agent_render_worker;
+    `shared` carries them only for pools started without that state.
+    """
+
+    section: Section
+    idx: int
+    knowledge_point: str
+    folder: Any
+    code: Optional[str] = None
+    shared: Optional[Tuple[type, RunConfig]] = None
+
+
+@lru_cache(maxsize=None)
+def _load_ref_mapping(path: str) -> Dict[str, str]:
+    """long_video_ref_mapping.json, read once per process (read-only)"""
+    with open(path) as f:
+        return json.load(f)
 
 
 class TeachingVideoAgent:
@@ -87,6 +139,13 @@ class TeachingVideoAgent:
         self.max_regenerate_tries = cfg.max_regenerate_tries
         self.max_feedback_gen_code_tries = cfg.max_feedback_gen_code_tries
         self.max_mllm_fix_bugs_tries = cfg.max_mllm_fix_bugs_tries
+        self.feedback_max_frames = cfg.feedback_max_frames
+        self.static_layout_check = cfg.static_layout_check
+        self.feedback_mode = cfg.feedback_mode
+        self.code_candidates = cfg.code_candidates
+        self.render_ladder = cfg.render_ladder
+        self.preview_fps = cfg.preview_fps
+        self.final_quality = cfg.final_quality
 
         """2. Path for output"""
         self.output_dir = get_output_dir(idx=idx, knowledge_point=self.learning_topic, base_dir=folder)
@@ -96,15 +155,16 @@ class TeachingVideoAgent:
         self.assets_dir.mkdir(exist_ok=True)
 
         """3. ScopeRefine & Anchor Visual"""
-        self.scope_refine_fixer = ScopeRefineFixer(self.API, self.max_code_token_length)
+        self.scope_refine_fixer = ScopeRefineFixer(self.API, self.max_code_token_length, cfg.speculative_fixes)
+        # 流水线运行期间的共享调度器；候选代码的试运行经它的渲染进程池执行
+        self.scheduler: Optional[WorkScheduler] = None
         self.extractor = GridPositionExtractor()
 
         """4. External Database"""
         knowledge_ref_mapping_path = (
             Path(*self.output_dir.parts[: self.output_dir.parts.index("CASES")]) / "json_files" / "long_video_ref_mapping.json"
         )
-        with open(knowledge_ref_mapping_path) as f:
-            self.KNOWLEDGE2PATH = json.load(f)
+        self.KNOWLEDGE2PATH = _load_ref_mapping(str(knowledge_ref_mapping_path))
         self.knowledge_ref_img_folder = (
             Path(*self.output_dir.parts[: self.output_dir.parts.index("CASES")]) / "assets" / "reference"
         )
@@ -120,152 +180,219 @@ class TeachingVideoAgent:
 
         """6. For Efficiency"""
         self.token_usage = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+        self.manifest = RunManifest(self.output_dir)
 
-    def _request_api_and_track_tokens(self, prompt, max_tokens=10000):
-        """packages API requests and automatically accumulates token usage"""
-        response, usage = self.API(prompt, max_tokens=max_tokens)
+    def _track_tokens(self, usage):
         if usage:
             self.token_usage["prompt_tokens"] += usage.get("prompt_tokens", 0)
             self.token_usage["completion_tokens"] += usage.get("completion_tokens", 0)
             self.token_usage["total_tokens"] += usage.get("total_tokens", 0)
+
+    def _request_api_and_track_tokens(self, prompt, max_tokens=10000, use_cache=True):
+        """packages API requests and automatically accumulates token usage"""
+        response, usage = self.API(prompt, max_tokens=max_tokens, use_cache=use_cache)
+        self._track_tokens(usage)
+        return response
+
+    async def _arequest_api_and_track_tokens(self, prompt, max_tokens=10000, use_cache=True):
+        """Async counterpart of _request_api_and_track_tokens, backed by cfg.async_api"""
+        response, usage = await self.cfg.async_api(prompt, max_tokens=max_tokens, use_cache=use_cache)
+        self._track_tokens(usage)
         return response
 
     def _request_video_api_and_track_tokens(self, prompt, video_path):
         """Wraps video API requests and accumulates token usage automatically"""
         response, usage = request_gemini_video_img_token(prompt=prompt, video_path=video_path, image_path=self.GRID_IMG_PATH)
+        self._track_tokens(usage)
+        return response
 
-        if usage:
-            self.token_usage["prompt_tokens"] += usage.get("prompt_tokens", 0)
-            self.token_usage["completion_tokens"] += usage.get("completion_tokens", 0)
-            self.token_usage["total_tokens"] += usage.get("total_tokens", 0)
+    def _extract_feedback_frames(self, video_path):
+        """Keyframes the layout critic gets instead of the whole video; [] means upload the video"""
+        if self.feedback_max_frames <= 0:
+            return []
+        # keyframes / frame_layout 依赖 cv2 和 numpy，只在真正看视频时导入
+        from keyframes import KeyframeOptions, extract_keyframes
+
+        try:
+            options = KeyframeOptions(max_frames=self.feedback_max_frames)
+            return extract_keyframes(video_path, self.output_dir / "keyframes", options)
+        except Exception as e:
+            print(f"⚠️ {self.learning_topic} 关键帧抽取失败，改为上传整段视频: {e}")
+            return []
+
+    def _request_frames_api_and_track_tokens(self, prompt, frame_paths):
+        response, usage = request_gemini_frames_img_token(prompt=prompt, frame_paths=frame_paths, image_path=self.GRID_IMG_PATH)
+        self._track_tokens(usage)
         return response
 
     def get_serializable_state(self):
         """返回可以序列化保存的Agent状态"""
         return {"idx": self.idx, "knowledge_point": self.learning_topic, "folder": self.folder, "cfg": self.cfg}
 
-    def generate_outline(self) -> TeachingOutline:
+    def _render_task(self, section: Section, worker_state=None) -> RenderTask:
+        """Task for render_section_task; the agent class and cfg ride along unless `worker_state` says the workers hold them"""
+        shared = (self.__class__, self.cfg)
+        return RenderTask(
+            section=section,
+            idx=self.idx,
+            knowledge_point=self.learning_topic,
+            folder=self.folder,
+            code=self.section_codes.get(section.id),
+            shared=None if worker_state == shared else shared,
+        )
+
+    @staticmethod
+    def _response_text(response) -> str:
+        try:
+            return response.candidates[0].content.parts[0].text
+        except Exception:
+            try:
+                return response.choices[0].message.content
+            except Exception:
+                return str(response)
+
+    def _reference_image_path(self):
+        img_name = self.KNOWLEDGE2PATH.get(self.learning_topic)
+        return self.knowledge_ref_img_folder / img_name if img_name is not None else None
+
+    def _stage_inputs_hash(self, stage: str, prompt: str) -> str:
+        """Inputs of an LLM stage: its full prompt (which embeds all upstream outputs) and the model callback"""
+        return content_hash(stage, prompt, getattr(self.API, "__name__", repr(self.API)))
+
+    def _build_outline_prompt(self) -> str:
+        return get_prompt1_outline(knowledge_point=self.learning_topic, reference_image_path=self._reference_image_path())
+
+    def _save_outline_response(self, response) -> Optional[dict]:
+        """Parse the outline JSON from an API response and save it; None if the format is invalid"""
+        content = extract_json_from_markdown(self._response_text(response))
+        try:
+            outline_data = json.loads(content)
+        except json.JSONDecodeError:
+            return None
+        atomic_write_json(self.output_dir / "outline.json", outline_data)
+        self.manifest.complete("outline", self._stage_inputs_hash("outline", self._build_outline_prompt()), ["outline.json"])
+        return outline_data
+
+    def _set_outline(self, outline_data: dict) -> TeachingOutline:
+        self.outline = TeachingOutline(
+            topic=outline_data["topic"],
+            target_audience=outline_data["target_audience"],
+            sections=outline_data["sections"],
+        )
+        print(f"== 大纲已生成: {self.outline.topic}")
+        return self.outline
+
+    def _load_cached_outline(self) -> Optional[dict]:
         outline_file = self.output_dir / "outline.json"
+        inputs_hash = self._stage_inputs_hash("outline", self._build_outline_prompt())
+        if not self.manifest.is_fresh("outline", inputs_hash, ["outline.json"]):
+            return None
+        print("📂 正在读取大纲...")
+        with open(outline_file, "r", encoding="utf-8") as f:
+            return json.load(f)
 
-        if outline_file.exists():
-            print("📂 正在读取大纲...")
-            with open(outline_file, "r", encoding="utf-8") as f:
-                outline_data = json.load(f)
-        else:
+    def generate_outline(self) -> TeachingOutline:
+        outline_data = self._load_cached_outline()
+
+        if outline_data is None:
             """Step 1: Generate teaching outline from topic"""
-            refer_img_path = (
-                self.knowledge_ref_img_folder / img_name
-                if (img_name := self.KNOWLEDGE2PATH.get(self.learning_topic)) is not None
-                else None
-            )
-            prompt1 = get_prompt1_outline(knowledge_point=self.learning_topic, reference_image_path=refer_img_path)
+            prompt1 = self._build_outline_prompt()
+            self.manifest.begin("outline", self._stage_inputs_hash("outline", prompt1))
 
             print(f"📝 正在生成大纲...")
 
             for attempt in range(1, self.max_regenerate_tries + 1):
-                api_func = self._request_api_and_track_tokens if refer_img_path else self._request_api_and_track_tokens
-                response = api_func(prompt1, max_tokens=self.max_code_token_length)
+                # 重试时绕过响应缓存，否则会反复拿到同一个无效回答
+                response = self._request_api_and_track_tokens(
+                    prompt1, max_tokens=self.max_code_token_length, use_cache=attempt == 1
+                )
                 if response is None:
                     print(f"⚠️ 第 {attempt} 次尝试失败，正在重试...")
                     if attempt == self.max_regenerate_tries:
                         raise ValueError("API 请求多次失败")
                     continue
-                try:
-                    content = response.candidates[0].content.parts[0].text
-                except Exception:
-                    try:
-                        content = response.choices[0].message.content
-                    except Exception:
-                        content = str(response)
-                content = extract_json_from_markdown(content)
-                try:
-                    outline_data = json.loads(content)
-                    with open(self.output_dir / "outline.json", "w", encoding="utf-8") as f:
-                        json.dump(outline_data, f, ensure_ascii=False, indent=2)
+                outline_data = self._save_outline_response(response)
+                if outline_data is not None:
                     break
-                except json.JSONDecodeError:
-                    print(f"⚠️ 第 {attempt} 次尝试大纲格式无效，正在重试...")
-                    if attempt == self.max_regenerate_tries:
-                        raise ValueError("大纲格式多次无效，请检查提示词或 API 响应")
+                print(f"⚠️ 第 {attempt} 次尝试大纲格式无效，正在重试...")
+                if attempt == self.max_regenerate_tries:
+                    raise ValueError("大纲格式多次无效，请检查提示词或 API 响应")
 
-        self.outline = TeachingOutline(
-            topic=outline_data["topic"],
-            target_audience=outline_data["target_audience"],
-            sections=outline_data["sections"],
+        return self._set_outline(outline_data)
+
+    def _build_storyboard_prompt(self) -> str:
+        return get_prompt2_storyboard(
+            outline=json.dumps(self.outline.__dict__, ensure_ascii=False, indent=2),
+            reference_image_path=self._reference_image_path(),
         )
-        print(f"== 大纲已生成: {self.outline.topic}")
-        return self.outline
 
-    def generate_storyboard(self) -> List[Section]:
-        """Step 2: Generate teaching storyboard from outline (optionally with asset enhancement)"""
-        if not self.outline:
-            raise ValueError("大纲未生成，请先生成大纲")
+    def _save_storyboard_response(self, response) -> Optional[dict]:
+        """Parse the storyboard JSON from an API response and save it; None if the format is invalid"""
+        json_str = extract_json_from_markdown(self._response_text(response))
+        try:
+            storyboard_data = json.loads(json_str)
+        except json.JSONDecodeError:
+            return None
+        atomic_write_json(self.output_dir / "storyboard.json", storyboard_data)
+        inputs_hash = self._stage_inputs_hash("storyboard", self._build_storyboard_prompt())
+        self.manifest.complete("storyboard", inputs_hash, ["storyboard.json"])
+        return storyboard_data
 
+    def _load_cached_storyboard(self) -> Tuple[Optional[dict], bool]:
+        """Return (storyboard, already_enhanced) from disk, or (None, False) if nothing fresh is saved yet"""
         storyboard_file = self.output_dir / "storyboard.json"
         enhanced_storyboard_file = self.output_dir / "storyboard_with_assets.json"
 
-        if enhanced_storyboard_file.exists():
+        inputs_hash = self._stage_inputs_hash("storyboard", self._build_storyboard_prompt())
+        if not self.manifest.is_fresh("storyboard", inputs_hash, ["storyboard.json"]):
+            return None, False
+        with open(storyboard_file, "r", encoding="utf-8") as f:
+            storyboard_data = json.load(f)
+
+        if self.manifest.is_fresh("assets", content_hash("assets", storyboard_data), ["storyboard_with_assets.json"]):
             print("📂 发现已增强的分镜脚本，正在加载...")
             with open(enhanced_storyboard_file, "r", encoding="utf-8") as f:
-                self.enhanced_storyboard = json.load(f)
-        elif storyboard_file.exists():
-            print("📂 发现分镜脚本，正在加载...")
-            with open(storyboard_file, "r", encoding="utf-8") as f:
-                storyboard_data = json.load(f)
-            if self.use_assets:
-                self.enhanced_storyboard = self._enhance_storyboard_with_assets(storyboard_data)
-            else:
-                self.enhanced_storyboard = storyboard_data
-        else:
-            print("🎬 正在生成分镜脚本...")
-            refer_img_path = (
-                self.knowledge_ref_img_folder / img_name
-                if (img_name := self.KNOWLEDGE2PATH.get(self.learning_topic)) is not None
-                else None
-            )
+                return json.load(f), True
+        print("📂 发现分镜脚本，正在加载...")
+        return storyboard_data, False
 
-            prompt2 = get_prompt2_storyboard(
-                outline=json.dumps(self.outline.__dict__, ensure_ascii=False, indent=2),
-                reference_image_path=refer_img_path,
-            )
+    def generate_storyboard(self) -> List[Section]:
+        """Step 2: Generate teaching storyboard from outline (optionally with asset enhancement)"""
+        if not self.outline:
+            raise ValueError("大纲未生成，请先生成大纲")
+
+        storyboard_data, enhanced = self._load_cached_storyboard()
+
+        if storyboard_data is None:
+            print("🎬 正在生成分镜脚本...")
+            prompt2 = self._build_storyboard_prompt()
+            self.manifest.begin("storyboard", self._stage_inputs_hash("storyboard", prompt2))
 
             for attempt in range(1, self.max_regenerate_tries + 1):
-                api_func = self._request_api_and_track_tokens
-                response = api_func(prompt2, max_tokens=self.max_code_token_length)
+                response = self._request_api_and_track_tokens(
+                    prompt2, max_tokens=self.max_code_token_length, use_cache=attempt == 1
+                )
                 if response is None:
                     print(f"⚠️ 第 {attempt} 次尝试 API 请求失败，正在重试...")
                     if attempt == self.max_regenerate_tries:
                         raise ValueError("API 请求多次失败")
                     continue
 
-                try:
-                    content = response.candidates[0].content.parts[0].text
-                except Exception:
-                    try:
-                        content = response.choices[0].message.content
-                    except Exception:
-                        content = str(response)
-
-                try:
-                    json_str = extract_json_from_markdown(content)
-                    storyboard_data = json.loads(json_str)
-
-                    # Save original storyboard
-                    with open(storyboard_file, "w", encoding="utf-8") as f:
-                        json.dump(storyboard_data, f, ensure_ascii=False, indent=2)
-
-                    # Enhance storyboard (add assets)
-                    if self.use_assets:
-                        self.enhanced_storyboard = self._enhance_storyboard_with_assets(storyboard_data)
-                    else:
-                        self.enhanced_storyboard = storyboard_data
+                storyboard_data = self._save_storyboard_response(response)
+                if storyboard_data is not None:
                     break
+                print(f"⚠️ 第 {attempt} 次尝试分镜格式无效，正在重试...")
+                if attempt == self.max_regenerate_tries:
+                    raise ValueError("分镜格式多次无效，请检查提示词或 API 响应")
 
-                except json.JSONDecodeError:
-                    print(f"⚠️ 第 {attempt} 次尝试分镜格式无效，正在重试...")
-                    if attempt == self.max_regenerate_tries:
-                        raise ValueError("分镜格式多次无效，请检查提示词或 API 响应")
+        # Enhance storyboard (add assets)
+        if enhanced or not self.use_assets:
+            self.enhanced_storyboard = storyboard_data
+        else:
+            self.enhanced_storyboard = self._enhance_storyboard_with_assets(storyboard_data)
+        return self._set_sections()
 
+    def _set_sections(self) -> List[Section]:
         # Parse into Section objects (using enhanced storyboard)
         self.sections = []
         for section_data in self.enhanced_storyboard["sections"]:
@@ -283,6 +410,8 @@ class TeachingVideoAgent:
     def _enhance_storyboard_with_assets(self, storyboard_data: dict) -> dict:
         """Enhance storyboard: smart analysis and download assets"""
         print("🤖 正在增强分镜：智能分析并下载素材...")
+        inputs_hash = content_hash("assets", storyboard_data)
+        self.manifest.begin("assets", inputs_hash)
 
         try:
             enhanced_storyboard = process_storyboard_with_assets(
@@ -291,9 +420,8 @@ class TeachingVideoAgent:
                 assets_dir=str(self.assets_dir),
                 iconfinder_api_key=self.iconfinder_api_key,
             )
-            enhanced_storyboard_file = self.output_dir / "storyboard_with_assets.json"
-            with open(enhanced_storyboard_file, "w", encoding="utf-8") as f:
-                json.dump(enhanced_storyboard, f, ensure_ascii=False, indent=2)
+            atomic_write_json(self.output_dir / "storyboard_with_assets.json", enhanced_storyboard)
+            self.manifest.complete("assets", inputs_hash, ["storyboard_with_assets.json"])
             print("✅ 分镜已增强素材")
             return enhanced_storyboard
 
@@ -301,16 +429,65 @@ class TeachingVideoAgent:
             print(f"⚠️ 素材下载失败，使用原始分镜: {e}")
             return storyboard_data
 
-    def generate_section_code(self, section: Section, attempt: int = 1, feedback_improvements=None) -> str:
-        """Generate Manim code for a single section"""
+    def _code_inputs_hash(self, section: Section) -> str:
+        return self._stage_inputs_hash("code", get_prompt3_code(regenerate_note="", section=section, base_class=base_class))
+
+    def _load_cached_section_code(self, section: Section) -> Optional[str]:
         code_file = self.output_dir / f"{section.id}.py"
+        if not self.manifest.is_fresh(f"code:{section.id}", self._code_inputs_hash(section), [code_file.name]):
+            return None
+        print(f"📂 发现 {section.id} 的现有代码，正在读取...")
+        with open(code_file, "r", encoding="utf-8") as f:
+            code = f.read()
+        self.section_codes[section.id] = code
+        return code
+
+    def _extract_code(self, response) -> str:
+        """Manim code from an API response, with the base class injected and asset paths fixed"""
+        code = self._response_text(response)
+        if "```python" in code:
+            code = code.split("```python")[1].split("```")[0].strip()
+        elif "```" in code:
+            code = code.split("```")[1].strip()
+
+        # Replace base class
+        code = replace_base_class(code, base_class)
+        return fix_png_path(code, self.assets_dir)
+
+    def _save_code_response(self, section: Section, response) -> str:
+        """Extract the Manim code from an API response, inject the base class and save it"""
+        code = self._prevalidate_code(section.id, self._extract_code(response)).code
+        return self._store_generated_code(section, code)
+
+    def _store_generated_code(self, section: Section, code: str) -> str:
+        atomic_write_text(self.output_dir / f"{section.id}.py", code)
+        self.manifest.complete(f"code:{section.id}", self._code_inputs_hash(section), [f"{section.id}.py"])
 
-        if attempt == 1 and code_file.exists() and not feedback_improvements:
-            print(f"📂 发现 {section.id} 的现有代码，正在读取...")
-            with open(code_file, "r", encoding="utf-8") as f:
-                code = f.read()
-                self.section_codes[section.id] = code
+        self.section_codes[section.id] = code
+        return code
+
+    def _prevalidate_code(self, section_id: str, code: str) -> ValidationResult:
+        """Static check + deterministic repair of section code, run before anything is rendered"""
+        check = validate_section_code(code)
+        for repair in check.repairs:
+            print(f"🩺 {section_id} 静态校验: {repair}")
+        if check.issues:
+            print(f"⚠️ {section_id} 静态校验发现 {len(check.issues)} 个问题: {check.issues[0].describe()}")
+        return check
+
+    def _write_section_code(self, section_id: str, code: str) -> None:
+        """Persist a rewritten version (fixed / feedback-modified / rolled back) of a section's code"""
+        atomic_write_text(self.output_dir / f"{section_id}.py", code)
+        self.section_codes[section_id] = code
+        self.manifest.update_outputs(f"code:{section_id}", [f"{section_id}.py"])
+
+    def generate_section_code(self, section: Section, attempt: int = 1, feedback_improvements=None) -> str:
+        """Generate Manim code for a single section"""
+        if attempt == 1 and not feedback_improvements:
+            code = self._load_cached_section_code(section)
+            if code is not None:
                 return code
+            self.manifest.begin(f"code:{section.id}", self._code_inputs_hash(section))
         # print(f"💻 正在为 {section.id} 生成 Manim 代码 (尝试 {attempt}/{self.max_regenerate_tries})...")
         regenerate_note = ""
         if attempt > 1:
@@ -323,10 +500,7 @@ class TeachingVideoAgent:
                 modifier = GridCodeModifier(current_code)
                 modified_code = modifier.parse_feedback_and_modify(feedback_improvements)
                 modified_code = fix_png_path(modified_code, self.assets_dir)
-                with open(code_file, "w", encoding="utf-8") as f:
-                    f.write(modified_code)
-
-                self.section_codes[section.id] = modified_code
+                self._write_section_code(section.id, modified_code)
                 return modified_code
             except Exception as e:
                 print(f"⚠️ GridCodeModifier 失败，回退到原始代码: {e}")
@@ -337,32 +511,124 @@ class TeachingVideoAgent:
         else:
             code_gen_prompt = get_prompt3_code(regenerate_note=regenerate_note, section=section, base_class=base_class)
 
-        response = self._request_api_and_track_tokens(code_gen_prompt, max_tokens=self.max_code_token_length)
+        if self.code_candidates > 1 and not feedback_improvements:
+            return self._generate_code_candidates(section, code_gen_prompt, attempt)
+
+        response = self._request_api_and_track_tokens(
+            code_gen_prompt, max_tokens=self.max_code_token_length, use_cache=attempt == 1
+        )
         if response is None:
             print(f"❌ 通过 API 生成 {section.id} 代码失败。")
             return ""
 
+        return self._save_code_response(section, response)
+
+    def _dry_run(self, code: str, scene_name: str, cwd, section_id: str = "dry_run", timeout=DRY_RUN_TIMEOUT) -> RenderResult:
+        """dry_run_scene on the scheduler's render pool when there is one, so the dry run takes a
+        render worker and an admission slot like any render; in this process otherwise"""
+        if self.scheduler is None:
+            return dry_run_scene(code, scene_name, cwd, section_id=section_id, timeout=timeout)
+        return self.scheduler.submit_render(dry_run_scene, code, scene_name, cwd, section_id, timeout).result()
+
+    def _code_candidate(
+        self, section: Section, prompt: str, index: int, use_cache: bool, temperature, cancelled: threading.Event
+    ) -> Dict[str, Any]:
+        """Generate, statically validate and dry-run one candidate; runs in a candidate thread"""
+        start = time.time()
+        record = {"candidate": index, "temperature": temperature, "tokens": 0, "status": "failed", "error": None}
         try:
-            code = response.candidates[0].content.parts[0].text
-        except Exception:
-            try:
-                code = response.choices[0].message.content
-            except Exception:
-                code = str(response)
-        if "```python" in code:
-            code = code.split("```python")[1].split("```")[0].strip()
-        elif "```" in code:
-            code = code.split("```")[1].strip()
-
-        # Replace base class
-        code = replace_base_class(code, base_class)
-        code = fix_png_path(code, self.assets_dir)
-
-        with open(code_file, "w", encoding="utf-8") as f:
-            f.write(code)
-
-        self.section_codes[section.id] = code
-        return code
+            if temperature is None:
+                response, usage = self.API(prompt, max_tokens=self.max_code_token_length, use_cache=use_cache)
+            else:
+                response, usage = self.API(
+                    prompt, max_tokens=self.max_code_token_length, use_cache=use_cache, temperature=temperature
+                )
+            self._track_tokens(usage)
+            record["tokens"] = (usage or {}).get("total_tokens", 0)
+            if response is None:
+                record["error"] = "API 无响应"
+                return record
+            check = validate_section_code(self._extract_code(response))
+            record["code"] = check.code
+            if check.issues:
+                record["status"] = "invalid"
+                record["error"] = check.issues[0].describe()
+                return record
+            if cancelled.is_set():
+                # 已有候选胜出，不再占用渲染进程
+                record["status"] = "abandoned"
+                return record
+            ok, error = self.scope_refine_fixer.dry_run_test(check.code, section.id, self.output_dir, runner=self._dry_run)
+            record["status"] = "passed" if ok else "dry_run_failed"
+            record["error"] = None if ok else (error or "")[-500:]
+            return record
+        except Exception as e:
+            record["error"] = str(e)
+            return record
+        finally:
+            record["seconds"] = round(time.time() - start, 2)
+
+    def _generate_code_candidates(self, section: Section, prompt: str, attempt: int) -> str:
+        """Request `code_candidates` versions of the section code at once and keep the first that passes
+        static validation and a dry run; the others are cancelled (queued) or ignored (in flight).
+
+        The first candidate of a first attempt goes through the response cache like a single
+        request would; the rest sample at rising temperatures. Each candidate's tokens, time
+        and outcome are written to `<section>_candidates.json` for tuning K against wall time.
+        When none passes, the candidate with a parseable scene is kept for the usual fix loop.
+        Inside the pipeline the dry runs go to the shared render pool (see _dry_run), so every
+        section's candidates together never run more than the render workers allow.
+        """
+        k = self.code_candidates
+        print(f"🎲 {self.learning_topic} {section.id} 并发生成 {k} 份候选代码 (第 {attempt} 次)")
+        start = time.time()
+        cancelled = threading.Event()
+        executor = ThreadPoolExecutor(max_workers=k, thread_name_prefix=f"candidate_{section.id}")
+        futures = []
+        for i in range(k):
+            temperature = None if i == 0 else CANDIDATE_TEMPERATURES[min(i, len(CANDIDATE_TEMPERATURES)) - 1]
+            use_cache = attempt == 1 and i == 0
+            futures.append(executor.submit(self._code_candidate, section, prompt, i, use_cache, temperature, cancelled))
+
+        records, winner = [], None
+        try:
+            for future in as_completed(futures):
+                record = future.result()
+                records.append(record)
+                if record["status"] == "passed":
+                    winner = record
+                    break
+        finally:
+            cancelled.set()
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        # 排队中的候选被取消；仍在请求中的候选结果被丢弃，其 token 仍计入总量但不在此记录中
+        finished = {r["candidate"] for r in records}
+        for i, future in enumerate(futures):
+            if i not in finished:
+                records.append({"candidate": i, "status": "cancelled" if future.cancelled() else "abandoned", "tokens": None})
+        summary = {
+            "section": section.id,
+            "attempt": attempt,
+            "k": k,
+            "winner": winner["candidate"] if winner else None,
+            "seconds": round(time.time() - start, 2),
+            "candidates": sorted(
+                ({key: v for key, v in r.items() if key != "code"} for r in records), key=lambda r: r["candidate"]
+            ),
+        }
+        atomic_write_json(self.output_dir / f"{section.id}_candidates.json", summary)
+
+        if winner is None:
+            fallback = [r for r in records if r["status"] in ("dry_run_failed", "invalid") and r.get("code")]
+            if not fallback:
+                print(f"❌ {section.id} 的 {k} 份候选代码均生成失败。")
+                return ""
+            winner = min(fallback, key=lambda r: r["status"] != "dry_run_failed")
+            print(f"⚠️ {section.id} 没有候选通过试运行，保留候选 #{winner['candidate']} 进入修复流程")
+        else:
+            print(f"✅ {section.id} 候选 #{winner['candidate']} 通过校验和试运行 ({summary['seconds']}s)")
+        return self._store_generated_code(section, winner["code"])
 
     def debug_and_fix_code(self, section_id: str, max_fix_attempts: int = 3) -> bool:
         """Enhanced debug and fix code method"""
@@ -375,74 +641,221 @@ class TeachingVideoAgent:
             else:
                 return False
 
-        # 动态解析 Scene 名称，避免类名与默认推断不一致
-        code_content_for_scene = self.section_codes.get(section_id, "")
-        scene_candidates = re.findall(r"class\s+(\w+)\s*\([^)]*\):", code_content_for_scene)
-        # 过滤掉没有 construct 方法的类
-        preferred_scene = None
-        if scene_candidates:
-            for cname in scene_candidates:
-                # 简单检查, 该类后出现 'def construct' 字样
-                pattern = rf"class\s+{cname}\s*\([^)]*\):[\s\S]*?def\s+construct\s*\("""
-                if re.search(pattern, code_content_for_scene):
-                    # 排除纯基类名称，如 TeachingScene/BaseScene 等
-                    if cname.lower() not in ("teachingscene", "basescene"):
-                        preferred_scene = cname
-                        break
-            if not preferred_scene:
-                preferred_scene = scene_candidates[-1]
+        render_cache = get_render_cache()
+        budget = get_render_budget()
+        scene_name = self._scene_name(section_id)
+        # 分级渲染时调试阶段只要预览视频（仅反馈评审需要）
+        preview_fps = self.preview_fps if self.render_ladder else None
+        needs_video = not self.render_ladder or self.use_feedback
+        quality_tag = f"l@{preview_fps}fps" if preview_fps else "l"
 
         for fix_attempt in range(max_fix_attempts):
             print(f"🔧 {self.learning_topic} 正在调试 {section_id} (尝试 {fix_attempt + 1}/{max_fix_attempts})")
 
             try:
-                # 首先尝试使用代码中真实存在的 Scene 名称，否则退回到默认推断
-                scene_name = preferred_scene if preferred_scene else f"{section_id.title().replace('_', '')}Scene"
                 code_file = f"{section_id}.py"
-                cmd = ["manim", "-ql", str(code_file), scene_name]
+                current_code = self.section_codes[section_id]
+                # 修复器按提出时的代码登记待确认的补丁，结果要报给这一版而不是校验改写后的版本
+                proposed_code = current_code
+
+                # 渲染前静态校验：能确定修复的直接改，剩下的问题不必渲染就交给修复器
+                check = self._prevalidate_code(section_id, current_code)
+                if check.code != current_code:
+                    self._write_section_code(section_id, check.code)
+                    current_code = check.code
+                if check.rejected:
+                    print(f"❌ {self.learning_topic} {section_id} 代码无可渲染的场景，重新生成")
+                    return False
+                if check.issues:
+                    get_local_fixer().record_outcome(proposed_code, False)
+                    get_fix_memo().record_outcome(proposed_code, False, check.error_message())
+                    fixed_code = self.scope_refine_fixer.fix_code_smart(
+                        section_id, current_code, check.error_message(), self.output_dir
+                    )
+                    if not fixed_code:
+                        break
+                    self._write_section_code(section_id, fixed_code)
+                    continue
 
-                result = subprocess.run(cmd, capture_output=True, text=True, cwd=self.output_dir, timeout=300)
+                # 源码（归一化后）、场景、画质与 manim 版本都未变时直接复用已渲染的视频
+                render_key = render_cache.make_key(current_code, scene_name, quality_tag, self.output_dir)
+                cached_video = render_cache.get(render_key) if needs_video else None
+                if cached_video:
+                    get_local_fixer().record_outcome(proposed_code, True)
+                    get_fix_memo().record_outcome(proposed_code, True)
+                    self.section_videos[section_id] = cached_video
+                    print(f"♻️ {self.learning_topic} {section_id} 命中渲染缓存，跳过渲染")
+                    return True
+
+                result = None
+                if self.render_ladder:
+                    # 先试运行 construct()（不画帧、不写文件），失败就不必渲染
+                    result = dry_run_scene(
+                        current_code, scene_name, self.output_dir, section_id=section_id, timeout=DRY_RUN_TIMEOUT
+                    )
+                if result is None or (result.returncode == 0 and needs_video):
+                    # 按动画数量和历史渲染速度给出时间预算，卡死或注定超时的渲染会被提前中止
+                    animations = self._animation_count(section_id)
+                    result = render_scene(
+                        code_file,
+                        scene_name,
+                        cwd=self.output_dir,
+                        quality="l",
+                        timeout=budget.timeout(quality_tag, animations, PREVIEW_RENDER_TIMEOUT),
+                        frame_rate=preview_fps,
+                        stall_timeout=budget.stall_timeout,
+                    )
+                    if result.returncode == 0:
+                        budget.record(quality_tag, animations, result.duration)
+                if result.too_slow:
+                    print(f"⏱️ {self.learning_topic} {section_id} 渲染过慢被中止: {result.too_slow}")
+                get_local_fixer().record_outcome(proposed_code, result.returncode == 0)
+                get_fix_memo().record_outcome(proposed_code, result.returncode == 0, result.stderr)
 
                 if result.returncode == 0:
-                    video_patterns = [
-                        self.output_dir / "media" / "videos" / f"{code_file.replace('.py', '')}" / "480p15" / f"{scene_name}.mp4",
-                        self.output_dir / "media" / "videos" / "480p15" / f"{scene_name}.mp4",
-                        self.output_dir / "media" / "videos" / f"{code_file.replace('.py', '')}" / "1080p60" / f"{scene_name}.mp4",
-                        self.output_dir / "media" / "videos" / "1080p60" / f"{scene_name}.mp4",
-                    ]
-
-                    for video_path in video_patterns:
-                        if video_path.exists():
-                            self.section_videos[section_id] = str(video_path)
-                            print(f"✅ {self.learning_topic} {section_id} 完成")
-                            return True
+                    if not needs_video:
+                        print(f"✅ {self.learning_topic} {section_id} 试运行通过")
+                        return True
+                    video_path = self._find_section_video(result, section_id, scene_name, "l")
+                    if video_path:
+                        self.section_videos[section_id] = str(video_path)
+                        render_cache.put(render_key, video_path)
+                        print(f"✅ {self.learning_topic} {section_id} 完成")
+                        return True
 
-                current_code = self.section_codes[section_id]
                 fixed_code = self.scope_refine_fixer.fix_code_smart(section_id, current_code, result.stderr, self.output_dir)
 
                 if fixed_code:
-                    self.section_codes[section_id] = fixed_code
-                    with open(self.output_dir / code_file, "w", encoding="utf-8") as f:
-                        f.write(fixed_code)
+                    self._write_section_code(section_id, fixed_code)
                 else:
                     break
 
-            except subprocess.TimeoutExpired:
-                print(f"❌ {self.learning_topic} {section_id} 超时")
-                break
             except Exception as e:
                 print(f"❌ {self.learning_topic} {section_id} 失败，异常: {e}")
                 break
 
         return False
 
-    def get_mllm_feedback(self, section: Section, video_path: str, round_number: int = 1) -> VideoFeedback:
+    def _scene_name(self, section_id: str) -> str:
+        """Scene class to render from a section's code"""
+        # 动态解析 Scene 名称，避免类名与默认推断不一致
+        code_content_for_scene = self.section_codes.get(section_id, "")
+        scene_candidates = re.findall(r"class\s+(\w+)\s*\([^)]*\):", code_content_for_scene)
+        # 过滤掉没有 construct 方法的类
+        preferred_scene = None
+        if scene_candidates:
+            for cname in scene_candidates:
+                # 简单检查, 该类后出现 'def construct' 字样
+                pattern = rf"class\s+{cname}\s*\([^)]*\):[\s\S]*?def\s+construct\s*\("""
+                if re.search(pattern, code_content_for_scene):
+                    # 排除纯基类名称，如 TeachingScene/BaseScene 等
+                    if cname.lower() not in ("teachingscene", "basescene"):
+                        preferred_scene = cname
+                        break
+            if not preferred_scene:
+                preferred_scene = scene_candidates[-1]
+        # 首先尝试使用代码中真实存在的 Scene 名称，否则退回到默认推断
+        return preferred_scene if preferred_scene else f"{section_id.title().replace('_', '')}Scene"
+
+    def _animation_count(self, section_id: str) -> int:
+        """Animations the section's render has to draw: the storyboard's count, else the play()/wait() calls in its code"""
+        for section in self.sections:
+            if section.id == section_id and section.animations:
+                return len(section.animations)
+        code = self.section_codes.get(section_id, "")
+        return max(1, len(re.findall(r"\bself\.(?:play|wait)\(", code)))
+
+    def _find_section_video(self, result, section_id: str, scene_name: str, quality: str) -> Optional[Path]:
+        """The mp4 a successful render produced: the path it reported, else media/videos/[<section>/]<height>p*/<scene>.mp4"""
+        videos_dir = self.output_dir / "media" / "videos"
+        height = QUALITY_HEIGHTS[quality]
+        candidates = [Path(result.video_path)] if result.video_path else []
+        candidates += sorted((videos_dir / section_id).glob(f"{height}p*/{scene_name}.mp4"))
+        candidates += sorted(videos_dir.glob(f"{height}p*/{scene_name}.mp4"))
+        return next((path for path in candidates if path.exists()), None)
+
+    def render_final(self, section_id: str) -> bool:
+        """The full-quality render of accepted code, retried once; if it still fails, the preview
+        is re-encoded to the final resolution and frame rate so the stream-copy merge stays valid"""
+        render_cache = get_render_cache()
+        code = self.section_codes[section_id]
+        scene_name = self._scene_name(section_id)
+        render_key = render_cache.make_key(code, scene_name, self.final_quality, self.output_dir)
+        cached_video = render_cache.get(render_key)
+        if cached_video:
+            self.section_videos[section_id] = cached_video
+            print(f"♻️ {self.learning_topic} {section_id} 成品命中渲染缓存")
+            return True
+
+        print(f"🎬 {self.learning_topic} {section_id} 代码已定稿，渲染成品 (-q{self.final_quality})")
+        budget = get_render_budget()
+        animations = self._animation_count(section_id)
+        for attempt in range(1, FINAL_RENDER_ATTEMPTS + 1):
+            result = render_scene(
+                f"{section_id}.py",
+                scene_name,
+                cwd=self.output_dir,
+                quality=self.final_quality,
+                timeout=budget.timeout(self.final_quality, animations, FINAL_RENDER_TIMEOUT),
+                stall_timeout=budget.stall_timeout,
+            )
+            video_path = self._find_section_video(result, section_id, scene_name, self.final_quality) if result.returncode == 0 else None
+            if video_path:
+                budget.record(self.final_quality, animations, result.duration)
+                self.section_videos[section_id] = str(video_path)
+                render_cache.put(render_key, video_path)
+                print(f"✅ {self.learning_topic} {section_id} 成品渲染完成")
+                return True
+            error = result.too_slow or (result.stderr.strip().splitlines() or ["未知错误"])[-1]
+            print(f"⚠️ {self.learning_topic} {section_id} 成品渲染失败 ({attempt}/{FINAL_RENDER_ATTEMPTS}): {error}")
+            if result.too_slow:
+                break  # 超时重试只会再超时一次
+
+        preview = self.section_videos.get(section_id)
+        conformed = self._conform_preview(section_id, preview) if preview else None
+        if conformed:
+            self.section_videos[section_id] = conformed
+            print(f"⚠️ {self.learning_topic} {section_id} 使用预览视频，已转码为成品分辨率和帧率")
+            return True
+        self.section_videos.pop(section_id, None)
+        print(f"❌ {self.learning_topic} {section_id} 成品渲染失败: {error}")
+        return False
+
+    def _conform_preview(self, section_id: str, preview: str) -> Optional[str]:
+        """Re-encode a preview to the final quality's size and frame rate; concat -c copy needs matching streams"""
+        height = QUALITY_HEIGHTS[self.final_quality]
+        width = height * 16 // 9
+        fps = QUALITY_FPS[self.final_quality]
+        out_dir = self.output_dir / "media" / "conformed"
+        out_dir.mkdir(parents=True, exist_ok=True)
+        output_path = out_dir / f"{section_id}.mp4"
+        vf = f"scale={width}:{height}:force_original_aspect_ratio=decrease,pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,fps={fps}"
+        cmd = ["ffmpeg", "-y", "-i", str(preview), "-vf", vf, "-c:v", "libx264", "-pix_fmt", "yuv420p", "-c:a", "aac", str(output_path)]
+        try:
+            result = subprocess.run(cmd, capture_output=True, text=True)
+        except OSError as e:
+            print(f"❌ 预览视频转码失败: {e}")
+            return None
+        if result.returncode != 0:
+            print(f"❌ 预览视频转码失败: {(result.stderr.strip().splitlines() or ['未知错误'])[-1]}")
+            return None
+        return str(output_path)
+
+    def get_mllm_feedback(
+        self, section: Section, video_path: str, round_number: int = 1, layout_report: Optional[LayoutReport] = None
+    ) -> VideoFeedback:
         print(f"🤖 {self.learning_topic} 使用 MLLM 分析视频 ({round_number}/{self.feedback_rounds}): {section.id}")
 
         current_code = self.section_codes[section.id]
         positions = self.extractor.extract_grid_positions(current_code)
         position_table = self.extractor.generate_position_table(positions)
-        analysis_prompt = get_prompt4_layout_feedback(section=section, position_table=position_table)
+        frame_paths = self._extract_feedback_frames(video_path)
+        analysis_prompt = get_prompt4_layout_feedback(
+            section=section,
+            position_table=position_table,
+            keyframes=bool(frame_paths),
+            layout_conflicts=layout_report.to_prompt() if layout_report else "",
+        )
 
         def _parse_layout(feedback_content):
             has_layout_issues, suggested_improvements = False, []
@@ -472,7 +885,10 @@ class TeachingVideoAgent:
             return has_layout_issues, suggested_improvements
 
         try:
-            response = request_gemini_video_img(prompt=analysis_prompt, video_path=video_path, image_path=self.GRID_IMG_PATH)
+            if frame_paths:
+                response = self._request_frames_api_and_track_tokens(analysis_prompt, frame_paths)
+            else:
+                response = self._request_video_api_and_track_tokens(analysis_prompt, video_path)
             feedback_content = extract_answer_from_response(response)
             has_layout_issues, suggested_improvements = _parse_layout(feedback_content)
             feedback = VideoFeedback(
@@ -495,6 +911,40 @@ class TeachingVideoAgent:
                 raw_response=f"Error: {str(e)}",
             )
 
+    def get_local_feedback(
+        self, section: Section, video_path: str, round_number: int = 1, layout_report: Optional[LayoutReport] = None
+    ) -> VideoFeedback:
+        """Same result as get_mllm_feedback, from pixel analysis of the video's keyframes plus the static grid check"""
+        print(f"🔍 {self.learning_topic} 本地分析视频布局 ({round_number}/{self.feedback_rounds}): {section.id}")
+        from frame_layout import analyze_video_layout
+
+        try:
+            report = analyze_video_layout(video_path)
+            improvements = report.improvements()
+            if layout_report is not None:
+                improvements += [
+                    f"[LAYOUT] Problem: {c.describe()}; Solution: 调整该对象的网格位置或 scale_factor"
+                    for c in layout_report.conflicts[: max(0, 3 - len(improvements))]
+                ]
+            feedback = VideoFeedback(
+                section_id=section.id,
+                video_path=video_path,
+                has_issues=bool(improvements),
+                suggested_improvements=improvements,
+                raw_response=report.to_json(),
+            )
+        except Exception as e:
+            print(f"❌ {self.learning_topic} 本地布局分析失败: {str(e)}")
+            feedback = VideoFeedback(
+                section_id=section.id,
+                video_path=video_path,
+                has_issues=False,
+                suggested_improvements=[],
+                raw_response=f"Error: {str(e)}",
+            )
+        self.video_feedbacks[f"{section.id}_round{round_number}"] = feedback
+        return feedback
+
     def optimize_with_feedback(self, section: Section, feedback: VideoFeedback) -> bool:
         """Optimize the code based on feedback from the MLLM"""
         if not feedback.has_issues or not feedback.suggested_improvements:
@@ -569,9 +1019,7 @@ class TeachingVideoAgent:
         print(f"❌ {self.learning_topic} {section.id} 所有优化尝试均失败，回滚到原始版本")
         
         # 回滚代码
-        self.section_codes[section.id] = original_code_content
-        with open(self.output_dir / f"{section.id}.py", "w", encoding="utf-8") as f:
-            f.write(original_code_content)
+        self._write_section_code(section.id, original_code_content)
 
         # [新增] 回滚视频文件
         if video_backup_path and video_backup_path.exists():
@@ -610,6 +1058,9 @@ class TeachingVideoAgent:
 
     def render_section(self, section: Section) -> bool:
         section_id = section.id
+        # 渲染进程里重建的 agent 没有分镜，渲染时间预算要用到本小节的动画数量
+        if all(s.id != section_id for s in self.sections):
+            self.sections.append(section)
 
         try:
             success = False
@@ -638,8 +1089,13 @@ class TeachingVideoAgent:
                         if not current_video:
                             print(f"❌ {self.learning_topic} {section_id} 没有可用视频进行 MLLM 反馈")
                             return success
+                        layout_report = check_layout(self.section_codes[section_id]) if self.static_layout_check else None
+                        if self.feedback_mode != "local" and layout_report is not None and layout_report.is_clean:
+                            print(f"✅ {self.learning_topic} {section_id} 静态布局检查无冲突，跳过 MLLM 反馈")
+                            break
                         try:
-                            feedback = self.get_mllm_feedback(section, current_video, round_number=round + 1)
+                            get_feedback = self.get_local_feedback if self.feedback_mode == "local" else self.get_mllm_feedback
+                            feedback = get_feedback(section, current_video, round_number=round + 1, layout_report=layout_report)
 
                             optimization_success = self.optimize_with_feedback(section, feedback)
                             if optimization_success:
@@ -657,34 +1113,35 @@ class TeachingVideoAgent:
                 except Exception as e:
                     print(f"⚠️ {self.learning_topic} {section_id} MLLM 反馈处理异常: {str(e)}")
 
+            if self.render_ladder:
+                success = self.render_final(section_id)
             return success
 
         except Exception as e:
             print(f"❌ {self.learning_topic} {section_id} 渲染过程异常: {str(e)}")
             return False
 
-    def render_section_worker(self, section_data) -> Tuple[str, bool, Optional[str]]:
-        section_id = "unknown"
-        try:
-            section, agent_class, kwargs = section_data
-            section_id = section.id
-            agent = agent_class(**kwargs)
-            success = agent.render_section(section)
-            video_path = agent.section_videos.get(section.id) if success else None
-            return section_id, success, video_path
-
-        except Exception as e:
-            print(f"❌ {self.learning_topic} {section_id} 渲染过程异常: {str(e)}")
-            return section_id, False, None
+    def _handle_render_outcome(self, section_id: str, outcome, results: Dict[str, str]) -> bool:
+        """Record one render worker result (or the exception it raised); returns success"""
+        if isinstance(outcome, Exception):
+            print(f"❌ {section_id} 视频渲染过程错误: {str(outcome)}")
+            return False
+        sid, success, video_path = outcome
+        if success and video_path:
+            results[sid] = video_path
+            print(f"✅ {sid} 视频渲染成功: {video_path}")
+            return True
+        print(f"⚠️ {sid} 视频渲染失败")
+        return False
 
     def render_all_sections(self, max_workers: int = 6) -> Dict[str, str]:
         print(f"🎥 开始并行渲染所有分节视频 (最多 {max_workers} 个进程)...")
 
         tasks = []
+        worker_state = (self.__class__, self.cfg)
         for section in self.sections:
             try:
-                task_data = (section, self.__class__, self.get_serializable_state())
-                tasks.append(task_data)
+                tasks.append(self._render_task(section, worker_state))
             except Exception as e:
                 print(f"⚠️ 为 {section.id} 准备任务数据时出错: {str(e)}")
                 continue
@@ -698,40 +1155,105 @@ class TeachingVideoAgent:
         failed_count = 0
 
         try:
-            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            with create_render_executor(max_workers, *worker_state) as executor:
                 future_to_section = {}
                 for task in tasks:
                     try:
-                        future = executor.submit(self.render_section_worker, task)
-                        future_to_section[future] = task[0].id
+                        future = executor.submit(render_section_task, task)
+                        future_to_section[future] = task.section.id
                     except Exception as e:
-                        section_id = task[0].id if task and len(task) > 0 else "unknown"
-                        print(f"⚠️ 提交 {section_id} 任务时出错: {str(e)}")
+                        print(f"⚠️ 提交 {task.section.id} 任务时出错: {str(e)}")
                         failed_count += 1
 
                 for future in as_completed(future_to_section):
                     section_id = future_to_section[future]
                     try:
-                        sid, success, video_path = future.result(timeout=1200)
-
-                        if success and video_path:
-                            results[sid] = video_path
-                            successful_count += 1
-                            print(f"✅ {sid} 视频渲染成功: {video_path}")
-                        else:
-                            failed_count += 1
-                            print(f"⚠️ {sid} 视频渲染失败")
-
+                        outcome = future.result()
                     except Exception as e:
+                        outcome = e
+                    if self._handle_render_outcome(section_id, outcome, results):
+                        successful_count += 1
+                    else:
                         failed_count += 1
-                        print(f"❌ {section_id} 视频渲染过程错误: {str(e)}")
 
         except Exception as e:
             print(f"❌ 并行渲染过程中出现严重错误: {str(e)}")
 
         # 更新结果并输出统计信息
         self.section_videos.update(results)
+        self._report_render_stats(successful_count, failed_count)
+        return results
+
+    def generate_and_render_sections(
+        self, max_code_workers: int = 6, max_render_workers: int = 6, scheduler: Optional[WorkScheduler] = None
+    ) -> Dict[str, str]:
+        """Pipelined code generation + rendering: each section starts rendering as soon as its own code exists.
+
+        With a shared `scheduler` the work goes to the run-wide LLM and render pools; otherwise a
+        private scheduler sized by max_code_workers / max_render_workers is used for this topic.
+        """
+        if not self.sections:
+            raise ValueError(f"{self.learning_topic} 请先生成教学小节")
+
+        if scheduler is None:
+            with WorkScheduler(
+                llm_workers=max_code_workers,
+                render_workers=max_render_workers,
+                render_initializer=init_agent_render_worker,
+                render_initargs=(self.__class__, self.cfg),
+            ) as local_scheduler:
+                return self.generate_and_render_sections(scheduler=local_scheduler)
+
+        self.scheduler = scheduler
+        try:
+            return self._run_pipeline(scheduler)
+        finally:
+            self.scheduler = None
+
+    def _run_pipeline(self, scheduler: WorkScheduler) -> Dict[str, str]:
+        print(f"🎥 流水线渲染: 小节代码生成后立即渲染 (共享 {scheduler.render.workers} 个渲染进程)...")
+        results = {}
+        successful_count = 0
+        failed_count = 0
+
+        pending = {}
+        for section in self.sections:
+            pending[scheduler.submit_llm(self.generate_section_code, section, 1)] = ("code", section)
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage, section = pending.pop(future)
+                if stage == "code":
+                    try:
+                        future.result()
+                    except Exception as e:
+                        print(f"❌ {self.learning_topic} {section.id} 代码生成失败: {e}")
+                    # 首次生成失败也交给渲染进程，render_section 会按 max_regenerate_tries 重新生成
+                    try:
+                        render_future = scheduler.submit_render(
+                            render_section_task, self._render_task(section, scheduler.render_initargs)
+                        )
+                    except Exception as e:
+                        print(f"⚠️ 提交 {section.id} 任务时出错: {str(e)}")
+                        failed_count += 1
+                        continue
+                    pending[render_future] = ("render", section)
+                    continue
 
+                try:
+                    outcome = future.result()
+                except Exception as e:
+                    outcome = e
+                if self._handle_render_outcome(section.id, outcome, results):
+                    successful_count += 1
+                else:
+                    failed_count += 1
+
+        self.section_videos.update(results)
+        self._report_render_stats(successful_count, failed_count)
+        return results
+
+    def _report_render_stats(self, successful_count: int, failed_count: int):
         total_sections = len(self.sections)
         print(f"\n📊 渲染统计:")
         print(f"   总小节数: {total_sections}")
@@ -746,8 +1268,6 @@ class TeachingVideoAgent:
         else:
             print("🎉 所有分节视频渲染成功！")
 
-        return results
-
     def merge_videos(self, output_filename: str = None) -> str:
         """Step 5: Merge all section videos"""
         if not self.section_videos:
@@ -799,13 +1319,12 @@ class TeachingVideoAgent:
             print(f"❌ 合并分节视频失败: {e}")
             return None
 
-    def GENERATE_VIDEO(self) -> str:
+    def GENERATE_VIDEO(self, scheduler: Optional[WorkScheduler] = None) -> str:
         """Generate complete video with MLLM feedback optimization"""
         try:
             self.generate_outline()
             self.generate_storyboard()
-            self.generate_codes()
-            self.render_all_sections()
+            self.generate_and_render_sections(scheduler=scheduler)
             final_video = self.merge_videos()
             if final_video:
                 print(f"🎉 视频生成成功: {final_video}")
@@ -817,8 +1336,224 @@ class TeachingVideoAgent:
             print(f"❌ 视频生成失败: {e}")
             return None
 
+    async def agenerate_outline(self) -> TeachingOutline:
+        outline_data = self._load_cached_outline()
+
+        if outline_data is None:
+            prompt1 = self._build_outline_prompt()
+            self.manifest.begin("outline", self._stage_inputs_hash("outline", prompt1))
+            print(f"📝 正在生成大纲...")
+
+            for attempt in range(1, self.max_regenerate_tries + 1):
+                response = await self._arequest_api_and_track_tokens(
+                    prompt1, max_tokens=self.max_code_token_length, use_cache=attempt == 1
+                )
+                if response is None:
+                    print(f"⚠️ 第 {attempt} 次尝试失败，正在重试...")
+                    if attempt == self.max_regenerate_tries:
+                        raise ValueError("API 请求多次失败")
+                    continue
+                outline_data = self._save_outline_response(response)
+                if outline_data is not None:
+                    break
+                print(f"⚠️ 第 {attempt} 次尝试大纲格式无效，正在重试...")
+                if attempt == self.max_regenerate_tries:
+                    raise ValueError("大纲格式多次无效，请检查提示词或 API 响应")
+
+        return self._set_outline(outline_data)
+
+    async def agenerate_storyboard(self) -> List[Section]:
+        if not self.outline:
+            raise ValueError("大纲未生成，请先生成大纲")
+
+        storyboard_data, enhanced = self._load_cached_storyboard()
+
+        if storyboard_data is None:
+            print("🎬 正在生成分镜脚本...")
+            prompt2 = self._build_storyboard_prompt()
+            self.manifest.begin("storyboard", self._stage_inputs_hash("storyboard", prompt2))
 
-def process_knowledge_point(idx, kp, folder_path: Path, cfg: RunConfig):
+            for attempt in range(1, self.max_regenerate_tries + 1):
+                response = await self._arequest_api_and_track_tokens(
+                    prompt2, max_tokens=self.max_code_token_length, use_cache=attempt == 1
+                )
+                if response is None:
+                    print(f"⚠️ 第 {attempt} 次尝试 API 请求失败，正在重试...")
+                    if attempt == self.max_regenerate_tries:
+                        raise ValueError("API 请求多次失败")
+                    continue
+                storyboard_data = self._save_storyboard_response(response)
+                if storyboard_data is not None:
+                    break
+                print(f"⚠️ 第 {attempt} 次尝试分镜格式无效，正在重试...")
+                if attempt == self.max_regenerate_tries:
+                    raise ValueError("分镜格式多次无效，请检查提示词或 API 响应")
+
+        if enhanced or not self.use_assets:
+            self.enhanced_storyboard = storyboard_data
+        else:
+            # 素材下载走同步 HTTP，放到线程中避免阻塞事件循环
+            self.enhanced_storyboard = await asyncio.to_thread(self._enhance_storyboard_with_assets, storyboard_data)
+        return self._set_sections()
+
+    async def agenerate_section_code(self, section: Section) -> str:
+        """First-attempt code generation; regeneration and fixing stay in the render workers"""
+        code = self._load_cached_section_code(section)
+        if code is not None:
+            return code
+
+        self.manifest.begin(f"code:{section.id}", self._code_inputs_hash(section))
+        code_gen_prompt = get_prompt3_code(regenerate_note="", section=section, base_class=base_class)
+        response = await self._arequest_api_and_track_tokens(code_gen_prompt, max_tokens=self.max_code_token_length)
+        if response is None:
+            print(f"❌ 通过 API 生成 {section.id} 代码失败。")
+            return ""
+        return self._save_code_response(section, response)
+
+    async def agenerate_codes(self) -> Dict[str, str]:
+        if not self.sections:
+            raise ValueError(f"{self.learning_topic} 请先生成教学小节")
+
+        results = await asyncio.gather(
+            *(self.agenerate_section_code(section) for section in self.sections), return_exceptions=True
+        )
+        for section, result in zip(self.sections, results):
+            if isinstance(result, Exception):
+                print(f"❌ {self.learning_topic} {section.id} 代码生成失败: {result}")
+        return self.section_codes
+
+    async def _arender_section(self, scheduler: WorkScheduler, section: Section):
+        """Render one section on the scheduler's pool; submit_render blocks on queue space and
+        admission, so it waits in a thread instead of on the event loop"""
+        future = await asyncio.to_thread(
+            scheduler.submit_render, render_section_task, self._render_task(section, scheduler.render_initargs)
+        )
+        return await asyncio.wrap_future(future)
+
+    async def arender_all_sections(self, scheduler: WorkScheduler) -> Dict[str, str]:
+        """Render all sections on the shared render pool without blocking the event loop"""
+        outcomes = await asyncio.gather(
+            *(self._arender_section(scheduler, section) for section in self.sections), return_exceptions=True
+        )
+        return self._collect_render_outcomes(self.sections, outcomes)
+
+    def _collect_render_outcomes(self, sections: List[Section], outcomes) -> Dict[str, str]:
+        results = {}
+        successful_count = 0
+        for section, outcome in zip(sections, outcomes):
+            if self._handle_render_outcome(section.id, outcome, results):
+                successful_count += 1
+
+        self.section_videos.update(results)
+        self._report_render_stats(successful_count, len(sections) - successful_count)
+        return results
+
+    async def agenerate_and_render_sections(self, scheduler: WorkScheduler) -> Dict[str, str]:
+        """Async pipeline: every section goes code -> render on its own, without a barrier between stages"""
+        if not self.sections:
+            raise ValueError(f"{self.learning_topic} 请先生成教学小节")
+
+        async def section_pipeline(section):
+            try:
+                await self.agenerate_section_code(section)
+            except Exception as e:
+                print(f"❌ {self.learning_topic} {section.id} 代码生成失败: {e}")
+            return await self._arender_section(scheduler, section)
+
+        outcomes = await asyncio.gather(*(section_pipeline(section) for section in self.sections), return_exceptions=True)
+        return self._collect_render_outcomes(self.sections, outcomes)
+
+    async def GENERATE_VIDEO_ASYNC(self, scheduler: Optional[WorkScheduler] = None) -> str:
+        """Async driver: LLM stages run on the event loop, Manim rendering on the scheduler's render pool
+        (gated by its AdmissionController like the sync path)"""
+        if self.cfg.async_api is None:
+            raise ValueError("异步模式需要在 RunConfig 中提供 'async_api'")
+
+        own_scheduler = scheduler is None
+        if own_scheduler:
+            scheduler = WorkScheduler(
+                llm_workers=1,
+                render_workers=6,
+                render_initializer=init_agent_render_worker,
+                render_initargs=(self.__class__, self.cfg),
+            )
+        try:
+            await self.agenerate_outline()
+            await self.agenerate_storyboard()
+            await self.agenerate_and_render_sections(scheduler)
+            final_video = await asyncio.to_thread(self.merge_videos)
+            if final_video:
+                print(f"🎉 视频生成成功: {final_video}")
+                return final_video
+            else:
+                print(f"❌ {self.learning_topic} 失败")
+                return None
+        except Exception as e:
+            print(f"❌ 视频生成失败: {e}")
+            return None
+        finally:
+            if own_scheduler:
+                scheduler.shutdown(wait=True)
+
+
+# 渲染工作进程内的共享只读状态，由 init_agent_render_worker 在进程启动时装入
+_WORKER_STATE: Optional[Tuple[type, RunConfig]] = None
+# 每个工作进程按知识点复用 agent，同一知识点的后续小节不再重建
+_WORKER_AGENTS: "OrderedDict[tuple, TeachingVideoAgent]" = OrderedDict()
+MAX_WORKER_AGENTS = 8
+
+
+def init_agent_render_worker(agent_class, cfg: RunConfig):
+    """Pool initializer: preload manim and keep the run-wide agent class and RunConfig in this worker"""
+    global _WORKER_STATE
+    init_render_worker()
+    _WORKER_STATE = (agent_class, cfg)
+
+
+def create_render_executor(max_workers: int, agent_class, cfg: RunConfig) -> ProcessPoolExecutor:
+    """Render process pool whose workers are initialized with (agent_class, cfg), so tasks need not carry them"""
+    return ProcessPoolExecutor(max_workers=max_workers, initializer=init_agent_render_worker, initargs=(agent_class, cfg))
+
+
+def _worker_agent(task: RenderTask) -> TeachingVideoAgent:
+    """This worker's agent for the task's topic, built on first use"""
+    agent_class, cfg = task.shared or _WORKER_STATE
+    key = (agent_class, task.idx, task.knowledge_point, str(task.folder))
+    agent = _WORKER_AGENTS.get(key)
+    if agent is None or agent.cfg != cfg:
+        agent = agent_class(idx=task.idx, knowledge_point=task.knowledge_point, folder=task.folder, cfg=cfg)
+        _WORKER_AGENTS[key] = agent
+        while len(_WORKER_AGENTS) > MAX_WORKER_AGENTS:
+            _WORKER_AGENTS.popitem(last=False)
+    _WORKER_AGENTS.move_to_end(key)
+    return agent
+
+
+def render_section_task(task: RenderTask) -> Tuple[str, bool, Optional[str]]:
+    """Process-pool entry point: render one section with this worker's agent for its topic"""
+    section_id = "unknown"
+    try:
+        section = task.section
+        section_id = section.id
+        if task.shared is None and _WORKER_STATE is None:
+            raise RuntimeError("渲染进程未初始化共享状态 (init_agent_render_worker)")
+        agent = _worker_agent(task)
+        # 以父进程的代码为准，清掉该小节在本进程里的旧结果
+        agent.section_videos.pop(section_id, None)
+        if task.code is not None:
+            agent.section_codes[section_id] = task.code
+        else:
+            agent.section_codes.pop(section_id, None)
+        success = agent.render_section(section)
+        video_path = agent.section_videos.get(section.id) if success else None
+        return section_id, success, video_path
+
+    except Exception as e:
+        print(f"❌ {section_id} 渲染过程异常: {str(e)}")
+        return section_id, False, None
+
+
+def process_knowledge_point(idx, kp, folder_path: Path, cfg: RunConfig, scheduler: Optional[WorkScheduler] = None):
     print(f"\n🚀 正在处理知识点: {kp}")
     start_time = time.time()
 
@@ -828,28 +1563,27 @@ def process_knowledge_point(idx, kp, folder_path: Path, cfg: RunConfig):
         folder=folder_path,
         cfg=cfg,
     )
-    video_path = agent.GENERATE_VIDEO()
+    video_path = agent.GENERATE_VIDEO(scheduler=scheduler)
 
     duration_minutes = (time.time() - start_time) / 60
     total_tokens = agent.token_usage["total_tokens"]
 
     print(f"✅ 知识点 '{kp}' 处理完成。耗时: {duration_minutes:.2f} 分钟, Token 使用: {total_tokens}")
+    cache_stats = response_cache_stats()
+    print(f"💾 LLM 缓存: 命中 {cache_stats['hits']} / 未命中 {cache_stats['misses']} (命中率 {cache_stats['hit_rate']*100:.1f}%)")
     return kp, video_path, duration_minutes, total_tokens
 
 
-def process_batch(batch_data, cfg: RunConfig):
+def process_batch(batch_data, cfg: RunConfig, scheduler: Optional[WorkScheduler] = None):
     """Process a batch of knowledge points (serial within a batch)"""
     batch_idx, kp_batch, folder_path = batch_data
     results = []
     print(f"第 {batch_idx + 1} 批次开始处理 {len(kp_batch)} 个知识点")
 
-    for local_idx, (idx, kp) in enumerate(kp_batch):
+    # 请求节流由 rate_limiter 按服务商配额统一控制，知识点之间无需再额外等待
+    for idx, kp in kp_batch:
         try:
-            if local_idx > 0:
-                delay = random.uniform(3, 6)
-                print(f"⏳ 第 {batch_idx + 1} 批次在处理 {kp} 前等待 {delay:.1f} 秒...")
-                time.sleep(delay)
-            results.append(process_knowledge_point(idx, kp, folder_path, cfg))
+            results.append(process_knowledge_point(idx, kp, folder_path, cfg, scheduler))
         except Exception as e:
             print(f"❌ 第 {batch_idx + 1} 批次处理 {kp} 失败: {e}")
             results.append((kp, None, 0, 0))
@@ -857,37 +1591,119 @@ def process_batch(batch_data, cfg: RunConfig):
 
 
 def run_Code2Video(
-    knowledge_points: List[str], folder_path: Path, parallel=True, batch_size=3, max_workers=8, cfg: RunConfig = RunConfig()
+    knowledge_points: List[str],
+    folder_path: Path,
+    parallel=True,
+    batch_size=3,
+    max_workers=8,
+    cfg: RunConfig = RunConfig(),
+    llm_workers=16,
 ):
+    """Batches run on lightweight threads; all LLM calls and all renders go through one shared WorkScheduler,
+    so at most `max_workers` Manim processes exist however many batches are in flight."""
     all_results = []
 
-    if parallel:
-        batches = []
-        for i in range(0, len(knowledge_points), batch_size):
-            batch = [(i + j, kp) for j, kp in enumerate(knowledge_points[i : i + batch_size])]
-            batches.append((i // batch_size, batch, folder_path))
+    with WorkScheduler(
+        llm_workers=llm_workers,
+        render_workers=max_workers,
+        render_initializer=init_agent_render_worker,
+        render_initargs=(TeachingVideoAgent, cfg),
+    ) as scheduler:
+        if parallel:
+            batches = []
+            for i in range(0, len(knowledge_points), batch_size):
+                batch = [(i + j, kp) for j, kp in enumerate(knowledge_points[i : i + batch_size])]
+                batches.append((i // batch_size, batch, folder_path))
 
-        print(
-            f"🔄 并行批处理模式: {len(batches)} 个批次，每批 {batch_size} 个知识点，{max_workers} 个并发批次"
-        )
-        with ProcessPoolExecutor(max_workers=max_workers) as executor:
-            futures = {executor.submit(process_batch, batch, cfg): batch for batch in batches}
-            for future in as_completed(futures):
+            print(
+                f"🔄 并行批处理模式: {len(batches)} 个批次，每批 {batch_size} 个知识点，"
+                f"共享 {max_workers} 个渲染进程 / {llm_workers} 个 LLM 线程"
+            )
+            with ThreadPoolExecutor(max_workers=len(batches) or 1, thread_name_prefix="topic") as executor:
+                futures = {executor.submit(process_batch, batch, cfg, scheduler): batch for batch in batches}
+                for future in as_completed(futures):
+                    batch_idx = futures[future][0]
+                    try:
+                        batch_idx, batch_results = future.result()
+                        all_results.extend(batch_results)
+                        print(f"✅ 第 {batch_idx + 1} 批次完成")
+                    except Exception as e:
+                        print(f"❌ 第 {batch_idx + 1} 批次处理失败: {e}")
+        else:
+            print("🔄 串行处理模式")
+            for idx, kp in enumerate(knowledge_points):
                 try:
-                    batch_idx, batch_results = future.result()
-                    all_results.extend(batch_results)
-                    print(f"✅ 第 {batch_idx + 1} 批次完成")
+                    all_results.append(process_knowledge_point(idx, kp, folder_path, cfg, scheduler))
                 except Exception as e:
-                    print(f"❌ 第 {batch_idx + 1} 批次处理失败: {e}")
-    else:
-        print("🔄 串行处理模式")
-        for idx, kp in enumerate(knowledge_points):
-            try:
-                all_results.append(process_knowledge_point(idx, kp, folder_path, cfg))
-            except Exception as e:
-                print(f"❌ 串行处理 {kp} 失败: {e}")
-                all_results.append((kp, None, 0, 0))
+                    print(f"❌ 串行处理 {kp} 失败: {e}")
+                    all_results.append((kp, None, 0, 0))
+
+    _print_run_summary(all_results, scheduler)
+
+
+async def process_knowledge_point_async(idx, kp, folder_path: Path, cfg: RunConfig, scheduler, topic_semaphore):
+    async with topic_semaphore:
+        print(f"\n🚀 正在处理知识点: {kp}")
+        start_time = time.time()
+        try:
+            agent = TeachingVideoAgent(idx=idx, knowledge_point=kp, folder=folder_path, cfg=cfg)
+            video_path = await agent.GENERATE_VIDEO_ASYNC(scheduler)
+        except Exception as e:
+            print(f"❌ 异步处理 {kp} 失败: {e}")
+            return kp, None, 0, 0
+
+        duration_minutes = (time.time() - start_time) / 60
+        total_tokens = agent.token_usage["total_tokens"]
+        print(f"✅ 知识点 '{kp}' 处理完成。耗时: {duration_minutes:.2f} 分钟, Token 使用: {total_tokens}")
+        return kp, video_path, duration_minutes, total_tokens
+
+
+async def run_Code2Video_async(
+    knowledge_points: List[str], folder_path: Path, max_workers=8, max_concurrent_topics=16, cfg: RunConfig = RunConfig()
+):
+    """Single-process driver: all topics' LLM calls share one event loop, rendering shares one process pool"""
+    print(f"🔄 异步模式: {len(knowledge_points)} 个知识点，最多 {max_concurrent_topics} 个并发，{max_workers} 个渲染进程")
+    topic_semaphore = asyncio.Semaphore(max_concurrent_topics)
+    # LLM 请求走事件循环，调度器只用它的渲染进程池（及其准入控制）
+    with WorkScheduler(
+        llm_workers=1,
+        render_workers=max_workers,
+        render_initializer=init_agent_render_worker,
+        render_initargs=(TeachingVideoAgent, cfg),
+    ) as scheduler:
+        all_results = await asyncio.gather(
+            *(
+                process_knowledge_point_async(idx, kp, folder_path, cfg, scheduler, topic_semaphore)
+                for idx, kp in enumerate(knowledge_points)
+            )
+        )
+    _print_run_summary(list(all_results), scheduler)
+
+
+def _print_scheduler_stats(scheduler: WorkScheduler):
+    stats = scheduler.stats()
+    print(f"📊 调度统计: LLM 任务 {stats['llm_completed']} 个，渲染任务 {stats['render_completed']} 个")
+    if "render_waits" in stats:
+        print(
+            f"   准入控制: 渲染排队 {stats['render_waits']} 次，LLM 排队 {stats['llm_waits']} 次；"
+            f"渲染并发上限最低 {stats['render_limit_lowest']}（收缩 {stats['shrinks']} 次，放开 {stats['grows']} 次），"
+            f"单个渲染内存估计 {stats['render_memory_mb']} MB"
+        )
 
+
+def _print_llm_usage():
+    """Per-provider request counters of this process (render workers' fix requests are counted in the workers)"""
+    for svc, m in sorted(llm_usage_stats().items()):
+        print(
+            f"🤖 {svc}: 请求 {m['requests']} 次，重试 {m['retries']} 次，失败 {m['failures']} 次，"
+            f"缓存命中 {m['cache_hits']} 次，Token {m['prompt_tokens']:,} + {m['completion_tokens']:,}"
+        )
+
+
+def _print_run_summary(all_results, scheduler: Optional[WorkScheduler] = None):
+    if scheduler is not None:
+        _print_scheduler_stats(scheduler)
+    _print_llm_usage()
     successful_runs = [r for r in all_results if r[1] is not None]
     total_runs = len(all_results)
     if not successful_runs:
@@ -921,6 +1737,21 @@ def get_api_and_output(API_name):
         raise ValueError("无效的 API 模型名称")
 
 
+def get_async_api(API_name):
+    mapping = {
+        "gpt-41": arequest_gpt41_token,
+        "claude": arequest_claude_token,
+        "gpt-5": arequest_gpt5_token,
+        "gpt-4o": arequest_gpt4o_token,
+        "gpt-o4mini": arequest_o4mini_token,
+        "Gemini": arequest_gemini_token,
+    }
+    try:
+        return mapping[API_name]
+    except KeyError:
+        raise ValueError("无效的 API 模型名称")
+
+
 def build_and_parse_args():
     parser = argparse.ArgumentParser()
     # TODO: Core hyperparameters
@@ -950,26 +1781,71 @@ def build_and_parse_args():
     parser.add_argument("--max_feedback_gen_code_tries", type=int, help="max # tries for Critic", default=3)
     parser.add_argument("--max_mllm_fix_bugs_tries", type=int, help="max # tries for Critic to fix bug", default=3)
     parser.add_argument("--feedback_rounds", type=int, default=2)
+    parser.add_argument(
+        "--no_render_ladder",
+        action="store_false",
+        dest="render_ladder",
+        help="Render every debug attempt at -ql and ship those videos, instead of dry runs + low-fps previews + one final render",
+    )
+    parser.add_argument("--preview_fps", type=int, default=5, help="Frame rate of the preview videos used for feedback")
+    parser.add_argument(
+        "--final_quality", choices=["l", "m", "h", "p", "k"], default="h", help="manim -q flag of the final render of each section"
+    )
+    parser.add_argument(
+        "--code_candidates",
+        type=int,
+        default=1,
+        help="Code versions generated concurrently per section; the first to pass validation and a dry run is kept",
+    )
+    parser.add_argument(
+        "--speculative_fixes",
+        type=int,
+        default=1,
+        help="Candidate fixes requested concurrently per ScopeRefine repair; the first to pass the dry run wins",
+    )
+    parser.add_argument(
+        "--no_static_layout_check",
+        action="store_false",
+        dest="static_layout_check",
+        help="Always run the MLLM layout critic, even when the static grid check finds no conflict",
+    )
+    parser.add_argument(
+        "--feedback_mode",
+        choices=["mllm", "local"],
+        default="mllm",
+        help="Layout critic: multimodal model, or local pixel analysis of rendered frames (no API call)",
+    )
+    parser.add_argument("--feedback_max_frames", type=int, default=8, help="Keyframes sent to the layout critic, 0 sends the whole video")
 
     parser.add_argument("--parallel", action="store_true", default=False)
     parser.add_argument("--no_parallel", action="store_false", dest="parallel")
+    parser.add_argument("--async_mode", action="store_true", default=False, help="Run all topics in one asyncio process")
+    parser.add_argument("--max_concurrent_topics", type=int, default=16, help="Topics in flight at once in --async_mode")
     parser.add_argument("--parallel_group_num", type=int, default=3)
     parser.add_argument("--max_concepts", type=int, help="Limit # concepts for a quick run, -1 for all", default=-1)
     parser.add_argument("--knowledge_point", type=str, help="if knowledge_file not given, can ignore", default=None)
     
     # 新增参数：最大并行工作进程数
     parser.add_argument("--max_workers", type=int, default=None, help="Force specific number of workers, overriding auto-detection")
+    parser.add_argument("--max_llm_workers", type=int, default=16, help="Shared LLM request threads across all topics")
+    parser.add_argument("--no_llm_cache", action="store_true", default=False, help="Disable the on-disk LLM response cache")
+    parser.add_argument("--no_render_cache", action="store_true", default=False, help="Always re-render, ignoring cached videos")
 
     return parser.parse_args()
 
 
 if __name__ == "__main__":
     args = build_and_parse_args()
+    if args.no_llm_cache:
+        # 通过环境变量传递，子进程同样生效
+        os.environ["CACHE_ENABLED"] = "0"
+    if args.no_render_cache:
+        os.environ["RENDER_CACHE_ENABLED"] = "0"
 
     api, folder_name = get_api_and_output(args.API)
     folder = Path(__file__).resolve().parent / "CASES" / f"{args.folder_prefix}_{folder_name}"
 
-    _CFG_PATH = pathlib.Path(__file__).with_name("api_config.json")
+    _CFG_PATH = Path(__file__).with_name("api_config.json")
     with _CFG_PATH.open("r", encoding="utf-8") as _f:
         _CFG = json.load(_f)
     iconfinder_cfg = _CFG.get("iconfinder", {})
@@ -1002,16 +1878,37 @@ if __name__ == "__main__":
         max_feedback_gen_code_tries=args.max_feedback_gen_code_tries,
         max_mllm_fix_bugs_tries=args.max_mllm_fix_bugs_tries,
         feedback_rounds=args.feedback_rounds,
+        feedback_max_frames=args.feedback_max_frames,
+        static_layout_check=args.static_layout_check,
+        feedback_mode=args.feedback_mode,
+        code_candidates=args.code_candidates,
+        render_ladder=args.render_ladder,
+        preview_fps=args.preview_fps,
+        final_quality=args.final_quality,
+        speculative_fixes=args.speculative_fixes,
+        async_api=get_async_api(args.API) if args.async_mode else None,
     )
     
     # 优先使用命令行参数指定的 workers，否则自动计算
     real_workers = args.max_workers if args.max_workers is not None else get_optimal_workers()
 
-    run_Code2Video(
-        knowledge_points,
-        folder,
-        parallel=args.parallel,
-        batch_size=max(1, int(len(knowledge_points) / args.parallel_group_num)),
-        max_workers=real_workers,
-        cfg=cfg,
-    )
\ No newline at end of file
+    if args.async_mode:
+        asyncio.run(
+            run_Code2Video_async(
+                knowledge_points,
+                folder,
+                max_workers=real_workers,
+                max_concurrent_topics=args.max_concurrent_topics,
+                cfg=cfg,
+            )
+        )
+    else:
+        run_Code2Video(
+            knowledge_points,
+            folder,
+            parallel=args.parallel,
+            batch_size=max(1, int(len(knowledge_points) / args.parallel_group_num)),
+            max_workers=real_workers,
+            cfg=cfg,
+            llm_workers=args.max_llm_workers,
+        )
\ No newline at end of file
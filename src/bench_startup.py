@@ -0,0 +1,123 @@
+"""Startup-time benchmark guarding the import budget of each entry point.
+
+Each entry point is started `--repeat` times in a fresh interpreter (the way the CLI, a spawned
+worker or an eval run starts it) and the fastest wall time is compared with its budget. An entry
+point also fails when it pulls in a module that must stay lazy (manim, openai, scipy, cv2,
+numpy): those are only imported by the code that renders, calls the API, computes statistics or
+looks at a rendered video.
+
+    python bench_startup.py [--repeat 5] [--scale 1.5] [--only agent]
+
+Exits non-zero when any entry point is over budget.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+
+SRC_DIR = Path(__file__).resolve().parent
+ROOT_DIR = SRC_DIR.parent
+
+# 不允许在入口导入阶段出现的模块（首次真正使用时才导入）
+LAZY_MODULES = ("manim", "openai", "scipy", "cv2", "numpy")
+# 只做记录的较重依赖
+REPORTED_MODULES = LAZY_MODULES + ("requests", "psutil", "httpx")
+
+# 入口 -> (python 参数, 预算秒数)；预算含解释器自身启动时间
+ENTRY_POINTS: Dict[str, Tuple[List[str], float]] = {
+    "agent": (["-c", "import agent"], 1.0),
+    "agent --help": (["agent.py", "--help"], 1.0),
+    "eval_AES": (["-c", "import eval_AES"], 0.5),
+    "eval_TQ": (["-c", "import eval_TQ"], 0.5),
+}
+
+_PROBE_MARKER = "__bench_startup__"
+# 解释器退出时报告已加载的重依赖；用 atexit 以便覆盖 argparse 的 --help 退出
+_PROBE = (
+    "import atexit, json, sys\n"
+    f"atexit.register(lambda: print({_PROBE_MARKER!r} + json.dumps("
+    f"[m for m in {REPORTED_MODULES!r} if m in sys.modules])))\n"
+)
+
+
+def _command(args: List[str]) -> List[str]:
+    if args[0] == "-c":
+        return [sys.executable, "-c", _PROBE + args[1]]
+    # 以脚本方式运行：先装好探针，再把 argv 交给脚本
+    script = (
+        _PROBE
+        + "import runpy\n"
+        + f"sys.argv = {args!r}\n"
+        + f"runpy.run_path({args[0]!r}, run_name='__main__')\n"
+    )
+    return [sys.executable, "-c", script]
+
+
+def measure(args: List[str], repeat: int) -> Tuple[float, Optional[List[str]]]:
+    """Fastest wall time over `repeat` fresh interpreters and the heavy modules it loaded"""
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(SRC_DIR), str(ROOT_DIR), env.get("PYTHONPATH")]))
+    best, loaded = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        proc = subprocess.run(
+            _command(args), cwd=SRC_DIR, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True
+        )
+        elapsed = time.perf_counter() - start
+        if proc.returncode != 0:
+            raise RuntimeError(f"{' '.join(args)} 退出码 {proc.returncode}:\n{proc.stderr.strip()}")
+        best = min(best, elapsed)
+        for line in proc.stdout.splitlines():
+            if line.startswith(_PROBE_MARKER):
+                loaded = json.loads(line[len(_PROBE_MARKER):])
+    return best, loaded
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Guard the startup time of each entry point")
+    parser.add_argument("--repeat", type=int, default=5, help="fresh interpreters per entry point; the fastest counts")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiply every budget, e.g. on a slow CI machine")
+    parser.add_argument("--only", action="append", default=None, help="entry point to check (repeatable)")
+    args = parser.parse_args(argv)
+
+    names = args.only or list(ENTRY_POINTS)
+    unknown = [n for n in names if n not in ENTRY_POINTS]
+    if unknown:
+        parser.error(f"unknown entry point(s): {', '.join(unknown)}; choose from {', '.join(ENTRY_POINTS)}")
+
+    baseline, _ = measure(["-c", "pass"], args.repeat)
+    print(f"⏱️ 解释器空启动: {baseline:.3f}s")
+
+    failures = 0
+    for name in names:
+        cmd, budget = ENTRY_POINTS[name]
+        budget *= args.scale
+        try:
+            elapsed, loaded = measure(cmd, args.repeat)
+        except RuntimeError as e:
+            print(f"❌ {name}: {e}")
+            failures += 1
+            continue
+        eager = [m for m in (loaded or []) if m in LAZY_MODULES]
+        ok = elapsed <= budget and not eager
+        failures += not ok
+        print(
+            f"{'✅' if ok else '❌'} {name:<14} {elapsed:.3f}s / 预算 {budget:.2f}s"
+            f" (导入 {elapsed - baseline:.3f}s) 已加载: {', '.join(loaded or []) or '-'}"
+        )
+        if eager:
+            print(f"   ⚠️ 启动时不应导入: {', '.join(eager)}")
+
+    if failures:
+        print(f"❌ {failures} 个入口超出启动预算")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
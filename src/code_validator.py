@@ -0,0 +1,281 @@
+import ast
+import builtins
+import difflib
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set
+
+from layout_check import GRID_COLS, GRID_ROWS, is_valid_cell
+from local_fixer import MISSING_IMPORTS, RENAMED_NAMES, _apply_edits, _defined_names, _rename_attribute, get_local_fixer
+from manim_index import get_manim_index
+from prompts import base_class
+
+
+SCENE_FILE = "scene.py"
+# Scene 在 __init__ 中设置的实例属性，索引里只有类属性，这里补上
+SCENE_ATTRIBUTES = {"camera", "renderer", "mobjects", "foreground_mobjects", "time", "duration", "random_seed"}
+# 这些网格方法的参数必须是 A1-F6 的网格编号: 方法名 -> [(位置参数下标, 参数名)]
+GRID_ARGUMENTS = {"place_at_grid": [(1, "grid_pos")], "place_in_area": [(1, "top_left"), (2, "bottom_right")]}
+MAX_REPAIRS = 10
+
+
+@dataclass
+class ValidationIssue:
+    kind: str  # "syntax" | "no_scene" | "undefined_name" | "attribute" | "arity" | "unexpected_kwarg" | "grid_cell"
+    error: str  # Python 运行时会给出的报错，如 "NameError: name 'x' is not defined"
+    line_number: Optional[int] = None
+
+    def traceback(self) -> str:
+        """The issue dressed as the traceback a render would have produced, for the local / LLM fixers"""
+        where = f'File "{SCENE_FILE}", line {self.line_number}, in construct\n' if self.line_number else ""
+        return f"Traceback (most recent call last):\n  {where}{self.error}"
+
+    def describe(self) -> str:
+        return f"第 {self.line_number} 行: {self.error}" if self.line_number else self.error
+
+
+@dataclass
+class ValidationResult:
+    code: str  # 自动修复后的代码
+    issues: List[ValidationIssue] = field(default_factory=list)
+    repairs: List[str] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return not self.issues
+
+    @property
+    def rejected(self) -> bool:
+        """Nothing to render at all; only regenerating the section helps"""
+        return any(i.kind == "no_scene" for i in self.issues)
+
+    def error_message(self) -> str:
+        return "\n".join(i.traceback() for i in self.issues)
+
+
+def _function_defs(body: List[ast.stmt]) -> Dict[str, ast.FunctionDef]:
+    return {n.name: n for n in body if isinstance(n, ast.FunctionDef)}
+
+
+_BASE_METHODS = _function_defs(next(n for n in ast.parse(base_class).body if isinstance(n, ast.ClassDef)).body)
+
+
+def _parse_signature(signature: str) -> Optional[ast.arguments]:
+    try:
+        return ast.parse(f"def _f{signature}: pass").body[0].args
+    except SyntaxError:
+        return None  # 默认值的 repr 不是合法表达式，如 <function ...>
+
+
+def _check_arity(name: str, call: ast.Call, args: ast.arguments, drop_self: bool, extra_kwargs=None) -> Optional[str]:
+    """TypeError text for a call that cannot bind to `args`, or None"""
+    if any(isinstance(a, ast.Starred) for a in call.args) or any(k.arg is None for k in call.keywords):
+        return None
+    params = [*args.posonlyargs, *args.args][1 if drop_self else 0 :]
+    names = [p.arg for p in params]
+    given = [k.arg for k in call.keywords]
+    if args.vararg is None and len(call.args) > len(params):
+        return f"TypeError: {name}() takes {len(params)} positional arguments but {len(call.args)} were given"
+    required = names[: len(names) - len(args.defaults)]
+    missing = [n for n in required[len(call.args) :] if n not in given]
+    missing += [p.arg for p, d in zip(args.kwonlyargs, args.kw_defaults) if d is None and p.arg not in given]
+    if missing:
+        return f"TypeError: {name}() missing {len(missing)} required argument(s): {', '.join(repr(m) for m in missing)}"
+    accepted = set(names) | {p.arg for p in args.kwonlyargs}
+    if args.kwarg is not None:
+        if extra_kwargs is None:
+            return None
+        accepted |= set(extra_kwargs)
+    for kw in given:
+        if kw not in accepted:
+            prefix = f"{name}.__init__()" if name[:1].isupper() else f"{name}()"
+            return f"TypeError: {prefix} got an unexpected keyword argument '{kw}'"
+    return None
+
+
+def _clamp_cell(cell: str) -> Optional[str]:
+    """'G7' -> 'F6', 'b2' -> 'B2'; None when the literal is not a cell at all"""
+    m = re.fullmatch(r"\s*([A-Za-z])\s*(\d+)\s*", cell)
+    if not m:
+        return None
+    row = min(m.group(1).upper(), GRID_ROWS[-1])
+    col = min(max(int(m.group(2)), 1), len(GRID_COLS))
+    return f"{row}{col}"
+
+
+class _Checker:
+    def __init__(self, code: str, tree: ast.Module):
+        self.code = code
+        self.tree = tree
+        self.index = get_manim_index()
+        self.issues: List[ValidationIssue] = []
+        # 单元格字面量 -> 可替换的修复 (lineno, col, end_lineno, end_col, text)
+        self.cell_edits: List[tuple] = []
+
+        star_modules = {n.module for n in ast.walk(tree) if isinstance(n, ast.ImportFrom) and any(a.name == "*" for a in n.names)}
+        # 没有索引或有其他 * 导入时无法列全可用名称，只报告确定错误的旧 API 名
+        self.strict_names = bool(self.index) and star_modules <= {"manim"}
+        self.code_names = set(_defined_names(tree))
+        self.defined: Set[str] = self.code_names | set(dir(builtins)) | {"__file__"}
+        for n in ast.walk(tree):
+            if isinstance(n, (ast.Import, ast.ImportFrom)):
+                self.defined |= {(a.asname or a.name).split(".")[0] for a in n.names}
+            elif isinstance(n, ast.ExceptHandler) and n.name:
+                self.defined.add(n.name)
+        if "manim" in star_modules:
+            self.defined |= set(self.index.names)
+
+        self.classes = [n for n in tree.body if isinstance(n, ast.ClassDef)]
+        self.methods: Dict[str, ast.FunctionDef] = dict(_BASE_METHODS)
+        for cls in self.classes:
+            self.methods.update(_function_defs(cls.body))
+        self.functions = _function_defs(tree.body)
+        self.self_attributes = set(self.methods) | {"grid", "title", "lecture"} | SCENE_ATTRIBUTES
+        for n in ast.walk(tree):
+            if isinstance(n, ast.Attribute) and isinstance(n.ctx, ast.Store) and _is_self(n.value):
+                self.self_attributes.add(n.attr)
+        for cls in self.classes:
+            for stmt in cls.body:
+                if isinstance(stmt, ast.Assign):
+                    self.self_attributes |= {t.id for t in stmt.targets if isinstance(t, ast.Name)}
+
+    def add(self, kind: str, error: str, node=None):
+        line = getattr(node, "lineno", None)
+        if not any(i.kind == kind and i.error == error and i.line_number == line for i in self.issues):
+            self.issues.append(ValidationIssue(kind, error, line))
+
+    def run(self) -> List[ValidationIssue]:
+        scenes = [
+            c for c in self.classes
+            if c.name != "TeachingScene" and c.bases and "construct" in _function_defs(c.body)
+        ]
+        if not scenes:
+            self.add("no_scene", "代码中没有带 construct() 方法的 Scene 子类")
+        for node in ast.walk(self.tree):
+            if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load):
+                self._check_name(node)
+            elif isinstance(node, ast.Attribute) and isinstance(node.ctx, ast.Load) and _is_self(node.value):
+                self._check_self_attribute(node)
+            elif isinstance(node, ast.Call):
+                self._check_call(node)
+            elif isinstance(node, ast.Subscript) and _is_self_grid(node.value):
+                self._check_cell(node.slice)
+        return self.issues
+
+    def _check_name(self, node: ast.Name):
+        name = node.id
+        if name in self.defined:
+            return
+        if self.strict_names or name in RENAMED_NAMES or name in MISSING_IMPORTS:
+            self.add("undefined_name", f"NameError: name '{name}' is not defined", node)
+
+    def _check_self_attribute(self, node: ast.Attribute):
+        attr = node.attr
+        if attr in self.self_attributes or attr.startswith("_"):
+            return
+        scene_methods = self.index.methods("Scene") if self.index else []
+        if attr in scene_methods:
+            return
+        # 没有索引时 Scene 的方法列不全，只报告与已知方法几乎同名的拼写错误
+        if scene_methods or difflib.get_close_matches(attr, list(self.self_attributes), n=1, cutoff=0.8):
+            scene = next((c.name for c in self.classes if c.name != "TeachingScene"), "Scene")
+            self.add("attribute", f"AttributeError: '{scene}' object has no attribute '{attr}'", node)
+
+    def _check_call(self, call: ast.Call):
+        func = call.func
+        error = None
+        if isinstance(func, ast.Attribute) and _is_self(func.value) and func.attr in self.methods:
+            error = _check_arity(func.attr, call, self.methods[func.attr].args, drop_self=True)
+            for position, keyword in GRID_ARGUMENTS.get(func.attr, []):
+                arg = call.args[position] if len(call.args) > position else next(
+                    (k.value for k in call.keywords if k.arg == keyword), None
+                )
+                self._check_cell(arg)
+        elif isinstance(func, ast.Name) and func.id in self.functions:
+            error = _check_arity(func.id, call, self.functions[func.id].args, drop_self=False)
+        elif isinstance(func, ast.Name) and func.id not in self.code_names and self.index.signature(func.id):
+            args = _parse_signature(self.index.signature(func.id))
+            if args is not None:
+                error = _check_arity(func.id, call, args, drop_self=False, extra_kwargs=self.index.accepted_kwargs(func.id))
+        if error:
+            self.add("unexpected_kwarg" if "unexpected keyword" in error else "arity", error, call)
+
+    def _check_cell(self, node):
+        if not (isinstance(node, ast.Constant) and isinstance(node.value, str)) or is_valid_cell(node.value):
+            return
+        self.add("grid_cell", f"KeyError: '{node.value}'", node)
+        clamped = _clamp_cell(node.value)
+        if clamped:
+            quote = (ast.get_source_segment(self.code, node) or "'")[0]
+            self.cell_edits.append((node.lineno, node.col_offset, node.end_lineno, node.end_col_offset, f"{quote}{clamped}{quote}"))
+
+
+def _is_self(node) -> bool:
+    return isinstance(node, ast.Name) and node.id == "self"
+
+
+def _is_self_grid(node) -> bool:
+    return isinstance(node, ast.Attribute) and node.attr == "grid" and _is_self(node.value)
+
+
+def _inspect(code: str):
+    try:
+        tree = ast.parse(code)
+    except SyntaxError as e:
+        return [ValidationIssue("syntax", f"SyntaxError: {e.msg}", e.lineno)], []
+    checker = _Checker(code, tree)
+    return checker.run(), checker.cell_edits
+
+
+def _compiles(code: str) -> bool:
+    try:
+        compile(code, SCENE_FILE, "exec")
+        return True
+    except (SyntaxError, ValueError):
+        return False
+
+
+def validate_section_code(code: str) -> ValidationResult:
+    """Statically check generated section code and repair what can be repaired deterministically.
+
+    Parses the code, resolves names against builtins, the code's own definitions and the manim
+    namespace, checks self.* attributes and call arities against TeachingScene / Scene / helper
+    definitions and manim signatures, and checks grid cell literals. Out-of-range cells are
+    clamped into A1-F6; naming and keyword problems go through the local fixer rules. Whatever
+    is left is returned in `issues`, with the code after all repairs.
+    """
+    repairs: List[str] = []
+    unrepairable: Set[tuple] = set()
+    for _ in range(MAX_REPAIRS):
+        issues, cell_edits = _inspect(code)
+        if cell_edits:
+            fixed = _apply_edits(code, cell_edits)
+            if fixed != code and _compiles(fixed):
+                repairs.append(f"网格编号越界，已修正为 A1-F6 内最近的单元格 ({len(cell_edits)} 处)")
+                code = fixed
+                continue
+        pending = [i for i in issues if i.kind not in ("grid_cell", "no_scene", "arity") and (i.kind, i.error, i.line_number) not in unrepairable]
+        if not pending:
+            return ValidationResult(code, issues, repairs)
+        issue = pending[0]
+        fixed = _repair_attribute(code, issue) if issue.kind == "attribute" else None
+        if fixed is None:
+            result = get_local_fixer().fix(code, issue.traceback())
+            fixed = result[0] if result else None
+        if fixed and fixed != code and _compiles(fixed):
+            repairs.append(f"{issue.describe()} -> 已自动修复")
+            code = fixed
+        else:
+            unrepairable.add((issue.kind, issue.error, issue.line_number))
+    issues, _ = _inspect(code)
+    return ValidationResult(code, issues, repairs)
+
+
+def _repair_attribute(code: str, issue: ValidationIssue) -> Optional[str]:
+    """self.place_at_gird -> self.place_at_grid when exactly one known self attribute is that close"""
+    attr = re.search(r"has no attribute '(\w+)'", issue.error).group(1)
+    tree = ast.parse(code)
+    checker = _Checker(code, tree)
+    candidates = checker.self_attributes | set(checker.index.methods("Scene") if checker.index else [])
+    close = difflib.get_close_matches(attr, sorted(candidates), n=1, cutoff=0.8)
+    return _rename_attribute(code, tree, attr, close[0]) if close else None
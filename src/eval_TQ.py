@@ -5,8 +5,6 @@ import argparse
 from dataclasses import dataclass
 from pathlib import Path
 from typing import List, Dict, Tuple, Any, Callable, Optional
-import numpy as np
-from scipy import stats
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import functools
 import random
@@ -217,6 +215,10 @@ class SelectiveKnowledgeUnlearning:
 
 
 def format_evaluation_report(results: List[EvaluationResult]) -> str:
+    # numpy/scipy 只有出报告时才需要，放在这里避免拖慢启动
+    import numpy as np
+    from scipy import stats
+
     report = """
 ========================================
 SKU 教育视频效果评估报告 (选择性遗忘测试)
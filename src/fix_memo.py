@@ -0,0 +1,258 @@
+import re
+import json
+import time
+import difflib
+import hashlib
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from local_fixer import _error_line
+from rate_limiter import interprocess_lock
+from run_manifest import atomic_write_json
+
+
+MEMO_FORMAT = 1
+_DEFAULT_MEMO_PATH = Path(__file__).with_name(".fix_memo") / "memo.json"
+MAX_HUNKS = 3  # 只记忆局部修改，整段重写的修复无法迁移到别的代码上
+MAX_CHANGED_LINES = 15
+EVICT_FAILURES = 2  # 失败次数达到该值且多于成功次数的补丁被淘汰
+MAX_ENTRIES = 1000
+
+_ERROR_LINE = re.compile(r"^(\w+(?:Error|Exception|Warning)|KeyboardInterrupt)\b:?.*$")
+
+
+def error_signature(error_msg: str) -> Optional[str]:
+    """The final exception line with paths, addresses and numbers normalized away"""
+    for line in reversed((error_msg or "").strip().splitlines()):
+        line = line.strip()
+        if _ERROR_LINE.match(line):
+            line = re.sub(r"0x[0-9a-fA-F]+", "0x?", line)
+            line = re.sub(r"(?:[A-Za-z]:)?(?:[/\\][\w.\-]+){2,}", "<path>", line)
+            return re.sub(r"\b\d+(?:\.\d+)?\b", "N", line)
+    return None
+
+
+def _snippet(code: str, error_msg: str) -> str:
+    """The offending source line, whitespace-normalized"""
+    line = _error_line(error_msg)
+    lines = code.splitlines()
+    if line is None or not 1 <= line <= len(lines):
+        return ""
+    return " ".join(lines[line - 1].split())
+
+
+def _indent(line: str) -> int:
+    return len(line) - len(line.lstrip())
+
+
+def make_patch(old: str, new: str) -> Optional[List[Dict[str, Any]]]:
+    """Line hunks turning `old` into `new`, indentation-relative so they apply at any nesting depth.
+
+    Returns None when the change is too large to be a reusable patch.
+    """
+    a, b = old.splitlines(), new.splitlines()
+    hunks, changed = [], 0
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, a, b, autojunk=False).get_opcodes():
+        if tag == "equal":
+            continue
+        changed += max(i2 - i1, j2 - j1)
+        # 纯插入时带上前一行作为定位锚点
+        if i1 == i2:
+            if i1 == 0:
+                i2, j2 = i2 + 1, j2 + 1
+            else:
+                i1, j1 = i1 - 1, j1 - 1
+        before = a[i1:i2]
+        if not any(line.strip() for line in before):
+            return None
+        base = _indent(before[0])
+        hunks.append({
+            "before": [line.strip() for line in before],
+            "after": [[_indent(line) - base, line.strip()] for line in b[j1:j2]],
+        })
+    if not hunks or len(hunks) > MAX_HUNKS or changed > MAX_CHANGED_LINES:
+        return None
+    return hunks
+
+
+def apply_patch(code: str, hunks: List[Dict[str, Any]]) -> Optional[str]:
+    """Apply hunks whose `before` block occurs exactly once in `code`; None if any hunk does not fit"""
+    lines = code.splitlines()
+    for hunk in hunks:
+        before = hunk["before"]
+        stripped = [line.strip() for line in lines]
+        matches = [p for p in range(len(lines) - len(before) + 1) if stripped[p : p + len(before)] == before]
+        if len(matches) != 1:
+            return None
+        p = matches[0]
+        base = _indent(lines[p])
+        after = [" " * max(0, base + delta) + text if text else "" for delta, text in hunk["after"]]
+        lines[p : p + len(before)] = after
+    patched = "\n".join(lines) + ("\n" if code.endswith("\n") else "")
+    try:
+        compile(patched, "<fix_memo>", "exec")
+    except (SyntaxError, ValueError):
+        return None
+    return patched if patched != code else None
+
+
+def _digest(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class FixMemo:
+    """Persistent map from (error signature, offending line) to patches that fixed it before.
+
+    LLM fixes are proposed to the memo as line hunks and only stored once the next render
+    shows they worked (success, or at least a different error). Lookups try the exact
+    signature + line first, then any patch recorded for the same signature that applies
+    cleanly. Patches that keep failing are evicted. The file is shared by every topic and
+    process and updated under a file lock.
+    """
+
+    def __init__(self, path=None, enabled: bool = True):
+        self.path = Path(path or _DEFAULT_MEMO_PATH)
+        self.lock_path = self.path.with_name(f".{self.path.name}.lock")
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._data: Optional[Dict[str, Any]] = None
+        self._mtime = None
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self.lookups = 0
+        self.hits = 0
+
+    def _read(self) -> Dict[str, Any]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("format") == MEMO_FORMAT:
+                return data
+        except (OSError, ValueError):
+            pass
+        return {"format": MEMO_FORMAT, "entries": {}}
+
+    def _entries(self) -> Dict[str, Any]:
+        """Cached view of the file, reloaded when another process has rewritten it"""
+        try:
+            mtime = self.path.stat().st_mtime_ns
+        except OSError:
+            mtime = None
+        if self._data is None or mtime != self._mtime:
+            self._data, self._mtime = self._read(), mtime
+        return self._data["entries"]
+
+    def _update(self, fn) -> None:
+        try:
+            with interprocess_lock(self.lock_path):
+                data = self._read()
+                fn(data["entries"])
+                if len(data["entries"]) > MAX_ENTRIES:
+                    ranked = sorted(data["entries"], key=lambda k: data["entries"][k]["last_used"])
+                    for key in ranked[: len(data["entries"]) - MAX_ENTRIES]:
+                        del data["entries"][key]
+                atomic_write_json(self.path, data)
+                self._data, self._mtime = data, self.path.stat().st_mtime_ns
+        except OSError as e:
+            print(f"⚠️ 修复备忘录写入失败: {e}")
+
+    @staticmethod
+    def _key(signature: str, snippet: str) -> str:
+        return _digest(f"{signature}\n{snippet}")[:16]
+
+    def lookup(self, code: str, error_msg: str) -> Optional[str]:
+        """A previously successful patch for this error applied to `code`, or None"""
+        signature = error_signature(error_msg)
+        if not self.enabled or not signature:
+            return None
+        key = self._key(signature, _snippet(code, error_msg))
+        with self._lock:
+            self.lookups += 1
+            entries = self._entries()
+            candidates = [(key, entries[key])] if key in entries else []
+            candidates += [(k, e) for k, e in entries.items() if k != key and e["signature"] == signature]
+            for entry_key, entry in candidates:
+                patches = sorted(
+                    entry["patches"].items(),
+                    key=lambda kv: (kv[1]["successes"] + 1) / (kv[1]["successes"] + kv[1]["failures"] + 2),
+                    reverse=True,
+                )
+                for patch_id, patch in patches:
+                    fixed = apply_patch(code, patch["hunks"])
+                    if fixed:
+                        self.hits += 1
+                        self._pending[_digest(fixed)] = {"key": entry_key, "patch_id": patch_id, "signature": signature}
+                        return fixed
+        return None
+
+    def propose(self, code: str, error_msg: str, fixed_code: str) -> None:
+        """Remember an LLM fix as a candidate; it is stored once record_outcome confirms it"""
+        signature = error_signature(error_msg)
+        hunks = make_patch(code, fixed_code) if self.enabled and signature else None
+        if not hunks:
+            return
+        snippet = _snippet(code, error_msg)
+        patch_id = _digest(json.dumps(hunks, ensure_ascii=False))[:16]
+        with self._lock:
+            self._pending[_digest(fixed_code)] = {
+                "key": self._key(signature, snippet),
+                "patch_id": patch_id,
+                "signature": signature,
+                "snippet": snippet,
+                "hunks": hunks,
+            }
+
+    def record_outcome(self, code: str, success: bool, error_msg: str = "") -> None:
+        """Called after rendering `code`. A render failing with a different error still counts as fixing the original one"""
+        with self._lock:
+            pending = self._pending.pop(_digest(code), None)
+        if not pending:
+            return
+        worked = success or (error_msg and error_signature(error_msg) != pending["signature"])
+
+        def fn(entries):
+            entry = entries.get(pending["key"])
+            if entry is None:
+                if not worked or "hunks" not in pending:
+                    return
+                entry = entries[pending["key"]] = {
+                    "signature": pending["signature"], "snippet": pending["snippet"], "patches": {}, "last_used": 0,
+                }
+            patch = entry["patches"].get(pending["patch_id"])
+            if patch is None:
+                if not worked or "hunks" not in pending:
+                    return
+                patch = entry["patches"][pending["patch_id"]] = {"hunks": pending["hunks"], "successes": 0, "failures": 0}
+            patch["successes" if worked else "failures"] += 1
+            entry["last_used"] = time.time()
+            if patch["failures"] >= EVICT_FAILURES and patch["failures"] > patch["successes"]:
+                del entry["patches"][pending["patch_id"]]
+                if not entry["patches"]:
+                    del entries[pending["key"]]
+
+        self._update(fn)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = self._entries()
+            return {
+                "entries": len(entries),
+                "patches": sum(len(e["patches"]) for e in entries.values()),
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "hit_rate": self.hits / self.lookups if self.lookups else 0.0,
+            }
+
+
+_FIX_MEMO: Optional[FixMemo] = None
+
+
+def get_fix_memo() -> FixMemo:
+    """Process-wide memo; settings come from the "fix_memo" section of api_config.json"""
+    global _FIX_MEMO
+    if _FIX_MEMO is None:
+        from llm_client import cfg
+
+        enabled = str(cfg("fix_memo", "enabled", "1")).lower() not in ("0", "false", "no", "off")
+        _FIX_MEMO = FixMemo(path=cfg("fix_memo", "path", None), enabled=enabled)
+    return _FIX_MEMO
@@ -0,0 +1,277 @@
+import json
+from dataclasses import asdict, dataclass, field
+from typing import List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from keyframes import KeyframeOptions, sample_keyframes
+from layout_check import FRAME_HALF_HEIGHT, FRAME_HALF_WIDTH, GRID_COLS, GRID_ROWS, TITLE_BOTTOM_EDGE, Box
+
+
+FOREGROUND_VALUE = 50  # 背景为纯黑，亮度高于该值的像素视为前景
+GRAY_SATURATION = 60  # 饱和度低于该值归入白/灰色
+HUE_BUCKETS = ["red", "yellow", "green", "cyan", "blue", "magenta"]
+COLOR_NAMES = {
+    "white": "白色", "red": "红色", "yellow": "黄色", "green": "绿色", "cyan": "青色", "blue": "蓝色", "magenta": "品红色",
+}
+MIN_REGION_UNITS = 0.01  # 小于该面积（平方单位）的区域视为噪点
+EDGE_MARGIN = 0.05  # 距画面边缘小于该值视为被裁切
+LECTURE_MARGIN = 0.6  # 左边距在该范围内的区域属于讲解词（to_edge(LEFT, buff=0.2)）
+MIN_FILL = 0.5  # 膨胀后的文字块至少填满外框的该比例，才尝试拆分粘连在一起的同色元素
+
+SEVERITY = {"lecture": 0, "title": 1, "off_screen": 2, "overlap": 3}
+
+
+@dataclass
+class Region:
+    box: Box
+    color: str
+    pixels: int
+    component: int = 0  # 所属连通块；同色元素粘连后拆出的两块共用一个编号
+
+
+@dataclass
+class FrameIssue:
+    kind: str  # "overlap" | "off_screen" | "lecture" | "title"
+    timestamp: float
+    cells: List[str]
+    colors: List[str] = field(default_factory=list)
+    area: float = 0.0
+    free_cells: List[str] = field(default_factory=list)
+
+    def problem(self) -> str:
+        where = f"t={self.timestamp:.1f}s 时 {', '.join(self.cells) or '网格外'}"
+        if self.kind == "overlap":
+            if len(set(self.colors)) == 1:
+                return f"{where} 处两个{COLOR_NAMES.get(self.colors[0], self.colors[0])}元素部分重叠"
+            colors = "与".join(COLOR_NAMES.get(c, c) for c in self.colors)
+            return f"{where} 处{colors}两个元素部分重叠"
+        if self.kind == "off_screen":
+            return f"{where} 处有元素被画面边缘裁切"
+        if self.kind == "lecture":
+            return f"{where} 处有元素伸入左侧讲解词区域"
+        return f"{where} 处有元素压住顶部标题"
+
+    def solution(self) -> str:
+        target = f"移到空闲网格 {self.free_cells[0]}" if self.free_cells else "移到空闲的网格位置"
+        if self.kind == "overlap":
+            return f"将其中一个元素{target}，或减小 scale_factor 使两者分开"
+        if self.kind == "off_screen":
+            return f"减小该元素的 scale_factor / font_size，或{target}"
+        return f"将该元素放回右侧网格区域（{target}），并减小其尺寸"
+
+
+@dataclass
+class FrameLayoutReport:
+    issues: List[FrameIssue] = field(default_factory=list)
+    frames: int = 0
+
+    @property
+    def has_issues(self) -> bool:
+        return bool(self.issues)
+
+    def improvements(self, limit: int = 3) -> List[str]:
+        """The most severe issues in the "[LAYOUT] Problem: ...; Solution: ..." form get_mllm_feedback produces"""
+        ranked = sorted(self.issues, key=lambda i: (SEVERITY[i.kind], -i.area))[:limit]
+        return [f"[LAYOUT] Problem: {i.problem()}; Solution: {i.solution()}" for i in ranked]
+
+    def to_json(self) -> str:
+        return json.dumps({"frames": self.frames, "issues": [asdict(i) for i in self.issues]}, ensure_ascii=False)
+
+
+def _color_masks(frame: np.ndarray):
+    """Foreground split by color: gray/white plus six hue buckets (OpenCV hue is 0..179)"""
+    hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+    hue, sat, val = hsv[..., 0], hsv[..., 1], hsv[..., 2]
+    fg = val > FOREGROUND_VALUE
+    masks = {"white": fg & (sat < GRAY_SATURATION)}
+    bucket = ((hue.astype(np.int16) + 15) // 30) % 6
+    colored = fg & (sat >= GRAY_SATURATION)
+    for n, name in enumerate(HUE_BUCKETS):
+        masks[name] = colored & (bucket == n)
+    return fg, masks
+
+
+def _split_staircase(component: np.ndarray, k: int) -> Optional[Tuple[Tuple[int, int, int, int], ...]]:
+    """Pixel boxes (left, top, right, bottom) of two same-color objects that merged into one blob.
+
+    Row by row such a blob spans the upper object, then both, then the lower one. It is split when
+    the top and bottom bands are shifted the same way horizontally, at least half a kernel's height
+    of rows spans both, and both pieces are solid (text, filled shapes) rather than a curve. Objects
+    offset only vertically or only horizontally look like one bigger object and are not split.
+    """
+    rows = np.flatnonzero(component.any(axis=1))
+    if len(rows) < 4 * k:
+        return None
+    top, bottom = rows[0], rows[-1]
+    body = component[top : bottom + 1]
+    lefts = body.argmax(axis=1)
+    rights = body.shape[1] - 1 - body[:, ::-1].argmax(axis=1)
+    band = max(k, len(body) // 5)
+    a = lefts[:band].min(), rights[:band].max()
+    b = lefts[-band:].min(), rights[-band:].max()
+    dl, dr = int(b[0]) - int(a[0]), int(b[1]) - int(a[1])
+    if min(abs(dl), abs(dr)) <= 2 * k or (dl > 0) != (dr > 0):
+        return None
+    covers_a = np.flatnonzero((lefts <= a[0] + k) & (rights >= a[1] - k))
+    covers_b = np.flatnonzero((lefts <= b[0] + k) & (rights >= b[1] - k))
+    if not len(covers_a) or not len(covers_b) or covers_a[-1] - covers_b[0] < k // 2:
+        return None
+    pieces = (int(a[0]), int(top), int(a[1]) + 1, int(top + covers_a[-1]) + 1), (
+        int(b[0]), int(top + covers_b[0]), int(b[1]) + 1, int(bottom) + 1
+    )
+    for x0, y0, x1, y1 in pieces:
+        if component[y0:y1, x0:x1].mean() < MIN_FILL:
+            return None
+    return pieces
+
+
+def _regions(mask: np.ndarray, color: str, kernel: np.ndarray, split: bool = False) -> List[Region]:
+    h, w = mask.shape
+    sx, sy = 2 * FRAME_HALF_WIDTH / w, 2 * FRAME_HALF_HEIGHT / h
+    # 膨胀把同一段文字的字形连成一块
+    merged = cv2.dilate(mask.astype(np.uint8), kernel)
+    count, labels, stats, _ = cv2.connectedComponentsWithStats(merged, connectivity=8)
+
+    def to_box(left, top, right, bottom) -> Box:
+        return Box(
+            left * sx - FRAME_HALF_WIDTH,
+            FRAME_HALF_HEIGHT - bottom * sy,
+            right * sx - FRAME_HALF_WIDTH,
+            FRAME_HALF_HEIGHT - top * sy,
+        )
+
+    regions = []
+    for n in range(1, count):
+        left, top, width, height, pixels = stats[n]
+        if width * height * sx * sy < MIN_REGION_UNITS:
+            continue
+        pieces = None
+        if split:
+            component = labels[top : top + height, left : left + width] == n
+            pieces = _split_staircase(component, kernel.shape[0])
+        if pieces is None:
+            regions.append(Region(to_box(left, top, left + width, top + height), color, int(pixels), n))
+            continue
+        # 同色元素斜向错开后粘连成一块：拆成上下两个元素，交给重叠检查
+        for x0, y0, x1, y1 in pieces:
+            piece_pixels = int(np.count_nonzero(mask[top + y0 : top + y1, left + x0 : left + x1]))
+            regions.append(Region(to_box(left + x0, top + y0, left + x1, top + y1), color, piece_pixels, n))
+    return regions
+
+
+def _intersection(a: Box, b: Box) -> float:
+    w = min(a.x1, b.x1) - max(a.x0, b.x0)
+    h = min(a.y1, b.y1) - max(a.y0, b.y0)
+    return w * h if w > 0 and h > 0 else 0.0
+
+
+def _contains(outer: Box, inner: Box, tol: float = 0.05) -> bool:
+    return (
+        outer.x0 - tol <= inner.x0 and outer.y0 - tol <= inner.y0 and inner.x1 <= outer.x1 + tol and inner.y1 <= outer.y1 + tol
+    )
+
+
+def _area(box: Box) -> float:
+    w, h = box.size
+    return w * h
+
+
+def _free_cells(regions: List[Region], near: Box) -> List[str]:
+    """Grid cells no region touches, nearest to `near` first"""
+    used = set()
+    for r in regions:
+        used |= r.box.cells()
+    free = [row + col for row in GRID_ROWS for col in GRID_COLS if row + col not in used]
+    cx, cy = near.center
+
+    def dist(cell):
+        x, y = 0.5 + GRID_COLS.index(cell[1]), 2.2 - GRID_ROWS.index(cell[0])
+        return (x - cx) ** 2 + (y - cy) ** 2
+
+    return sorted(free, key=dist)[:3]
+
+
+def analyze_frame(frame: np.ndarray, timestamp: float = 0.0) -> List[FrameIssue]:
+    """Layout issues visible in one frame of a TeachingScene video"""
+    h = frame.shape[0]
+    kernel = np.ones((max(3, h // 80), max(3, h // 80)), np.uint8)
+    fg, masks = _color_masks(frame)
+
+    everything = _regions(fg, "any", kernel)
+    lecture = [r for r in everything if r.box.x0 < -FRAME_HALF_WIDTH + LECTURE_MARGIN]
+    title = [
+        r for r in everything if r not in lecture and r.box.y0 > TITLE_BOTTOM_EDGE and abs(r.box.center[0]) < 3
+    ]
+    content = [r for r in everything if r not in lecture and r not in title]
+    issues = []
+
+    def add(kind, box, colors=(), area=0.0):
+        issues.append(FrameIssue(kind, timestamp, sorted(box.cells()), list(colors), round(area, 3), _free_cells(content, box)))
+
+    # 讲解词区域：与网格区（x >= 0）连成一块，或有其他元素落在讲解词外框内
+    if lecture:
+        lecture_box = Box(
+            min(r.box.x0 for r in lecture),
+            min(r.box.y0 for r in lecture),
+            max(r.box.x1 for r in lecture),
+            max(r.box.y1 for r in lecture),
+        )
+        for r in lecture:
+            if r.box.x1 > 0:
+                add("lecture", r.box, area=_area(r.box))
+        for r in content:
+            if _intersection(r.box, lecture_box) > 0:
+                add("lecture", r.box, area=_intersection(r.box, lecture_box))
+
+    for r in title:
+        if r.box.y0 < TITLE_BOTTOM_EDGE - 0.3:
+            add("title", r.box, area=_area(r.box))
+
+    for r in content:
+        b = r.box
+        if (
+            b.x0 < -FRAME_HALF_WIDTH + EDGE_MARGIN
+            or b.x1 > FRAME_HALF_WIDTH - EDGE_MARGIN
+            or b.y0 < -FRAME_HALF_HEIGHT + EDGE_MARGIN
+            or b.y1 > FRAME_HALF_HEIGHT - EDGE_MARGIN
+        ):
+            add("off_screen", b, area=_area(b))
+
+    # 区域部分相交（而非一个包含另一个，如方框里的标签）视为重叠；同色的只比较从同一连通块拆出的两块
+    colored = []
+    for color, mask in masks.items():
+        colored.extend(r for r in _regions(mask, color, kernel, split=True) if r.box.x0 > -FRAME_HALF_WIDTH + LECTURE_MARGIN)
+    for i, a in enumerate(colored):
+        for b in colored[i + 1 :]:
+            if a.color == b.color and a.component != b.component:
+                continue
+            inter = _intersection(a.box, b.box)
+            # 同色拆出的两块在拆分时已确认相交，不再要求相交面积
+            if a.color != b.color and inter < 0.15 * min(_area(a.box), _area(b.box)):
+                continue
+            if _contains(a.box, b.box) or _contains(b.box, a.box):
+                continue
+            union = Box(min(a.box.x0, b.box.x0), min(a.box.y0, b.box.y0), max(a.box.x1, b.box.x1), max(a.box.y1, b.box.y1))
+            add("overlap", union, (a.color, b.color), inter)
+    return issues
+
+
+def analyze_video_layout(video_path, max_frames: int = 12) -> FrameLayoutReport:
+    """Find overlapping, cut-off and lecture/title-covering regions on the settled frames of a section video.
+
+    Works on connected foreground regions per color, so it needs no API call and takes
+    milliseconds per frame; issues recurring across frames at the same cells are reported once.
+    """
+    # 不缩放，保持原始分辨率
+    keyframes = sample_keyframes(video_path, KeyframeOptions(max_frames=max_frames, max_side=100000))
+    report = FrameLayoutReport(frames=len(keyframes))
+    seen = set()
+    for kf in keyframes:
+        for issue in analyze_frame(kf.image, kf.timestamp):
+            key = (issue.kind, tuple(issue.cells))
+            if key not in seen:
+                seen.add(key)
+                report.issues.append(issue)
+    return report
@@ -0,0 +1,147 @@
+import math
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional
+
+import cv2
+import numpy as np
+
+
+@dataclass
+class KeyframeOptions:
+    """How the layout critic sees a section video"""
+
+    max_frames: int = 8  # 0 表示不抽帧，直接上传整段视频
+    max_side: int = 640  # 每帧长边缩放到的像素
+    sample_fps: float = 4.0  # 扫描视频时的采样帧率
+    change_threshold: float = 0.005  # 与上一关键帧相比变化像素占比超过该值才算新画面
+    stable_threshold: float = 0.001  # 相邻采样变化像素占比低于该值视为画面已静止（动画结束）
+    contact_sheet: bool = True  # 拼成一张联系表，而不是多张图片
+    jpeg_quality: int = 85
+
+
+@dataclass
+class Keyframe:
+    timestamp: float
+    image: np.ndarray
+    score: float = 0.0
+
+
+_THUMB_SIZE = (128, 72)
+_PIXEL_DELTA = 0.08
+
+
+def _thumbnail(frame: np.ndarray) -> np.ndarray:
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    return cv2.resize(gray, _THUMB_SIZE, interpolation=cv2.INTER_AREA).astype(np.float32) / 255.0
+
+
+def _changed_fraction(a: np.ndarray, b: np.ndarray) -> float:
+    return float(np.count_nonzero(np.abs(a - b) > _PIXEL_DELTA)) / a.size
+
+
+def _downscale(frame: np.ndarray, max_side: int) -> np.ndarray:
+    h, w = frame.shape[:2]
+    scale = max_side / max(h, w)
+    if scale >= 1:
+        return frame.copy()
+    return cv2.resize(frame, (round(w * scale), round(h * scale)), interpolation=cv2.INTER_AREA)
+
+
+def sample_keyframes(video_path, options: Optional[KeyframeOptions] = None) -> List[Keyframe]:
+    """Pick the settled states of a Manim video: frames where an animation has finished
+    (the picture stopped changing) and the picture differs enough from the last keyframe.
+
+    The final frame is always kept, since leftovers that were never faded out show up there.
+    When there are more candidates than `max_frames`, the biggest changes win. Returns [] if
+    the video cannot be decoded.
+    """
+    options = options or KeyframeOptions()
+    cap = cv2.VideoCapture(str(video_path))
+    if not cap.isOpened():
+        return []
+
+    try:
+        fps = cap.get(cv2.CAP_PROP_FPS) or 15.0
+        step = max(1, round(fps / options.sample_fps))
+        candidates: List[Keyframe] = []
+        last_kept = prev = None
+        last_frame = last_ts = None
+        index = 0
+        while cap.grab():
+            if index % step == 0:
+                ok, frame = cap.retrieve()
+                if not ok:
+                    break
+                ts = index / fps
+                thumb = _thumbnail(frame)
+                settled = prev is not None and _changed_fraction(thumb, prev) < options.stable_threshold
+                # 纯色画面（开头黑屏）不占名额
+                if settled and thumb.std() > 0.01:
+                    score = 1.0 if last_kept is None else _changed_fraction(thumb, last_kept)
+                    if score > options.change_threshold:
+                        candidates.append(Keyframe(ts, _downscale(frame, options.max_side), score))
+                        last_kept = thumb
+                prev = thumb
+                last_frame, last_ts = frame, ts
+            index += 1
+    finally:
+        cap.release()
+
+    if last_frame is None:
+        return []
+    if last_kept is not None and _changed_fraction(prev, last_kept) <= options.change_threshold:
+        candidates[-1].score = math.inf  # 结尾画面与最后一个关键帧相同
+    else:
+        candidates.append(Keyframe(last_ts, _downscale(last_frame, options.max_side), math.inf))
+
+    if len(candidates) > options.max_frames:
+        ranked = sorted(range(len(candidates) - 1), key=lambda i: candidates[i].score, reverse=True)
+        keep = sorted(ranked[: options.max_frames - 1]) + [len(candidates) - 1]
+        candidates = [candidates[i] for i in keep]
+    return candidates
+
+
+def build_contact_sheet(keyframes: List[Keyframe]) -> np.ndarray:
+    """Tile keyframes row by row in chronological order, each labelled '#n t=..s'"""
+    cols = math.ceil(math.sqrt(len(keyframes)))
+    rows = math.ceil(len(keyframes) / cols)
+    h, w = keyframes[0].image.shape[:2]
+    gap = 4
+    sheet = np.full((rows * (h + gap) - gap, cols * (w + gap) - gap, 3), 255, dtype=np.uint8)
+    for n, kf in enumerate(keyframes):
+        r, c = divmod(n, cols)
+        tile = cv2.resize(kf.image, (w, h)) if kf.image.shape[:2] != (h, w) else kf.image
+        y, x = r * (h + gap), c * (w + gap)
+        sheet[y : y + h, x : x + w] = tile
+        label = f"#{n + 1} t={kf.timestamp:.1f}s"
+        cv2.putText(sheet, label, (x + 6, y + 22), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 0), 4, cv2.LINE_AA)
+        cv2.putText(sheet, label, (x + 6, y + 22), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 255), 1, cv2.LINE_AA)
+    return sheet
+
+
+def extract_keyframes(video_path, out_dir, options: Optional[KeyframeOptions] = None) -> List[str]:
+    """Write the keyframes of `video_path` as JPEGs under `out_dir` and return their paths.
+
+    With `contact_sheet` the result is a single image; otherwise one file per keyframe.
+    """
+    options = options or KeyframeOptions()
+    keyframes = sample_keyframes(video_path, options)
+    if not keyframes:
+        return []
+
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    stem = Path(video_path).stem
+    params = [cv2.IMWRITE_JPEG_QUALITY, options.jpeg_quality]
+
+    if options.contact_sheet:
+        images = {out_dir / f"{stem}_keyframes.jpg": build_contact_sheet(keyframes)}
+    else:
+        images = {out_dir / f"{stem}_kf{n:02d}.jpg": kf.image for n, kf in enumerate(keyframes)}
+
+    paths = []
+    for path, image in images.items():
+        if cv2.imwrite(str(path), image, params):
+            paths.append(str(path))
+    return paths
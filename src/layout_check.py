@@ -0,0 +1,563 @@
+import re
+import ast
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
+
+
+# TeachingScene 的 6x6 网格：格子中心 x = 0.5 + col, y = 2.2 - row，格宽 1 个单位
+GRID_ROWS = "ABCDEF"
+GRID_COLS = "123456"
+FRAME_HALF_WIDTH = 14.22 / 2
+FRAME_HALF_HEIGHT = 8.0 / 2
+LECTURE_RIGHT_EDGE = -0.5  # 越过此线即可能压住左侧讲解词
+TITLE_BOTTOM_EDGE = 3.2
+
+# 本来就要贴着/连接其他物体的对象，不参与重叠判断
+CONNECTORS = {
+    "Arrow", "DoubleArrow", "CurvedArrow", "CurvedDoubleArrow", "Line", "DashedLine", "Vector",
+    "Brace", "BraceBetweenPoints", "SurroundingRectangle", "BackgroundRectangle", "Underline", "Cross",
+}
+GROUPS = {"VGroup", "Group"}
+HIDE_ANIMATIONS = {"FadeOut", "Uncreate", "Unwrite", "ShrinkToCenter", "FadeOutAndShift"}
+REPLACE_ANIMATIONS = {"ReplacementTransform", "FadeTransform", "TransformMatchingShapes", "TransformMatchingTex"}
+MOVE_ANIMATIONS = {"Transform", "ClockwiseTransform", "CounterclockwiseTransform"}
+COMPOSITE_ANIMATIONS = {"AnimationGroup", "LaggedStart", "Succession"}
+DIRECTIONS = {
+    "UP": (0, 1), "DOWN": (0, -1), "LEFT": (-1, 0), "RIGHT": (1, 0), "ORIGIN": (0, 0),
+    "UL": (-1, 1), "UR": (1, 1), "DL": (-1, -1), "DR": (1, -1),
+}
+# setup_layout 建立的讲解词和标题由基类负责，不检查
+LAYOUT_ATTRIBUTES = ("self.lecture", "self.title")
+
+
+@dataclass
+class Box:
+    x0: float
+    y0: float
+    x1: float
+    y1: float
+
+    @classmethod
+    def around(cls, cx: float, cy: float, w: float, h: float) -> "Box":
+        return cls(cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2)
+
+    @property
+    def center(self) -> Tuple[float, float]:
+        return (self.x0 + self.x1) / 2, (self.y0 + self.y1) / 2
+
+    @property
+    def size(self) -> Tuple[float, float]:
+        return self.x1 - self.x0, self.y1 - self.y0
+
+    def cells(self) -> Set[str]:
+        """Grid cells the box covers by at least a quarter of the cell width/height on each axis"""
+        cols = [str(j + 1) for j in range(6) if min(self.x1, j + 1) - max(self.x0, j) > 0.25]
+        rows = [GRID_ROWS[i] for i in range(6) if min(self.y1, 2.7 - i) - max(self.y0, 1.7 - i) > 0.25]
+        return {r + c for r in rows for c in cols}
+
+
+def cell_center(cell: str) -> Tuple[float, float]:
+    return 0.5 + GRID_COLS.index(cell[1]), 2.2 - GRID_ROWS.index(cell[0])
+
+
+def is_valid_cell(cell) -> bool:
+    return isinstance(cell, str) and len(cell) == 2 and cell[0] in GRID_ROWS and cell[1] in GRID_COLS
+
+
+@dataclass
+class LayoutConflict:
+    kind: str  # "overlap" | "off_screen" | "lecture" | "title" | "invalid_cell"
+    objects: List[str]
+    cells: List[str] = field(default_factory=list)
+    line_number: int = 0
+
+    def describe(self) -> str:
+        where = f"（第 {self.line_number} 行）" if self.line_number else ""
+        cells = ", ".join(self.cells)
+        if self.kind == "overlap":
+            return f"重叠: {' 与 '.join(self.objects)} 同时占用 {cells}{where}"
+        if self.kind == "off_screen":
+            return f"出界: {self.objects[0]} 超出屏幕可视范围{where}"
+        if self.kind == "lecture":
+            return f"遮挡: {self.objects[0]} 伸入左侧讲解词区域{where}"
+        if self.kind == "title":
+            return f"遮挡: {self.objects[0]} 伸入顶部标题区域{where}"
+        return f"网格错误: {self.objects[0]} 使用了不存在的网格位置 {cells}{where}"
+
+
+@dataclass
+class LayoutReport:
+    conflicts: List[LayoutConflict] = field(default_factory=list)
+    unverified: List[str] = field(default_factory=list)  # 屏幕上位置无法静态确定的对象
+    placements: int = 0
+    parsed: bool = True
+
+    @property
+    def is_clean(self) -> bool:
+        """Only a fully understood layout with no conflicts is clean"""
+        return self.parsed and self.placements > 0 and not self.conflicts and not self.unverified
+
+    def to_prompt(self) -> str:
+        lines = [f"- {c.describe()}" for c in self.conflicts]
+        if self.unverified:
+            lines.append(f"- 以下对象的位置无法静态确定，请在画面中确认: {', '.join(self.unverified)}")
+        return "\n".join(lines)
+
+
+@dataclass
+class _Obj:
+    name: str
+    kind: str = ""
+    size: Optional[Tuple[float, float]] = None
+    box: Optional[Box] = None
+    members: List[str] = field(default_factory=list)
+    line_number: int = 0
+
+
+def _const(node, default=None):
+    return node.value if isinstance(node, ast.Constant) else default
+
+
+def _kwarg(call: ast.Call, name: str, default=None):
+    for kw in call.keywords:
+        if kw.arg == name:
+            return _const(kw.value, default)
+    return default
+
+
+def _arg(call: ast.Call, index: int, name: str, default=None):
+    if len(call.args) > index:
+        return _const(call.args[index], default)
+    return _kwarg(call, name, default)
+
+
+def _vector(node) -> Optional[Tuple[float, float]]:
+    """Evaluate UP*2 + RIGHT*0.5 style direction arithmetic"""
+    if isinstance(node, ast.Name) and node.id in DIRECTIONS:
+        return DIRECTIONS[node.id]
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+        v = _vector(node.operand)
+        return (-v[0], -v[1]) if v else None
+    if isinstance(node, ast.BinOp):
+        if isinstance(node.op, (ast.Add, ast.Sub)):
+            a, b = _vector(node.left), _vector(node.right)
+            if a and b:
+                sign = 1 if isinstance(node.op, ast.Add) else -1
+                return a[0] + sign * b[0], a[1] + sign * b[1]
+        if isinstance(node.op, ast.Mult):
+            for vec, num in ((node.left, node.right), (node.right, node.left)):
+                v, k = _vector(vec), _const(num)
+                if v and isinstance(k, (int, float)):
+                    return v[0] * k, v[1] * k
+    return None
+
+
+def _text_width(text: str, font_size: float) -> Tuple[float, float]:
+    # 经验值：font_size=48 时西文字符约 0.3 单位宽，中文约 0.55，行高约 0.6
+    lines = text.split("\n") or [""]
+    widest = max(sum(0.55 if ord(ch) > 0x2E80 else 0.3 for ch in line) for line in lines)
+    k = font_size / 48
+    return widest * k, 0.6 * len(lines) * k
+
+
+def _estimate_size(call: ast.Call, kind: str) -> Optional[Tuple[float, float]]:
+    """Rough default size of common Manim mobjects in scene units"""
+    if kind in ("Text", "MarkupText"):
+        text = _arg(call, 0, "text")
+        if isinstance(text, str):
+            return _text_width(text, _kwarg(call, "font_size", 48))
+    if kind in ("MathTex", "Tex"):
+        parts = [_const(a) for a in call.args]
+        if parts and all(isinstance(p, str) for p in parts):
+            plain = re.sub(r"\\[a-zA-Z]+|[{}^_]", "", "".join(parts))
+            w, h = _text_width(plain, _kwarg(call, "font_size", 48))
+            return w * 0.9, h
+    if kind == "Circle":
+        r = _arg(call, 0, "radius", 1.0)
+        return (2 * r, 2 * r) if isinstance(r, (int, float)) else None
+    if kind == "Dot":
+        return 0.16, 0.16
+    if kind == "Square":
+        s = _arg(call, 0, "side_length", 2.0)
+        return (s, s) if isinstance(s, (int, float)) else None
+    if kind in ("Rectangle", "RoundedRectangle"):
+        w, h = _kwarg(call, "width", 4.0), _kwarg(call, "height", 2.0)
+        return (w, h) if isinstance(w, (int, float)) and isinstance(h, (int, float)) else None
+    if kind in ("ImageMobject", "SVGMobject"):
+        return 2.0, 2.0
+    return None
+
+
+class _LayoutWalker:
+    """Replays construct() statement by statement, keeping which named mobjects are on screen"""
+
+    def __init__(self, scene: ast.ClassDef):
+        self.methods = {n.name: n for n in scene.body if isinstance(n, ast.FunctionDef)}
+        self.objects: Dict[str, _Obj] = {}
+        self.visible: Dict[str, None] = {}
+        self.report = LayoutReport()
+        self._pairs: Set[Tuple[str, ...]] = set()
+        self._walked: Set[str] = set()
+        self._branch_depth = 0  # >0 时位于循环或分支体内，同一语句可能执行零次或多次
+
+    def _unpin(self, obj: _Obj):
+        """A position set inside a loop or branch is not known statically: report it instead of guessing"""
+        obj.box = None
+        if obj.name not in self.report.unverified:
+            self.report.unverified.append(obj.name)
+
+    # ---- objects -------------------------------------------------------
+    def _key(self, node) -> Optional[str]:
+        if isinstance(node, (ast.Name, ast.Attribute, ast.Subscript)):
+            return ast.unparse(node)
+        return None
+
+    def _ignored(self, key: str) -> bool:
+        return key.startswith(LAYOUT_ATTRIBUTES)
+
+    def _family(self, key: str) -> Set[str]:
+        obj = self.objects.get(key)
+        family = {key}
+        for m in obj.members if obj else ():
+            family |= self._family(m)
+        return family
+
+    def _covered(self, key: str) -> bool:
+        """A member of a visible group that was placed as a whole"""
+        return any(
+            other != key and self.objects[other].box is not None and key in self._family(other)
+            for other in self.visible
+            if other in self.objects
+        )
+
+    def _related(self, a: str, b: str) -> bool:
+        return a in self._family(b) or b in self._family(a)
+
+    def _build(self, node, line: int) -> Optional[_Obj]:
+        """Evaluate an expression like Text("x").scale(0.5).next_to(y, DOWN) into an object"""
+        chain = []
+        while isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute):
+            if self._key(node.func.value) == "self" and node.func.attr in ("place_at_grid", "place_in_area"):
+                break
+            chain.append(node)
+            node = node.func.value
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr.startswith("place_"):
+            obj = self._place(node, line)
+        elif isinstance(node, ast.Call) and isinstance(node.func, ast.Name):
+            kind = node.func.id
+            obj = _Obj(name=kind, kind=kind, size=_estimate_size(node, kind), line_number=line)
+            if kind in GROUPS:
+                obj.members = [k for k in map(self._key, node.args) if k in self.objects]
+        elif isinstance(node, (ast.List, ast.Tuple)):
+            obj = _Obj(name="list", kind="VGroup", members=[k for k in map(self._key, node.elts) if k in self.objects])
+        elif self._key(node) in self.objects:
+            src = self.objects[self._key(node)]
+            obj = _Obj(src.name, src.kind, src.size, src.box, list(src.members), line)
+        else:
+            return None
+        for call in reversed(chain):
+            if obj is not None:
+                self._apply(obj, call, line)
+        return obj
+
+    def _apply(self, obj: _Obj, call: ast.Call, line: int):
+        method = call.func.attr
+        if method == "scale":
+            k = _arg(call, 0, "scale_factor")
+            if isinstance(k, (int, float)):
+                if obj.size:
+                    obj.size = (obj.size[0] * k, obj.size[1] * k)
+                if obj.box:
+                    cx, cy = obj.box.center
+                    obj.box = Box.around(cx, cy, obj.box.size[0] * k, obj.box.size[1] * k)
+        elif method == "shift" and call.args:
+            v = _vector(call.args[0])
+            if obj.box and v:
+                obj.box = Box(obj.box.x0 + v[0], obj.box.y0 + v[1], obj.box.x1 + v[0], obj.box.y1 + v[1])
+            elif v is None:
+                obj.box = None
+        elif method == "move_to" and call.args:
+            obj.box = self._box_at(obj, self._point(call.args[0]))
+        elif method == "next_to" and call.args:
+            target = self.objects.get(self._key(call.args[0]))
+            direction = _vector(call.args[1]) if len(call.args) > 1 else (1, 0)
+            buff = _kwarg(call, "buff", 0.25)
+            obj.box = None
+            if target and target.box and direction:
+                w, h = obj.size or (1.0, 1.0)
+                cx, cy = target.box.center
+                tw, th = target.box.size
+                cx += direction[0] * (tw / 2 + buff + w / 2)
+                cy += direction[1] * (th / 2 + buff + h / 2)
+                obj.box = Box.around(cx, cy, w, h)
+        elif method in ("to_edge", "to_corner", "align_to", "arrange", "arrange_in_grid", "set_x", "set_y"):
+            obj.box = None
+        elif method in ("set_width", "set_height", "stretch_to_fit_width", "stretch_to_fit_height", "set"):
+            obj.size = None
+            obj.box = None
+        if obj.box:
+            obj.size = obj.box.size
+
+    def _point(self, node) -> Optional[Tuple[float, float]]:
+        if isinstance(node, ast.Subscript) and self._key(node.value) == "self.grid":
+            cell = _const(node.slice)
+            return cell_center(cell) if is_valid_cell(cell) else None
+        target = self.objects.get(self._key(node))
+        if target and target.box:
+            return target.box.center
+        return _vector(node)
+
+    @staticmethod
+    def _box_at(obj: _Obj, point) -> Optional[Box]:
+        if point is None:
+            return None
+        w, h = obj.size or (1.0, 1.0)
+        return Box.around(point[0], point[1], w, h)
+
+    def _place(self, call: ast.Call, line: int) -> Optional[_Obj]:
+        """self.place_at_grid(obj, 'B2', scale_factor) / self.place_in_area(obj, 'A1', 'C3', scale_factor)"""
+        if not call.args:
+            return None
+        key = self._key(call.args[0])
+        obj = self.objects.get(key) if key else None
+        if obj is None:
+            obj = self._build(call.args[0], line) or _Obj(name=ast.unparse(call.args[0]), line_number=line)
+        if key:
+            obj.name = key
+            self.objects[key] = obj
+
+        in_area = call.func.attr == "place_in_area"
+        cells = [_const(a) for a in call.args[1 : 3 if in_area else 2]]
+        scale_node = call.args[3 if in_area else 2] if len(call.args) > (3 if in_area else 2) else None
+        scale = _const(scale_node) if scale_node is not None else _kwarg(call, "scale_factor", 1.0)
+        scale = scale if isinstance(scale, (int, float)) else 1.0
+        self.report.placements += 1
+
+        bad = [c for c in cells if not is_valid_cell(c)]
+        if bad or len(cells) < (2 if in_area else 1):
+            self.report.conflicts.append(LayoutConflict("invalid_cell", [obj.name], [str(c) for c in bad], line))
+            obj.box = None
+            return obj
+
+        if obj.size:
+            obj.size = (obj.size[0] * scale, obj.size[1] * scale)
+        if in_area:
+            (x0, y0), (x1, y1) = cell_center(cells[0]), cell_center(cells[1])
+            center = ((x0 + x1) / 2, (y0 + y1) / 2)
+            obj.box = self._box_at(obj, center) if obj.size else Box(
+                min(x0, x1) - 0.5, min(y0, y1) - 0.5, max(x0, x1) + 0.5, max(y0, y1) + 0.5
+            )
+        else:
+            obj.box = self._box_at(obj, cell_center(cells[0]))
+        obj.line_number = line
+        if self._branch_depth:
+            self._unpin(obj)
+        if obj.name in self.visible:
+            self._check(obj.name)
+        return obj
+
+    # ---- timeline ------------------------------------------------------
+    def _show(self, key: Optional[str], line: int):
+        if key is None or self._ignored(key):
+            return
+        if key not in self.objects:
+            self.objects[key] = _Obj(name=key, line_number=line)
+        self.visible[key] = None
+        for member in self.objects[key].members:
+            self._show(member, line)
+        self._check(key)
+
+    def _hide(self, key: Optional[str]):
+        if key is None:
+            return
+        for k in self._family(key):
+            self.visible.pop(k, None)
+
+    def _hide_all(self):
+        self.visible.clear()
+
+    def _check(self, key: str):
+        obj = self.objects[key]
+        if obj.kind in CONNECTORS:
+            return
+        if obj.box is None:
+            if not obj.members and not self._covered(key) and key not in self.report.unverified:
+                self.report.unverified.append(key)
+            return
+        box = obj.box
+        if box.x0 < -FRAME_HALF_WIDTH or box.x1 > FRAME_HALF_WIDTH or box.y0 < -FRAME_HALF_HEIGHT or box.y1 > FRAME_HALF_HEIGHT:
+            self._add_conflict("off_screen", (key,), obj)
+        elif box.x0 < LECTURE_RIGHT_EDGE:
+            self._add_conflict("lecture", (key,), obj)
+        elif box.y1 > TITLE_BOTTOM_EDGE:
+            self._add_conflict("title", (key,), obj)
+
+        cells = box.cells()
+        for other in list(self.visible):
+            o = self.objects.get(other)
+            if other == key or o is None or o.box is None or o.kind in CONNECTORS or self._related(key, other):
+                continue
+            shared = cells & o.box.cells()
+            if shared:
+                self._add_conflict("overlap", tuple(sorted((key, other))), obj, sorted(shared))
+
+    def _add_conflict(self, kind: str, objects: Tuple[str, ...], obj: _Obj, cells=()):
+        if (kind, *objects) in self._pairs:
+            return
+        self._pairs.add((kind, *objects))
+        self.report.conflicts.append(LayoutConflict(kind, list(objects), list(cells), obj.line_number))
+
+    def _animate(self, node, line: int):
+        if isinstance(node, ast.Starred):
+            value = node.value
+            if isinstance(value, (ast.ListComp, ast.GeneratorExp)) and isinstance(value.elt, ast.Call):
+                anim = getattr(value.elt.func, "id", "")
+                source = self._key(value.generators[0].iter)
+                if anim in HIDE_ANIMATIONS:
+                    if source == "self.mobjects" or source not in self.objects:
+                        self._hide_all()
+                    else:
+                        self._hide(source)
+                elif source in self.objects:
+                    self._show(source, line)
+            return
+        if not isinstance(node, ast.Call) or not isinstance(node.func, ast.Name):
+            return
+        anim, args = node.func.id, node.args
+        if anim in COMPOSITE_ANIMATIONS:
+            for a in args:
+                self._animate(a, line)
+            return
+        if not args:
+            return
+        first = args[0]
+        if anim in HIDE_ANIMATIONS:
+            if isinstance(first, ast.Starred) and self._key(first.value) == "self.mobjects":
+                self._hide_all()
+            for a in args:
+                self._hide(self._key(a))
+        elif anim in REPLACE_ANIMATIONS and len(args) > 1:
+            self._hide(self._key(first))
+            self._show(self._named(args[1], line), line)
+        elif anim in MOVE_ANIMATIONS and len(args) > 1:
+            src, dst = self._key(first), self.objects.get(self._named(args[1], line) or "")
+            if src in self.objects and dst:
+                self.objects[src].box = dst.box
+            self._show(src, line)
+        elif isinstance(first, ast.Attribute) and first.attr == "animate":
+            return
+        else:
+            self._show(self._named(first, line), line)
+
+    def _named(self, node, line: int) -> Optional[str]:
+        """Key of an animated expression, registering inline constructions under their source text"""
+        key = self._key(node)
+        if key is not None and key in self.objects:
+            return key
+        obj = self._build(node, line)
+        if obj is None:
+            return key
+        key = key or ast.unparse(node)
+        obj.name = key
+        self.objects[key] = obj
+        if self._branch_depth and obj.box is not None:
+            self._unpin(obj)
+        return key
+
+    def walk(self, body: List[ast.stmt]):
+        for stmt in body:
+            line = getattr(stmt, "lineno", 0)
+            if isinstance(stmt, ast.With):
+                self.walk(stmt.body)
+                continue
+            if isinstance(stmt, (ast.For, ast.While, ast.If, ast.Try)):
+                # 循环/分支体只回放一遍，其中确定的位置一律记为无法静态确定
+                self._branch_depth += 1
+                self.walk(stmt.body)
+                for handler in getattr(stmt, "handlers", []):
+                    self.walk(handler.body)
+                self.walk(stmt.orelse)
+                self._branch_depth -= 1
+                self.walk(getattr(stmt, "finalbody", []))
+                continue
+            if isinstance(stmt, ast.Assign) and len(stmt.targets) == 1:
+                key = self._key(stmt.targets[0])
+                obj = self._build(stmt.value, line)
+                if key and obj is not None:
+                    obj.name = key
+                    self.objects[key] = obj
+                    if self._branch_depth and obj.box is not None:
+                        self._unpin(obj)
+                    if key in self.visible:
+                        self._check(key)
+                elif isinstance(stmt.value, ast.Call):
+                    self._call(stmt.value, line)
+                continue
+            if isinstance(stmt, ast.Expr) and isinstance(stmt.value, ast.Call):
+                self._call(stmt.value, line)
+
+    def _call(self, call: ast.Call, line: int):
+        func = call.func
+        if not isinstance(func, ast.Attribute):
+            return
+        owner = self._key(func.value)
+        if owner == "self":
+            if func.attr in ("place_at_grid", "place_in_area"):
+                self._place(call, line)
+            elif func.attr == "add":
+                for a in call.args:
+                    self._show(self._named(a, line), line)
+            elif func.attr == "remove":
+                for a in call.args:
+                    self._hide(self._key(a))
+            elif func.attr == "clear":
+                self._hide_all()
+            elif func.attr == "play":
+                for a in call.args:
+                    self._animate(a, line)
+            elif func.attr in self.methods and func.attr not in self._walked:
+                self._walked.add(func.attr)
+                self.walk(self.methods[func.attr].body)
+        else:
+            # obj.scale(...).next_to(...) 之类的原地修改
+            root = func.value
+            while isinstance(root, ast.Call) and isinstance(root.func, ast.Attribute):
+                root = root.func.value
+            key = self._key(root)
+            if key in self.objects:
+                updated = self._build(call, line)
+                if updated is not None:
+                    updated.name = key
+                    self.objects[key] = updated
+                    if self._branch_depth and updated.box is not None:
+                        self._unpin(updated)
+                    if key in self.visible:
+                        self._check(key)
+
+
+def check_layout(code: str) -> LayoutReport:
+    """Static occupancy check of the TeachingScene grid over the scene timeline.
+
+    Replays construct() (and the helper methods it calls), tracking which named mobjects are
+    on screen via add/remove/play and where place_at_grid/place_in_area, next_to, move_to and
+    shift put them, and reports overlaps, off-screen or lecture-covering placements and bad
+    grid cells. Sizes are rough estimates; objects whose position cannot be worked out, or is
+    set inside a loop or branch body (replayed only once), are listed as unverified, and only a
+    report with neither conflicts nor unverified objects is clean.
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return LayoutReport(parsed=False)
+
+    report = LayoutReport(parsed=False)
+    for node in ast.walk(tree):
+        if isinstance(node, ast.ClassDef):
+            construct = next((n for n in node.body if isinstance(n, ast.FunctionDef) and n.name == "construct"), None)
+            if construct is None:
+                continue
+            walker = _LayoutWalker(node)
+            walker.walk(construct.body)
+            report = walker.report
+            break
+    return report
@@ -0,0 +1,204 @@
+import os
+import json
+import pickle
+import hashlib
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional
+
+
+_DEFAULT_CACHE_DIR = Path(__file__).with_name(".llm_cache")
+_DIGEST_MEMO: Dict[tuple, str] = {}
+
+
+def file_digest(path, chunk_size: int = 1 << 20) -> str:
+    """sha256 of a media file, memoized on (path, size, mtime) so large videos are hashed once per process"""
+    path = Path(path)
+    st = path.stat()
+    memo_key = (str(path.resolve()), st.st_size, st.st_mtime_ns)
+    digest = _DIGEST_MEMO.get(memo_key)
+    if digest is None:
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                h.update(chunk)
+        digest = h.hexdigest()
+        _DIGEST_MEMO[memo_key] = digest
+    return digest
+
+
+class LLMResponseCache:
+    """Content-addressed on-disk cache of LLM responses with size-based LRU eviction.
+
+    Entries are pickled (completion, usage) pairs stored under ``<cache_dir>/<key[:2]>/<key>.pkl``.
+    File mtime is the LRU clock: a hit touches the entry, eviction removes the oldest entries
+    until the cache is back under 90% of ``max_bytes``. Writes go through a temp file and
+    ``os.replace`` so concurrent worker processes never read a half-written entry.
+    """
+
+    def __init__(self, cache_dir=None, max_bytes: int = 1024 * 1024 * 1024, enabled: bool = True):
+        self.cache_dir = Path(cache_dir or _DEFAULT_CACHE_DIR)
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self._approx_bytes = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(
+        model: str,
+        prompt: Any,
+        media: Iterable = (),
+        max_tokens: Optional[int] = None,
+        provider: str = "",
+        azure: bool = False,
+        **extra,
+    ) -> str:
+        """Hash of everything that determines the response; the same model name served by another
+        provider or deployment (e.g. Azure vs an OpenAI-compatible endpoint) gets its own key"""
+        media_digests = [file_digest(m) if m else None for m in media]
+        payload = {
+            "provider": provider,
+            "azure": azure,
+            "model": model,
+            "prompt": prompt,
+            "media": media_digests,
+            "max_tokens": max_tokens,
+            "extra": extra,
+        }
+        raw = json.dumps(payload, ensure_ascii=False, sort_keys=True, default=str)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _entry_path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.pkl"
+
+    def get(self, key: str):
+        if not self.enabled:
+            return None
+        path = self._entry_path(key)
+        try:
+            with open(path, "rb") as f:
+                value = pickle.load(f)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        except Exception:
+            # Corrupt or incompatible entry (e.g. openai upgraded): treat as miss and drop it
+            with self._lock:
+                self.misses += 1
+            self._remove(path)
+            return None
+
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        with self._lock:
+            self.hits += 1
+        return value
+
+    def put(self, key: str, value) -> None:
+        if not self.enabled:
+            return
+        path = self._entry_path(key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            with open(tmp_path, "wb") as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            size = tmp_path.stat().st_size
+            os.replace(tmp_path, path)
+        except Exception as e:
+            print(f"⚠️ LLM 缓存写入失败: {e}")
+            return
+
+        with self._lock:
+            self.writes += 1
+            if self._approx_bytes is None:
+                self._approx_bytes = self._scan_size()
+            else:
+                self._approx_bytes += size
+            over_budget = self._approx_bytes > self.max_bytes
+        if over_budget:
+            self.evict()
+
+    def _scan_entries(self):
+        entries = []
+        if not self.cache_dir.exists():
+            return entries
+        for path in self.cache_dir.glob("*/*.pkl"):
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def _scan_size(self) -> int:
+        return sum(size for _, size, _ in self._scan_entries())
+
+    def _remove(self, path: Path) -> bool:
+        try:
+            path.unlink()
+            return True
+        except FileNotFoundError:
+            return False
+        except OSError:
+            return False
+
+    def evict(self) -> int:
+        """Remove least recently used entries until the cache is under 90% of max_bytes"""
+        entries = sorted(self._scan_entries())
+        total = sum(size for _, size, _ in entries)
+        target = int(self.max_bytes * 0.9)
+        removed = 0
+        for _, size, path in entries:
+            if total <= target:
+                break
+            if self._remove(path):
+                removed += 1
+            total -= size
+        with self._lock:
+            self.evictions += removed
+            self._approx_bytes = total
+        return removed
+
+    def clear(self) -> None:
+        for _, _, path in self._scan_entries():
+            self._remove(path)
+        with self._lock:
+            self._approx_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "writes": self.writes,
+                "evictions": self.evictions,
+            }
+
+
+_RESPONSE_CACHE: Optional[LLMResponseCache] = None
+
+
+def get_response_cache(cfg=None) -> LLMResponseCache:
+    """Process-wide cache instance; settings come from the "cache" section of api_config.json"""
+    global _RESPONSE_CACHE
+    if _RESPONSE_CACHE is None:
+        def _get(key, default):
+            return cfg("cache", key, default) if cfg else default
+
+        enabled = str(_get("enabled", "1")).lower() not in ("0", "false", "no", "off")
+        _RESPONSE_CACHE = LLMResponseCache(
+            cache_dir=_get("dir", None),
+            max_bytes=int(float(_get("max_mb", 1024)) * 1024 * 1024),
+            enabled=enabled,
+        )
+    return _RESPONSE_CACHE
@@ -0,0 +1,523 @@
+import os
+import json
+import time
+import random
+import base64
+import asyncio
+import pathlib
+import threading
+import weakref
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Optional, Tuple, Union
+
+# openai is imported inside the functions that talk to the API: it is the slowest import
+# of the whole pipeline, and `--help`, cache-only runs and render workers never need it.
+from llm_cache import get_response_cache
+from rate_limiter import estimate_tokens, get_rate_limiter
+
+
+# Read and cache once
+_CFG_PATH = pathlib.Path(__file__).with_name("api_config.json")
+with _CFG_PATH.open("r", encoding="utf-8") as _f:
+    _CFG = json.load(_f)
+
+
+def cfg(svc: str, key: str, default=None):
+    return os.getenv(f"{svc}_{key}".upper(), _CFG.get(svc, {}).get(key, default))
+
+
+# Process-wide client registry: one OpenAI client (and thus one httpx keep-alive pool)
+# per (service, base_url, timeout, azure), shared by every request in the process.
+_CLIENTS = {}
+_CLIENTS_LOCK = threading.Lock()
+_CLIENTS_PID = os.getpid()
+
+
+def _http_limits():
+    """Connection pool limits, overridable via the "http" section of api_config.json or HTTP_* env vars."""
+    import httpx
+
+    return httpx.Limits(
+        max_connections=int(cfg("http", "max_connections", 64)),
+        max_keepalive_connections=int(cfg("http", "max_keepalive_connections", 16)),
+        keepalive_expiry=float(cfg("http", "keepalive_expiry", 60.0)),
+    )
+
+
+def _reset_clients():
+    """Drop clients inherited from the parent process; their sockets must not be shared across a fork."""
+    global _CLIENTS, _CLIENTS_LOCK, _CLIENTS_PID, _ASYNC_CLIENTS
+    _CLIENTS = {}
+    _CLIENTS_LOCK = threading.Lock()
+    _CLIENTS_PID = os.getpid()
+    _ASYNC_CLIENTS = weakref.WeakKeyDictionary()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_clients)
+
+
+def get_client(svc: str, timeout: float = 300.0, azure: bool = False):
+    """Return the pooled client for a service, creating it on first use in this process."""
+    import openai
+
+    if os.getpid() != _CLIENTS_PID:
+        _reset_clients()
+
+    base_url = cfg(svc, "base_url")
+    key = (svc, base_url, timeout, azure)
+    client = _CLIENTS.get(key)
+    if client is not None:
+        return client
+
+    with _CLIENTS_LOCK:
+        client = _CLIENTS.get(key)
+        if client is None:
+            http_client = openai.DefaultHttpxClient(limits=_http_limits(), timeout=timeout)
+            if azure:
+                client = openai.AzureOpenAI(
+                    azure_endpoint=base_url,
+                    api_version=cfg(svc, "api_version"),
+                    api_key=cfg(svc, "api_key"),
+                    http_client=http_client,
+                )
+            else:
+                client = openai.OpenAI(
+                    base_url=base_url, api_key=cfg(svc, "api_key"), timeout=timeout, http_client=http_client
+                )
+            _CLIENTS[key] = client
+    return client
+
+
+# Async clients are bound to the event loop that created their connection pool,
+# so the registry is keyed by loop first.
+_ASYNC_CLIENTS = weakref.WeakKeyDictionary()
+
+
+def get_async_client(svc: str, timeout: float = 300.0, azure: bool = False):
+    """Return the pooled AsyncOpenAI client for a service on the running event loop."""
+    import openai
+
+    if os.getpid() != _CLIENTS_PID:
+        _reset_clients()
+
+    loop = asyncio.get_running_loop()
+    clients = _ASYNC_CLIENTS.setdefault(loop, {})
+    base_url = cfg(svc, "base_url")
+    key = (svc, base_url, timeout, azure)
+    client = clients.get(key)
+    if client is None:
+        http_client = openai.DefaultAsyncHttpxClient(limits=_http_limits(), timeout=timeout)
+        if azure:
+            client = openai.AsyncAzureOpenAI(
+                azure_endpoint=base_url,
+                api_version=cfg(svc, "api_version"),
+                api_key=cfg(svc, "api_key"),
+                http_client=http_client,
+            )
+        else:
+            client = openai.AsyncOpenAI(
+                base_url=base_url, api_key=cfg(svc, "api_key"), timeout=timeout, http_client=http_client
+            )
+        clients[key] = client
+    return client
+
+
+def close_clients():
+    """Close all pooled clients of this process (e.g. at the end of a batch run)."""
+    with _CLIENTS_LOCK:
+        clients = list(_CLIENTS.values())
+        _CLIENTS.clear()
+    for client in clients:
+        try:
+            client.close()
+        except Exception:
+            pass
+
+
+def _retry_after_seconds(error):
+    """Retry-After of a 429 response in seconds, if the provider sent one."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    for header, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        try:
+            return float(headers.get(header)) * scale
+        except (TypeError, ValueError):
+            continue
+    return None
+
+
+def _create_completion(svc: str, client, **kwargs):
+    """One chat.completions call, admitted by the provider's cross-process rate limiter."""
+    import openai
+
+    limiter = get_rate_limiter(svc, cfg)
+    estimated = estimate_tokens(kwargs.get("messages"), kwargs.get("max_tokens"))
+    limiter.acquire(estimated)
+    try:
+        completion = client.chat.completions.create(**kwargs)
+    except openai.RateLimitError as e:
+        limiter.penalize(_retry_after_seconds(e))
+        raise
+    usage = getattr(completion, "usage", None)
+    limiter.record_usage(estimated, getattr(usage, "total_tokens", 0) if usage else 0)
+    return completion
+
+
+async def _acreate_completion(svc: str, client, **kwargs):
+    import openai
+
+    limiter = get_rate_limiter(svc, cfg)
+    estimated = estimate_tokens(kwargs.get("messages"), kwargs.get("max_tokens"))
+    await limiter.acquire_async(estimated)
+    try:
+        completion = await client.chat.completions.create(**kwargs)
+    except openai.RateLimitError as e:
+        await asyncio.to_thread(limiter.penalize, _retry_after_seconds(e))
+        raise
+    usage = getattr(completion, "usage", None)
+    # 两者都会阻塞地等待跨进程文件锁，放到线程里以免卡住事件循环
+    await asyncio.to_thread(limiter.record_usage, estimated, getattr(usage, "total_tokens", 0) if usage else 0)
+    return completion
+
+
+def generate_log_id():
+    """Generate a log ID with 'tkb' prefix and current timestamp."""
+    return f"tkb{int(time.time() * 1000)}"
+
+
+def response_cache_stats():
+    """Hit/miss counters of this process's LLM response cache"""
+    return get_response_cache(cfg).stats()
+
+
+# ---------------------------------------------------------------------------
+# Message building
+# ---------------------------------------------------------------------------
+def _file_data_url(path, mime: str, missing_msg: str) -> str:
+    if not os.path.isfile(path):
+        raise FileNotFoundError(f"{missing_msg}: {path}")
+    with open(path, "rb") as f:
+        return f"data:{mime};base64,{base64.b64encode(f.read()).decode('utf-8')}"
+
+
+def _media_part(url: str, mime: str, detail: Optional[str], media_type_hint: bool) -> Dict[str, Any]:
+    image_url = {"url": url}
+    if detail:
+        image_url["detail"] = detail
+    part = {"type": "image_url", "image_url": image_url}
+    if media_type_hint:
+        # 部分中转站（Gemini 兼容接口）依赖该字段识别视频/图片
+        part["media_type"] = mime
+    return part
+
+
+def build_messages(
+    prompt: str,
+    images: Iterable = (),
+    video: Optional[str] = None,
+    text_as_parts: bool = False,
+    image_detail: Optional[str] = "high",
+    media_type_hint: bool = False,
+):
+    """Single user message with the prompt followed by an optional video and images.
+
+    Media files are inlined as base64 data URLs. A text-only prompt is sent as a plain
+    string unless the provider expects content parts (``text_as_parts``).
+    """
+    images = [p for p in images if p]
+    if not images and not video and not text_as_parts:
+        return [{"role": "user", "content": prompt}]
+
+    content = [{"type": "text", "text": prompt}]
+    if video:
+        url = _file_data_url(video, "video/mp4", "Video not found")
+        content.append(_media_part(url, "video/mp4", image_detail, media_type_hint))
+    for image in images:
+        mime = "image/jpeg" if str(image).lower().endswith((".jpg", ".jpeg")) else "image/png"
+        url = _file_data_url(image, mime, "Image file not found")
+        content.append(_media_part(url, mime, image_detail, media_type_hint))
+    return [{"role": "user", "content": content}]
+
+
+# ---------------------------------------------------------------------------
+# Providers
+# ---------------------------------------------------------------------------
+@dataclass
+class Provider:
+    """How to talk to one api_config.json service"""
+
+    name: str
+    timeout: float = 300.0
+    azure: bool = False
+    text_as_parts: bool = False
+    image_detail: Optional[str] = "high"
+    media_type_hint: bool = False
+    thinking_budget: int = 0
+    backoff: float = 0.5
+
+    @property
+    def is_azure(self) -> bool:
+        flag = cfg(self.name, "azure", None)
+        if flag is None:
+            return self.azure
+        return str(flag).lower() in ("1", "true", "yes", "on")
+
+
+PROVIDERS: Dict[str, Provider] = {}
+
+
+def register_provider(provider: Provider) -> Provider:
+    PROVIDERS[provider.name] = provider
+    return provider
+
+
+register_provider(Provider("claude", timeout=600.0, text_as_parts=True))
+register_provider(Provider("gemini", media_type_hint=True, backoff=0.2))
+register_provider(Provider("gpt4o", text_as_parts=True))
+register_provider(Provider("gpt4omini", azure=True, thinking_budget=2000, backoff=0.2))
+register_provider(Provider("gpt5"))
+register_provider(Provider("gpt41", image_detail=None))
+
+# request_gpt4o has always gone to the Azure deployment of the "gpt4o" section, while
+# request_gpt4o_token uses its OpenAI-compatible endpoint; an "azure" key in the section overrides both
+GPT4O_AZURE = Provider("gpt4o", text_as_parts=True, azure=True)
+# Likewise request_gpt41 / request_gpt41_img use Azure and request_gpt41_token does not
+GPT41_AZURE = Provider("gpt41", image_detail=None, azure=True)
+
+
+def _empty_usage() -> Dict[str, int]:
+    return {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+
+
+def _usage_from(completion) -> Dict[str, int]:
+    usage_info = _empty_usage()
+    usage = getattr(completion, "usage", None)
+    if usage:
+        usage_info["prompt_tokens"] = usage.prompt_tokens or 0
+        usage_info["completion_tokens"] = usage.completion_tokens or 0
+        usage_info["total_tokens"] = usage.total_tokens or 0
+    return usage_info
+
+
+class LLMRequestError(Exception):
+    """Raised when a request still fails after all retries"""
+
+
+# Per-provider request counters of this process
+_METRICS: Dict[str, Dict[str, int]] = {}
+_METRICS_LOCK = threading.Lock()
+
+
+def _record(svc: str, **counts) -> None:
+    with _METRICS_LOCK:
+        metrics = _METRICS.setdefault(
+            svc,
+            {"requests": 0, "retries": 0, "failures": 0, "cache_hits": 0, "prompt_tokens": 0, "completion_tokens": 0},
+        )
+        for key, value in counts.items():
+            metrics[key] += value
+
+
+def llm_usage_stats() -> Dict[str, Dict[str, int]]:
+    """Requests, retries, failures, cache hits and tokens per provider in this process"""
+    with _METRICS_LOCK:
+        return {svc: dict(metrics) for svc, metrics in _METRICS.items()}
+
+
+class LLMClient:
+    """One entry point for every chat request: message building, cache, rate limit, pooling and retry.
+
+    ``complete``/``acomplete`` return ``(completion, usage_info)``. After the last failed retry
+    they raise ``LLMRequestError``, or return ``(None, usage_info)`` when ``raise_on_failure``
+    is False. Cache hits report zero usage.
+    """
+
+    def __init__(self, provider: Union[str, Provider]):
+        if isinstance(provider, str):
+            provider = PROVIDERS.get(provider) or Provider(provider)
+        self.provider = provider
+
+    @property
+    def model(self) -> str:
+        return cfg(self.provider.name, "model")
+
+    def _cache_key(self, cache, prompt, images, video, max_tokens, thinking, temperature):
+        extra = {"thinking": thinking}
+        if temperature is not None:
+            extra["temperature"] = temperature
+        try:
+            return cache.make_key(
+                model=self.model,
+                prompt=prompt,
+                media=[video, *images],
+                max_tokens=max_tokens,
+                provider=self.provider.name,
+                azure=self.provider.is_azure,
+                **extra,
+            )
+        except OSError:
+            # Missing media file: let the message builder raise its usual error
+            return None
+
+    def _build(self, prompt, images, video):
+        return build_messages(
+            prompt,
+            images=images,
+            video=video,
+            text_as_parts=self.provider.text_as_parts,
+            image_detail=self.provider.image_detail,
+            media_type_hint=self.provider.media_type_hint,
+        )
+
+    def _request_kwargs(self, messages, max_tokens, log_id, temperature, thinking) -> Dict[str, Any]:
+        kwargs = {
+            "model": self.model,
+            "messages": messages,
+            "max_tokens": max_tokens,
+            "extra_headers": {"X-TT-LOGID": log_id or generate_log_id()},
+        }
+        if temperature is not None:
+            kwargs["temperature"] = temperature
+        if thinking and self.provider.thinking_budget:
+            kwargs["extra_body"] = {"thinking": {"type": "enabled", "budget_tokens": self.provider.thinking_budget}}
+        return kwargs
+
+    def _delay(self, retry_count: int) -> float:
+        # Exponential backoff with jitter, capped; 429s are additionally held off by the rate limiter
+        backoff = self.provider.backoff
+        return min(30.0, (2**retry_count) * backoff + random.random() * backoff)
+
+    def _lookup(self, use_cache, prompt, images, video, max_tokens, thinking, temperature):
+        cache = get_response_cache(cfg)
+        if not (use_cache and cache.enabled):
+            return cache, None, None
+        key = self._cache_key(cache, prompt, images, video, max_tokens, thinking, temperature)
+        cached = cache.get(key) if key else None
+        if cached is not None:
+            _record(self.provider.name, cache_hits=1)
+        return cache, key, cached
+
+    def _store(self, cache, key, completion, usage_info):
+        name = self.provider.name
+        _record(
+            name,
+            prompt_tokens=usage_info["prompt_tokens"],
+            completion_tokens=usage_info["completion_tokens"],
+        )
+        if key:
+            cache.put(key, (completion, usage_info))
+
+    def _give_up(self, error, max_retries, raise_on_failure, usage_info):
+        _record(self.provider.name, failures=1)
+        message = f"Failed after {max_retries} attempts. Last error: {str(error)}"
+        if raise_on_failure:
+            raise LLMRequestError(message) from error
+        print(message)
+        return None, usage_info
+
+    def complete(
+        self,
+        prompt: str,
+        images: Iterable = (),
+        video: Optional[str] = None,
+        max_tokens: int = 8000,
+        max_retries: int = 3,
+        log_id: Optional[str] = None,
+        temperature: Optional[float] = None,
+        thinking: bool = False,
+        timeout: Optional[float] = None,
+        use_cache: bool = True,
+        raise_on_failure: bool = True,
+    ) -> Tuple[Any, Dict[str, int]]:
+        images = [p for p in images if p]
+        cache, key, cached = self._lookup(use_cache, prompt, images, video, max_tokens, thinking, temperature)
+        if cached is not None:
+            return cached[0], _empty_usage()
+
+        messages = self._build(prompt, images, video)
+        client = get_client(self.provider.name, timeout=timeout or self.provider.timeout, azure=self.provider.is_azure)
+        kwargs = self._request_kwargs(messages, max_tokens, log_id, temperature, thinking)
+        usage_info = _empty_usage()
+
+        retry_count = 0
+        while retry_count < max_retries:
+            try:
+                _record(self.provider.name, requests=1)
+                completion = _create_completion(self.provider.name, client, **kwargs)
+                usage_info = _usage_from(completion)
+                self._store(cache, key, completion, usage_info)
+                return completion, usage_info
+            except Exception as e:
+                retry_count += 1
+                if retry_count >= max_retries:
+                    return self._give_up(e, max_retries, raise_on_failure, usage_info)
+                _record(self.provider.name, retries=1)
+                delay = self._delay(retry_count)
+                print(
+                    f"Request failed with error: {str(e)}. Retrying in {delay:.2f} seconds... (Attempt {retry_count}/{max_retries})"
+                )
+                time.sleep(delay)
+        return None, usage_info
+
+    async def acomplete(
+        self,
+        prompt: str,
+        images: Iterable = (),
+        video: Optional[str] = None,
+        max_tokens: int = 8000,
+        max_retries: int = 3,
+        log_id: Optional[str] = None,
+        temperature: Optional[float] = None,
+        thinking: bool = False,
+        timeout: Optional[float] = None,
+        use_cache: bool = True,
+        raise_on_failure: bool = True,
+    ) -> Tuple[Any, Dict[str, int]]:
+        images = [p for p in images if p]
+        cache, key, cached = self._lookup(use_cache, prompt, images, video, max_tokens, thinking, temperature)
+        if cached is not None:
+            return cached[0], _empty_usage()
+
+        # base64-encoding a video is slow enough to stall the event loop
+        messages = await asyncio.to_thread(self._build, prompt, images, video)
+        client = get_async_client(
+            self.provider.name, timeout=timeout or self.provider.timeout, azure=self.provider.is_azure
+        )
+        kwargs = self._request_kwargs(messages, max_tokens, log_id, temperature, thinking)
+        usage_info = _empty_usage()
+
+        retry_count = 0
+        while retry_count < max_retries:
+            try:
+                _record(self.provider.name, requests=1)
+                completion = await _acreate_completion(self.provider.name, client, **kwargs)
+                usage_info = _usage_from(completion)
+                self._store(cache, key, completion, usage_info)
+                return completion, usage_info
+            except Exception as e:
+                retry_count += 1
+                if retry_count >= max_retries:
+                    return self._give_up(e, max_retries, raise_on_failure, usage_info)
+                _record(self.provider.name, retries=1)
+                delay = self._delay(retry_count)
+                print(f"Async retry {retry_count}/{max_retries} error: {str(e)}. Waiting {delay:.2f}s...")
+                await asyncio.sleep(delay)
+        return None, usage_info
+
+    def text(self, prompt: str, **kwargs) -> Optional[str]:
+        """Convenience wrapper returning only the message content"""
+        completion, _ = self.complete(prompt, **kwargs)
+        if completion is None:
+            return None
+        return completion.choices[0].message.content
+
+
+_LLM_CLIENTS: Dict[str, LLMClient] = {}
+
+
+def get_llm_client(provider: str) -> LLMClient:
+    client = _LLM_CLIENTS.get(provider)
+    if client is None:
+        client = _LLM_CLIENTS.setdefault(provider, LLMClient(provider))
+    return client
@@ -0,0 +1,330 @@
+import re
+import ast
+import difflib
+import hashlib
+import threading
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+from manim_index import get_manim_index
+
+
+# 旧版 manim / manimlib 的 API 名称 -> Manim Community v0.19 中的名称
+RENAMED_NAMES = {
+    "ShowCreation": "Create",
+    "ShowCreationThenDestruction": "ShowPassingFlash",
+    "TextMobject": "Text",
+    "TexMobject": "MathTex",
+    "TexText": "Tex",
+    "FadeInFrom": "FadeIn",
+    "FadeInFromDown": "FadeIn",
+    "FadeOutAndShiftDown": "FadeOut",
+    "FadeInFromLarge": "FadeIn",
+    "GraphScene": "Scene",
+    "LIGHT_BLUE": "BLUE_B",
+    "LIGHT_GREEN": "GREEN_B",
+    "LIGHT_RED": "RED_B",
+    "DARK_GREEN": "GREEN_E",
+    "DARK_RED": "RED_E",
+    "CYAN": "TEAL",
+}
+RENAMED_METHODS = {
+    "get_graph": "plot",
+    "get_derivative_graph": "plot_derivative_graph",
+    "get_parametric_curve": "plot_parametric_curve",
+    "get_implicit_curve": "plot_implicit_curve",
+    "scale_in_place": "scale",
+    "rotate_in_place": "rotate",
+}
+MISSING_IMPORTS = {
+    "np": "import numpy as np",
+    "math": "import math",
+    "random": "import random",
+    "itertools": "import itertools",
+    "colorsys": "import colorsys",
+}
+# difflib 相似度阈值；短名称的单字符拼写错误达不到（Txet -> Text 只有 0.75），另按编辑距离判断
+TYPO_CUTOFF = 0.8
+# 没有 Manim API 索引（未安装 manim）时用于拼写纠正的常用名称
+_FALLBACK_MANIM_NAMES = [
+    "Scene", "Text", "MathTex", "Tex", "Paragraph", "MarkupText", "VGroup", "Group", "Circle", "Square",
+    "Rectangle", "RoundedRectangle", "Triangle", "Polygon", "RegularPolygon", "Line", "DashedLine", "Arrow",
+    "DoubleArrow", "Vector", "Dot", "Ellipse", "Arc", "Annulus", "Brace", "BraceLabel", "SurroundingRectangle",
+    "BackgroundRectangle", "Axes", "NumberPlane", "NumberLine", "Table", "Matrix", "Code", "ImageMobject",
+    "SVGMobject", "Create", "Uncreate", "Write", "Unwrite", "FadeIn", "FadeOut", "Transform",
+    "ReplacementTransform", "TransformMatchingTex", "TransformMatchingShapes", "GrowFromCenter", "GrowArrow",
+    "DrawBorderThenFill", "Indicate", "Circumscribe", "Flash", "Wiggle", "FocusOn", "ApplyWave",
+    "AnimationGroup", "LaggedStart", "Succession", "Rotate", "MoveAlongPath", "ValueTracker", "DecimalNumber",
+    "always_redraw", "UP", "DOWN", "LEFT", "RIGHT", "ORIGIN", "UL", "UR", "DL", "DR", "PI", "TAU", "DEGREES",
+    "WHITE", "BLACK", "GRAY", "GREY", "RED", "GREEN", "BLUE", "YELLOW", "ORANGE", "PURPLE", "PINK", "TEAL",
+    "GOLD", "MAROON", "BLUE_B", "BLUE_E", "GREEN_B", "GREEN_E", "RED_B", "RED_E", "LIGHT_GRAY", "DARK_GRAY",
+]
+
+
+def manim_names() -> List[str]:
+    index = get_manim_index()
+    return list(index.names) if index else _FALLBACK_MANIM_NAMES
+
+
+# ---------------------------------------------------------------------------
+# Source editing: replace exact AST spans so formatting and comments survive
+# ---------------------------------------------------------------------------
+def _char_col(line: str, byte_col: int) -> int:
+    """ast column offsets count UTF-8 bytes; lines with Chinese text need characters"""
+    return len(line.encode("utf-8")[:byte_col].decode("utf-8", errors="ignore"))
+
+
+def _apply_edits(code: str, edits: List[Tuple[int, int, int, int, str]]) -> str:
+    """Apply (lineno, col, end_lineno, end_col, text) edits given in ast byte offsets, last first"""
+    lines = code.split("\n")
+    for lineno, col, end_lineno, end_col, text in sorted(edits, reverse=True):
+        start_line, end_line = lines[lineno - 1], lines[end_lineno - 1]
+        head = start_line[: _char_col(start_line, col)]
+        tail = end_line[_char_col(end_line, end_col) :]
+        lines[lineno - 1 : end_lineno] = (head + text + tail).split("\n")
+    return "\n".join(lines)
+
+
+def _error_line(error_msg: str) -> Optional[int]:
+    """Line in the scene file where the error surfaced: the last traceback frame outside installed packages"""
+    frames = re.findall(r'File "([^"]+)", line (\d+)', error_msg)
+    scene_frames = [int(n) for path, n in frames if "site-packages" not in path and "/lib/python" not in path]
+    if scene_frames:
+        return scene_frames[-1]
+    match = re.search(r"line (\d+)", error_msg)
+    return int(match.group(1)) if match else None
+
+
+def _rename_names(code: str, tree: ast.AST, old: str, new: str) -> Optional[str]:
+    edits = [
+        (n.lineno, n.col_offset, n.end_lineno, n.end_col_offset, new)
+        for n in ast.walk(tree)
+        if isinstance(n, ast.Name) and n.id == old
+    ]
+    # from manim import ShowCreation
+    for n in ast.walk(tree):
+        if isinstance(n, ast.ImportFrom) and any(a.name == old for a in n.names):
+            segment = ast.get_source_segment(code, n)
+            if segment:
+                edits.append((n.lineno, n.col_offset, n.end_lineno, n.end_col_offset, re.sub(rf"\b{old}\b", new, segment)))
+    return _apply_edits(code, edits) if edits else None
+
+
+def _rename_attribute(code: str, tree: ast.AST, old: str, new: str) -> Optional[str]:
+    edits = [
+        (n.end_lineno, n.end_col_offset - len(old.encode("utf-8")), n.end_lineno, n.end_col_offset, new)
+        for n in ast.walk(tree)
+        if isinstance(n, ast.Attribute) and n.attr == old
+    ]
+    return _apply_edits(code, edits) if edits else None
+
+
+def _within_one_edit(a: str, b: str) -> bool:
+    """b differs from a by one inserted, deleted or replaced character, or two swapped neighbours"""
+    if a == b or abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) == len(b):
+        diff = [i for i, (x, y) in enumerate(zip(a, b)) if x != y]
+        if len(diff) == 1:
+            return True
+        i, j = diff if len(diff) == 2 else (0, 0)
+        return j == i + 1 and a[i] == b[j] and a[j] == b[i]
+    short, long = sorted((a, b), key=len)
+    i = next((i for i, (x, y) in enumerate(zip(short, long)) if x != y), len(short))
+    return short[i:] == long[i + 1 :]
+
+
+def _closest(word: str, candidates: List[str]) -> Optional[str]:
+    """Spelling correction for `word`: the closest difflib match, else the only candidate one edit away"""
+    close = difflib.get_close_matches(word, candidates, n=1, cutoff=TYPO_CUTOFF)
+    if close:
+        return close[0]
+    near = {c for c in candidates if _within_one_edit(word, c)} if len(word) >= 3 else set()
+    return near.pop() if len(near) == 1 else None
+
+
+def _defined_names(tree: ast.AST) -> List[str]:
+    names = set()
+    for n in ast.walk(tree):
+        if isinstance(n, ast.Name) and isinstance(n.ctx, ast.Store):
+            names.add(n.id)
+        elif isinstance(n, (ast.FunctionDef, ast.ClassDef)):
+            names.add(n.name)
+        elif isinstance(n, ast.arg):
+            names.add(n.arg)
+    return sorted(names)
+
+
+# ---------------------------------------------------------------------------
+# Rules
+# ---------------------------------------------------------------------------
+@dataclass
+class FixRule:
+    """A traceback signature and the rewrite that resolves it; `fix` returns None when it does not apply"""
+
+    name: str
+    pattern: re.Pattern
+    fix: Callable[[str, ast.AST, re.Match, str], Optional[str]]
+
+
+def _fix_renamed_name(code, tree, match, error_msg):
+    old = match.group(1)
+    new = RENAMED_NAMES.get(old)
+    return _rename_names(code, tree, old, new) if new else None
+
+
+def _fix_missing_import(code, tree, match, error_msg):
+    name = match.group(1)
+    if name in MISSING_IMPORTS:
+        statement = MISSING_IMPORTS[name]
+    elif name in manim_names() and not re.search(r"^from manim import \*", code, re.MULTILINE):
+        statement = "from manim import *"
+    else:
+        return None
+    return f"{statement}\n{code}"
+
+
+def _fix_misspelled_name(code, tree, match, error_msg):
+    old = match.group(1)
+    candidates = [n for n in _defined_names(tree) if n != old] + manim_names()
+    new = _closest(old, candidates)
+    return _rename_names(code, tree, old, new) if new else None
+
+
+def _fix_renamed_method(code, tree, match, error_msg):
+    old = match.group(2)
+    new = RENAMED_METHODS.get(old)
+    return _rename_attribute(code, tree, old, new) if new else None
+
+
+def _fix_misspelled_method(code, tree, match, error_msg):
+    cls, old = match.groups()
+    new = _closest(old, get_manim_index().suggest_attributes(cls, old))
+    return _rename_attribute(code, tree, old, new) if new else None
+
+
+def _fix_unexpected_kwarg(code, tree, match, error_msg):
+    cls, kwarg = match.groups()
+    # 拼错的参数改名 (colour -> color)，否则删除
+    new = _closest(kwarg, get_manim_index().suggest_kwargs(cls, kwarg)) if cls else None
+    line = _error_line(error_msg)
+    calls = [
+        n
+        for n in ast.walk(tree)
+        if isinstance(n, ast.Call) and any(k.arg == kwarg for k in n.keywords) and (line is None or n.lineno <= line <= n.end_lineno)
+    ]
+    if not calls:
+        return None
+    edits = []
+    for call in calls:
+        args = [*call.args, *call.keywords]
+        args.sort(key=lambda a: (a.lineno, a.col_offset))
+        for i, arg in enumerate(args):
+            if not (isinstance(arg, ast.keyword) and arg.arg == kwarg):
+                continue
+            if new:
+                edits.append((arg.lineno, arg.col_offset, arg.lineno, arg.col_offset + len(kwarg), new))
+            elif i > 0:
+                # 连同前面的逗号一起删除: f(a, bad=1) -> f(a)
+                prev = args[i - 1]
+                edits.append((prev.end_lineno, prev.end_col_offset, arg.end_lineno, arg.end_col_offset, ""))
+            elif len(args) > 1:
+                nxt = args[1]
+                edits.append((arg.lineno, arg.col_offset, nxt.lineno, nxt.col_offset, ""))
+            else:
+                edits.append((arg.lineno, arg.col_offset, arg.end_lineno, arg.end_col_offset, ""))
+    return _apply_edits(code, edits)
+
+
+_NAME_ERROR = re.compile(r"NameError: name '(\w+)' is not defined")
+
+DEFAULT_RULES = [
+    FixRule("renamed_api", _NAME_ERROR, _fix_renamed_name),
+    FixRule("renamed_import", re.compile(r"ImportError: cannot import name '(\w+)'"), _fix_renamed_name),
+    FixRule("missing_import", _NAME_ERROR, _fix_missing_import),
+    FixRule("misspelled_name", _NAME_ERROR, _fix_misspelled_name),
+    FixRule("renamed_method", re.compile(r"AttributeError: '(\w+)' object has no attribute '(\w+)'"), _fix_renamed_method),
+    FixRule("misspelled_method", re.compile(r"AttributeError: '(\w+)' object has no attribute '(\w+)'"), _fix_misspelled_method),
+    FixRule(
+        "unexpected_kwarg",
+        re.compile(r"TypeError: (?:(\w+)\.__init__\(\) )?.*?got an unexpected keyword argument '(\w+)'"),
+        _fix_unexpected_kwarg,
+    ),
+]
+
+
+class LocalFixer:
+    """Deterministic fixes for common Manim failures, tried before any LLM repair.
+
+    Each rule matches a traceback signature and rewrites the exact AST spans involved. The
+    first rule whose rewrite changes the code and still compiles wins. Counters record how
+    often a rule applied and, via record_outcome, whether the next render then succeeded.
+    """
+
+    def __init__(self, rules: Optional[List[FixRule]] = None):
+        self.rules = rules if rules is not None else list(DEFAULT_RULES)
+        self._lock = threading.Lock()
+        self._pending: Dict[str, str] = {}
+        self.attempts = 0
+        self.applied: Dict[str, int] = {}
+        self.succeeded: Dict[str, int] = {}
+        self.failed: Dict[str, int] = {}
+
+    @staticmethod
+    def _digest(code: str) -> str:
+        return hashlib.sha256(code.encode("utf-8")).hexdigest()
+
+    def fix(self, code: str, error_msg: str) -> Optional[Tuple[str, str]]:
+        """Return (fixed_code, rule_name), or None when no rule resolves `error_msg`"""
+        with self._lock:
+            self.attempts += 1
+        try:
+            tree = ast.parse(code)
+        except SyntaxError:
+            return None
+        for rule in self.rules:
+            match = rule.pattern.search(error_msg or "")
+            if not match:
+                continue
+            try:
+                fixed = rule.fix(code, tree, match, error_msg)
+                if not fixed or fixed == code:
+                    continue
+                compile(fixed, "<local_fix>", "exec")
+            except (SyntaxError, ValueError, IndexError):
+                continue
+            with self._lock:
+                self.applied[rule.name] = self.applied.get(rule.name, 0) + 1
+                self._pending[self._digest(fixed)] = rule.name
+            return fixed, rule.name
+        return None
+
+    def record_outcome(self, code: str, success: bool) -> None:
+        """Called after rendering `code`; attributes the result to the rule that produced it, if any"""
+        with self._lock:
+            rule = self._pending.pop(self._digest(code), None)
+            if rule:
+                counter = self.succeeded if success else self.failed
+                counter[rule] = counter.get(rule, 0) + 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            applied = sum(self.applied.values())
+            return {
+                "attempts": self.attempts,
+                "applied": applied,
+                "hit_rate": applied / self.attempts if self.attempts else 0.0,
+                "by_rule": dict(self.applied),
+                "succeeded": dict(self.succeeded),
+                "failed": dict(self.failed),
+            }
+
+
+_LOCAL_FIXER: Optional[LocalFixer] = None
+
+
+def get_local_fixer() -> LocalFixer:
+    global _LOCAL_FIXER
+    if _LOCAL_FIXER is None:
+        _LOCAL_FIXER = LocalFixer()
+    return _LOCAL_FIXER
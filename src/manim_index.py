@@ -0,0 +1,221 @@
+import re
+import json
+import difflib
+import inspect
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from render_cache import manim_version
+
+
+INDEX_FORMAT = 2
+_DEFAULT_INDEX_DIR = Path(__file__).with_name(".manim_index")
+
+
+def _signature(fn, drop_self: bool = False) -> str:
+    try:
+        params = list(inspect.signature(fn).parameters.values())
+    except (TypeError, ValueError):
+        return "(...)"
+    if drop_self and params and params[0].name == "self":
+        params = params[1:]
+    return "(" + ", ".join(str(p) for p in params) + ")"
+
+
+def _init_params(cls) -> Tuple[List[str], bool]:
+    """Keyword names accepted by cls(...), following **kwargs up the MRO, and whether that list is complete"""
+    names = []
+    for klass in cls.__mro__:
+        init = klass.__dict__.get("__init__")
+        if init is None or klass is object:
+            continue
+        try:
+            params = list(inspect.signature(init).parameters.values())
+        except (TypeError, ValueError):
+            return sorted(set(names)), False
+        names += [p.name for p in params[1:] if p.kind not in (p.VAR_POSITIONAL, p.VAR_KEYWORD)]
+        if not any(p.kind == p.VAR_KEYWORD for p in params):
+            return sorted(set(names)), True
+    return sorted(set(names)), False
+
+
+def build_index() -> Dict:
+    """Introspect the installed manim into a JSON-serializable index (takes a few seconds, done once per version)"""
+    import manim
+
+    names, classes = {}, {}
+    pending = []
+    for name in dir(manim):
+        if name.startswith("_"):
+            continue
+        obj = getattr(manim, name)
+        if inspect.ismodule(obj):
+            continue
+        if inspect.isclass(obj):
+            names[name] = {"kind": "class", "signature": _signature(obj.__init__, drop_self=True)}
+            pending.append(obj)
+        elif callable(obj):
+            names[name] = {"kind": "function", "signature": _signature(obj)}
+        else:
+            names[name] = {"kind": "constant", "signature": ""}
+
+    # 每个类只记录自身定义的方法和基类名，继承的方法在查询时沿基类链合并
+    while pending:
+        cls = pending.pop()
+        if cls.__name__ in classes or cls is object:
+            continue
+        bases = [b for b in cls.__bases__ if b is not object]
+        params, closed = _init_params(cls)
+        classes[cls.__name__] = {
+            "methods": sorted(n for n in cls.__dict__ if not n.startswith("_")),
+            "bases": [b.__name__ for b in bases],
+            "params": params,
+            "params_closed": closed,
+        }
+        pending.extend(bases)
+    return {"format": INDEX_FORMAT, "manim": manim_version(), "names": names, "classes": classes}
+
+
+class ManimIndex:
+    """Public names, class methods and constructor signatures of the installed manim, with fuzzy lookup"""
+
+    def __init__(self, data: Optional[Dict] = None):
+        data = data or {}
+        self.names: Dict[str, Dict] = data.get("names", {})
+        self.classes: Dict[str, Dict] = data.get("classes", {})
+        self._lower = {n.lower(): n for n in self.names}
+        self._methods: Dict[str, List[str]] = {}
+
+    def __bool__(self):
+        return bool(self.names)
+
+    def has_name(self, name: str) -> bool:
+        return name in self.names
+
+    def describe(self, name: str) -> str:
+        """`Circle(radius=None, color=...)` for callables, the bare name otherwise"""
+        info = self.names.get(name)
+        return f"{name}{info['signature']}" if info and info["signature"] else name
+
+    def suggest_names(self, name: str, n: int = 3, cutoff: float = 0.6) -> List[str]:
+        if name.lower() in self._lower and self._lower[name.lower()] != name:
+            return [self._lower[name.lower()]]
+        return difflib.get_close_matches(name, list(self.names), n=n, cutoff=cutoff)
+
+    def methods(self, class_name: str) -> List[str]:
+        """Public attributes of a class, inherited ones included"""
+        if class_name not in self._methods:
+            seen, order, stack = set(), [], [class_name]
+            while stack:
+                c = stack.pop()
+                if c in seen or c not in self.classes:
+                    continue
+                seen.add(c)
+                order.extend(self.classes[c]["methods"])
+                stack.extend(self.classes[c]["bases"])
+            self._methods[class_name] = sorted(set(order))
+        return self._methods[class_name]
+
+    def owners(self, attr: str, limit: int = 5) -> List[str]:
+        """Exported classes that define `attr` themselves"""
+        return [c for c, info in self.classes.items() if attr in info["methods"] and c in self.names][:limit]
+
+    def suggest_attributes(self, class_name: str, attr: str, n: int = 3, cutoff: float = 0.6) -> List[str]:
+        candidates = self.methods(class_name) if class_name in self.classes else sorted(
+            {m for info in self.classes.values() for m in info["methods"]}
+        )
+        return difflib.get_close_matches(attr, candidates, n=n, cutoff=cutoff)
+
+    def signature(self, name: str) -> Optional[str]:
+        info = self.names.get(name)
+        return info["signature"] if info and info["kind"] in ("class", "function") else None
+
+    def accepted_kwargs(self, class_name: str) -> Optional[List[str]]:
+        """Every keyword cls(...) accepts, or None when **kwargs make it open-ended"""
+        info = self.classes.get(class_name)
+        if not info or not info.get("params_closed"):
+            return None
+        return info["params"]
+
+    def suggest_kwargs(self, class_name: str, kwarg: str, n: int = 3, cutoff: float = 0.6) -> List[str]:
+        params = self.classes.get(class_name, {}).get("params", [])
+        return difflib.get_close_matches(kwarg, params, n=n, cutoff=cutoff)
+
+    def hints_for_error(self, error_msg: str) -> List[str]:
+        """Concrete symbol/signature hints for NameError, ImportError, AttributeError and bad keyword arguments"""
+        if not self or not error_msg:
+            return []
+        hints = []
+        m = re.search(r"NameError: name '(\w+)' is not defined", error_msg) or re.search(
+            r"ImportError: cannot import name '(\w+)'", error_msg
+        )
+        if m:
+            close = self.suggest_names(m.group(1))
+            if close:
+                hints.append(f"`{m.group(1)}` 在 Manim v0.19.0 中不存在，可能是: {'; '.join(self.describe(c) for c in close)}")
+        m = re.search(r"AttributeError: '(\w+)' object has no attribute '(\w+)'", error_msg)
+        if m:
+            cls, attr = m.groups()
+            close = self.suggest_attributes(cls, attr)
+            if close:
+                hints.append(f"`{cls}` 没有 `{attr}`，相近的方法/属性: {', '.join(close)}")
+            owners = self.owners(attr)
+            if owners:
+                hints.append(f"`{attr}` 定义在: {', '.join(owners)}")
+        m = re.search(r"TypeError: (\w+)\.__init__\(\) got an unexpected keyword argument '(\w+)'", error_msg)
+        if m:
+            cls, kwarg = m.groups()
+            close = self.suggest_kwargs(cls, kwarg)
+            hint = f"`{cls}` 不接受参数 `{kwarg}`"
+            hints.append(hint + (f"，可能是: {', '.join(close)}" if close else f"，可用参数: {', '.join(self.classes.get(cls, {}).get('params', [])[:20])}"))
+        return hints
+
+
+_INDEX: Optional[ManimIndex] = None
+_INDEX_LOCK = threading.Lock()
+
+
+def index_path(index_dir=None) -> Path:
+    return Path(index_dir or _DEFAULT_INDEX_DIR) / f"manim-{manim_version()}.json"
+
+
+def get_manim_index(index_dir=None) -> ManimIndex:
+    """Process-wide index, loaded from `.manim_index/manim-<version>.json` on first use.
+
+    The file is built by introspection the first time a process with manim installed asks
+    for it; without manim the index is empty and every lookup returns nothing.
+    """
+    global _INDEX
+    with _INDEX_LOCK:
+        if _INDEX is not None:
+            return _INDEX
+        path = index_path(index_dir)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("format") == INDEX_FORMAT:
+                _INDEX = ManimIndex(data)
+                return _INDEX
+        except (OSError, ValueError):
+            pass
+        try:
+            data = build_index()
+        except Exception as e:
+            print(f"⚠️ 无法构建 Manim API 索引: {e}")
+            _INDEX = ManimIndex()
+            return _INDEX
+        try:
+            from run_manifest import atomic_write_json
+
+            path.parent.mkdir(parents=True, exist_ok=True)
+            atomic_write_json(path, data)
+        except OSError as e:
+            print(f"⚠️ Manim API 索引写入失败: {e}")
+        _INDEX = ManimIndex(data)
+        return _INDEX
+
+
+if __name__ == "__main__":
+    index = get_manim_index()
+    print(f"Manim {manim_version()} 索引: {len(index.names)} 个名称, {len(index.classes)} 个类 -> {index_path()}")
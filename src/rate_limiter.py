@@ -0,0 +1,195 @@
+import os
+import json
+import time
+import random
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Optional
+
+if os.name == "nt":
+    import msvcrt
+else:
+    import fcntl
+
+
+@contextmanager
+def interprocess_lock(lock_path):
+    """Exclusive lock on a lock file, shared by every process on this host"""
+    lock_path = Path(lock_path)
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(lock_path, "a+b") as f:
+        if os.name == "nt":
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    # LK_LOCK gives up after ~10s of contention; keep waiting
+                    continue
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class TokenBucketRateLimiter:
+    """Requests/min and tokens/min token buckets for one provider, shared across processes.
+
+    Bucket state lives in ``<state_dir>/<svc>.json`` and is only read or written while holding
+    ``<svc>.lock``, so every worker process of a run draws from the same quota. Each bucket
+    holds at most one minute of quota and refills continuously. ``record_usage`` settles the
+    difference between the estimate charged up front and the tokens the provider reported,
+    and ``penalize`` blocks the provider after a 429 for as long as the server asked.
+    """
+
+    def __init__(self, svc: str, rpm: Optional[float] = None, tpm: Optional[float] = None, state_dir=None):
+        self.svc = svc
+        self.rpm = float(rpm) if rpm else None
+        self.tpm = float(tpm) if tpm else None
+        self.state_dir = Path(state_dir or Path(tempfile.gettempdir()) / "code2video_ratelimit")
+        self.state_path = self.state_dir / f"{svc}.json"
+        self.lock_path = self.state_dir / f"{svc}.lock"
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.rpm or self.tpm)
+
+    def _load(self, now: float) -> Dict[str, float]:
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            state = {"requests": self.rpm or 0.0, "tokens": self.tpm or 0.0, "updated": now, "blocked_until": 0.0}
+
+        elapsed = max(0.0, now - state.get("updated", now))
+        if self.rpm:
+            state["requests"] = min(self.rpm, state.get("requests", 0.0) + elapsed * self.rpm / 60.0)
+        if self.tpm:
+            state["tokens"] = min(self.tpm, state.get("tokens", 0.0) + elapsed * self.tpm / 60.0)
+        state["updated"] = now
+        return state
+
+    def _save(self, state: Dict[str, float]) -> None:
+        tmp_path = self.state_path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.state_path)
+
+    def _try_acquire(self, tokens: int) -> float:
+        """Take quota if available and return 0, otherwise return the seconds to wait"""
+        with interprocess_lock(self.lock_path):
+            now = time.time()
+            state = self._load(now)
+            wait = max(0.0, state.get("blocked_until", 0.0) - now)
+            if self.rpm and state["requests"] < 1:
+                wait = max(wait, (1 - state["requests"]) * 60.0 / self.rpm)
+            if self.tpm and state["tokens"] < tokens:
+                wait = max(wait, (tokens - state["tokens"]) * 60.0 / self.tpm)
+            if wait <= 0:
+                if self.rpm:
+                    state["requests"] -= 1
+                if self.tpm:
+                    state["tokens"] -= tokens
+            self._save(state)
+            return wait
+
+    def _clamp(self, tokens: int) -> int:
+        # A single request larger than the whole bucket would otherwise wait forever
+        return int(min(max(tokens, 1), self.tpm)) if self.tpm else 0
+
+    def acquire(self, tokens: int = 1) -> float:
+        """Block until one request and `tokens` tokens are available; returns seconds waited"""
+        if not self.enabled:
+            return 0.0
+        tokens = self._clamp(tokens)
+        waited = 0.0
+        while True:
+            wait = self._try_acquire(tokens)
+            if wait <= 0:
+                return waited
+            # Small jitter so workers woken together do not stampede the lock file
+            delay = min(wait, 5.0) + random.random() * 0.05
+            time.sleep(delay)
+            waited += delay
+
+    async def acquire_async(self, tokens: int = 1) -> float:
+        import asyncio
+
+        if not self.enabled:
+            return 0.0
+        tokens = self._clamp(tokens)
+        waited = 0.0
+        while True:
+            wait = await asyncio.to_thread(self._try_acquire, tokens)
+            if wait <= 0:
+                return waited
+            delay = min(wait, 5.0) + random.random() * 0.05
+            await asyncio.sleep(delay)
+            waited += delay
+
+    def record_usage(self, estimated_tokens: int, actual_tokens: int) -> None:
+        """Refund or charge the difference between the up-front estimate and the real usage"""
+        if not self.tpm or not actual_tokens:
+            return
+        delta = self._clamp(estimated_tokens) - actual_tokens
+        if delta == 0:
+            return
+        with interprocess_lock(self.lock_path):
+            state = self._load(time.time())
+            state["tokens"] = min(self.tpm, state["tokens"] + delta)
+            self._save(state)
+
+    def penalize(self, retry_after: Optional[float] = None) -> None:
+        """After a 429, hold every worker off this provider until the server's retry-after passes"""
+        if not self.enabled:
+            return
+        retry_after = retry_after if retry_after is not None else 60.0 / (self.rpm or 60.0)
+        with interprocess_lock(self.lock_path):
+            now = time.time()
+            state = self._load(now)
+            state["blocked_until"] = max(state.get("blocked_until", 0.0), now + retry_after)
+            self._save(state)
+
+
+def estimate_tokens(messages, max_tokens: Optional[int] = None) -> int:
+    """Cheap upper-bound style estimate of a request's token cost (prompt text + completion budget)"""
+    chars = 0
+    for message in messages or []:
+        content = message.get("content", "")
+        if isinstance(content, str):
+            chars += len(content)
+        else:
+            for part in content:
+                if part.get("type") == "text":
+                    chars += len(part.get("text", ""))
+                else:
+                    # Images/videos are billed per tile/frame; charge a flat amount
+                    chars += 2000
+    # 中文约 1 字符/token，英文约 4 字符/token，取折中
+    return chars // 2 + (max_tokens or 0)
+
+
+_LIMITERS: Dict[str, TokenBucketRateLimiter] = {}
+
+
+def get_rate_limiter(svc: str, cfg=None) -> TokenBucketRateLimiter:
+    """Per-provider limiter configured by "rpm"/"tpm" in api_config.json (unset means unlimited)"""
+    limiter = _LIMITERS.get(svc)
+    if limiter is None:
+        def _get(key, default=None):
+            return cfg(svc, key, default) if cfg else default
+
+        state_dir = cfg("ratelimit", "dir", None) if cfg else None
+        limiter = TokenBucketRateLimiter(svc, rpm=_get("rpm"), tpm=_get("tpm"), state_dir=state_dir)
+        _LIMITERS[svc] = limiter
+    return limiter
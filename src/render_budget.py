@@ -0,0 +1,117 @@
+import json
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from rate_limiter import interprocess_lock
+from run_manifest import atomic_write_json
+
+
+STATS_FORMAT = 1
+_DEFAULT_STATS_PATH = Path(__file__).with_name(".render_budget") / "stats.json"
+MIN_SAMPLES = 3  # 样本不足时沿用调用方给的固定超时
+EWMA_ALPHA = 0.3
+STARTUP_SECONDS = 15  # 导入场景、编译 LaTeX 等与动画数量无关的开销
+
+
+class RenderBudget:
+    """Per-render time limits derived from a section's animation count and past render speed.
+
+    Seconds per storyboard animation are tracked per quality tag ("l@5fps", "h", ...) as an
+    exponential moving average shared by every topic and process. Once a tag has enough
+    samples, a render gets `slack` times its expected duration (never more than the caller's
+    fixed default), so a runaway scene is stopped long before the old blanket timeout.
+    """
+
+    def __init__(
+        self,
+        path=None,
+        enabled: bool = True,
+        slack: float = 3.0,
+        min_timeout: float = 60,
+        stall_timeout: Optional[float] = 90,
+    ):
+        self.path = Path(path or _DEFAULT_STATS_PATH)
+        self.lock_path = self.path.with_name(f".{self.path.name}.lock")
+        self.enabled = enabled
+        self.slack = slack
+        self.min_timeout = min_timeout
+        self.stall_timeout = stall_timeout
+        self._lock = threading.Lock()
+        self._data: Optional[Dict[str, Any]] = None
+        self._mtime = None
+
+    def _read(self) -> Dict[str, Any]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("format") == STATS_FORMAT:
+                return data
+        except (OSError, ValueError):
+            pass
+        return {"format": STATS_FORMAT, "speeds": {}}
+
+    def _speeds(self) -> Dict[str, Any]:
+        try:
+            mtime = self.path.stat().st_mtime_ns
+        except OSError:
+            mtime = None
+        if self._data is None or mtime != self._mtime:
+            self._data, self._mtime = self._read(), mtime
+        return self._data["speeds"]
+
+    def expected_seconds(self, quality_tag: str, animations: int) -> Optional[float]:
+        """Predicted render time, or None until the tag has MIN_SAMPLES renders behind it"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            speed = self._speeds().get(quality_tag)
+        if not speed or speed["samples"] < MIN_SAMPLES:
+            return None
+        return STARTUP_SECONDS + speed["seconds_per_animation"] * max(animations, 1)
+
+    def timeout(self, quality_tag: str, animations: int, default: float) -> float:
+        expected = self.expected_seconds(quality_tag, animations)
+        if expected is None:
+            return default
+        return min(default, max(self.min_timeout, self.slack * expected))
+
+    def record(self, quality_tag: str, animations: int, seconds: float) -> None:
+        """Fold one successful render into the tag's speed"""
+        if not self.enabled or seconds <= 0:
+            return
+        per_animation = max(seconds - STARTUP_SECONDS, 0.0) / max(animations, 1)
+        try:
+            with self._lock, interprocess_lock(self.lock_path):
+                data = self._read()
+                speed = data["speeds"].get(quality_tag)
+                if speed is None:
+                    data["speeds"][quality_tag] = {"seconds_per_animation": per_animation, "samples": 1}
+                else:
+                    speed["seconds_per_animation"] += EWMA_ALPHA * (per_animation - speed["seconds_per_animation"])
+                    speed["samples"] += 1
+                atomic_write_json(self.path, data)
+                self._data, self._mtime = data, self.path.stat().st_mtime_ns
+        except OSError as e:
+            print(f"⚠️ 渲染耗时统计写入失败: {e}")
+
+
+_RENDER_BUDGET: Optional[RenderBudget] = None
+
+
+def get_render_budget() -> RenderBudget:
+    """Process-wide budget; settings come from the "render_budget" section of api_config.json"""
+    global _RENDER_BUDGET
+    if _RENDER_BUDGET is None:
+        from llm_client import cfg
+
+        enabled = str(cfg("render_budget", "enabled", "1")).lower() not in ("0", "false", "no", "off")
+        stall = float(cfg("render_budget", "stall_timeout", 90))
+        _RENDER_BUDGET = RenderBudget(
+            path=cfg("render_budget", "path", None),
+            enabled=enabled,
+            slack=float(cfg("render_budget", "slack", 3.0)),
+            min_timeout=float(cfg("render_budget", "min_timeout", 60)),
+            stall_timeout=stall if stall > 0 else None,
+        )
+    return _RENDER_BUDGET
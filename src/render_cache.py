@@ -0,0 +1,136 @@
+import os
+import re
+import ast
+import json
+import hashlib
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from llm_cache import file_digest
+
+
+_DEFAULT_CACHE_DIR = Path(__file__).with_name(".render_cache")
+_MANIM_VERSION = None
+_ASSET_PATTERN = re.compile(r"\.(png|jpe?g|svg)$", re.IGNORECASE)
+
+
+def manim_version() -> str:
+    global _MANIM_VERSION
+    if _MANIM_VERSION is None:
+        try:
+            from importlib.metadata import version
+
+            _MANIM_VERSION = version("manim")
+        except Exception:
+            _MANIM_VERSION = "unknown"
+    return _MANIM_VERSION
+
+
+def normalize_code(code: str) -> str:
+    """Canonical form of scene source: comments, blank lines and formatting do not change the video"""
+    try:
+        return ast.dump(ast.parse(code), annotate_fields=False)
+    except SyntaxError:
+        return "\n".join(line.rstrip() for line in code.strip().splitlines())
+
+
+def _asset_digests(code: str, base_dir: Path) -> Dict[str, str]:
+    """Digests of image files the scene loads, so replacing an icon invalidates the entry"""
+    digests = {}
+    try:
+        nodes = ast.walk(ast.parse(code))
+    except SyntaxError:
+        return digests
+    for node in nodes:
+        if isinstance(node, ast.Constant) and isinstance(node.value, str) and _ASSET_PATTERN.search(node.value):
+            path = Path(node.value)
+            if not path.is_absolute():
+                path = base_dir / path
+            try:
+                digests[node.value] = file_digest(path)
+            except OSError:
+                digests[node.value] = None
+    return digests
+
+
+class RenderCache:
+    """Maps (normalized code hash, scene, quality, manim version, asset digests) to a rendered mp4.
+
+    Entries are small JSON records ``<cache_dir>/<key[:2]>/<key>.json`` pointing at the video
+    with its size and mtime; a record whose video has been moved or rewritten is a miss.
+    """
+
+    def __init__(self, cache_dir=None, enabled: bool = True):
+        self.cache_dir = Path(cache_dir or _DEFAULT_CACHE_DIR)
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(code: str, scene_name: str, quality: str, base_dir=".") -> str:
+        payload = {
+            "code": hashlib.sha256(normalize_code(code).encode("utf-8")).hexdigest(),
+            "scene": scene_name,
+            "quality": quality,
+            "manim": manim_version(),
+            "assets": _asset_digests(code, Path(base_dir)),
+        }
+        raw = json.dumps(payload, sort_keys=True)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _entry_path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+        video_path = None
+        try:
+            with open(self._entry_path(key), "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            st = os.stat(entry["video_path"])
+            if st.st_size == entry["size"] and st.st_mtime_ns == entry["mtime_ns"]:
+                video_path = entry["video_path"]
+        except (OSError, ValueError, KeyError):
+            pass
+        with self._lock:
+            if video_path:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return video_path
+
+    def put(self, key: str, video_path) -> None:
+        if not self.enabled:
+            return
+        path = self._entry_path(key)
+        try:
+            st = os.stat(video_path)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"video_path": str(Path(video_path).resolve()), "size": st.st_size, "mtime_ns": st.st_mtime_ns}, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"⚠️ 渲染缓存写入失败: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / lookups if lookups else 0.0}
+
+
+_RENDER_CACHE: Optional[RenderCache] = None
+
+
+def get_render_cache() -> RenderCache:
+    """Process-wide cache instance; settings come from the "render_cache" section of api_config.json"""
+    global _RENDER_CACHE
+    if _RENDER_CACHE is None:
+        from llm_client import cfg
+
+        enabled = str(cfg("render_cache", "enabled", "1")).lower() not in ("0", "false", "no", "off")
+        _RENDER_CACHE = RenderCache(cache_dir=cfg("render_cache", "dir", None), enabled=enabled)
+    return _RENDER_CACHE
@@ -0,0 +1,689 @@
+import os
+import re
+import sys
+import json
+import time
+import atexit
+import types
+import signal
+import faulthandler
+import tempfile
+import linecache
+import multiprocessing.connection
+import multiprocessing.util
+import threading
+import traceback
+import subprocess
+import importlib.util
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional, Tuple
+
+
+# manim -q<flag> -> config.quality
+QUALITY_FLAGS = {
+    "l": "low_quality",
+    "m": "medium_quality",
+    "h": "high_quality",
+    "p": "production_quality",
+    "k": "fourk_quality",
+}
+
+# manim -q<flag> -> 输出目录名中的像素高度，如 480p15
+QUALITY_HEIGHTS = {"l": 480, "m": 720, "h": 1080, "p": 1440, "k": 2160}
+# manim -q<flag> -> 默认帧率
+QUALITY_FPS = {"l": 15, "m": 30, "h": 60, "p": 60, "k": 60}
+
+# 试运行不画帧，但会完整执行 construct（含 LaTeX 编译）；超过这个时间多半是死循环
+DRY_RUN_TIMEOUT = 120
+
+_MANIM_READY = None
+
+
+@dataclass
+class RenderResult:
+    """Outcome of one scene render, shaped like the subprocess.CompletedProcess it replaces"""
+
+    returncode: int
+    stdout: str = ""
+    stderr: str = ""
+    video_path: Optional[str] = None
+    duration: float = 0.0
+    too_slow: Optional[str] = None  # 被看门狗中止时的原因
+
+
+def preload_manim() -> bool:
+    """Import manim (and with it numpy, cairo, pango, av) once in this process"""
+    global _MANIM_READY
+    if _MANIM_READY is None:
+        try:
+            import manim  # noqa: F401
+            from manim import tempconfig  # noqa: F401
+
+            _MANIM_READY = True
+        except Exception as e:
+            print(f"⚠️ 预加载 manim 失败，渲染将回退到子进程: {e}")
+            _MANIM_READY = False
+    return _MANIM_READY
+
+
+def init_render_worker():
+    """ProcessPoolExecutor initializer: every render worker starts with manim already imported.
+
+    A worker is admitted for one render at a time, so the dry runs of its speculative fixes run
+    one at a time as well. Pool workers leave through os._exit and skip atexit, so the dry-run
+    helpers are stopped by a multiprocessing finalizer when the pool shuts the worker down.
+    """
+    preload_manim()
+    limit_dry_runs(1)
+    multiprocessing.util.Finalize(None, shutdown_dry_run_servers, exitpriority=10)
+
+
+def _can_fork() -> bool:
+    # fork() of a multi-threaded process can inherit locks held by other threads
+    return hasattr(os, "fork") and threading.active_count() == 1
+
+
+def _load_scene_module(code_file: Path):
+    spec = importlib.util.spec_from_file_location(code_file.stem, code_file)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[code_file.stem] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def _print_scene_traceback(code_file: Path):
+    """Print the current exception starting at the first frame in the scene file.
+
+    ScopeRefine reads the first "line N" of stderr, which must point into the generated code
+    rather than into this module.
+    """
+    exc = traceback.TracebackException(*sys.exc_info())
+    frames = list(exc.stack)
+    target = str(code_file)
+    for i, frame in enumerate(frames):
+        if frame.filename == target:
+            exc.stack = traceback.StackSummary.from_list(frames[i:])
+            break
+    sys.stderr.write("".join(exc.format()))
+
+
+def _render_in_child(
+    code_file: Path, scene_name: str, cwd: Path, quality: str, frame_rate: Optional[int], out_path, err_path, result_path
+):
+    """Runs in the forked child and never returns"""
+    exit_code = 1
+    try:
+        os.setpgid(0, 0)
+        out_fd = os.open(out_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        err_fd = os.open(err_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        os.dup2(out_fd, 1)
+        os.dup2(err_fd, 2)
+        faulthandler.enable(all_threads=False)  # 看门狗发 SIGABRT 时打印卡住的代码行
+
+        os.chdir(cwd)
+        sys.path.insert(0, str(cwd))
+        from manim import tempconfig
+
+        overrides = {
+            "quality": QUALITY_FLAGS[quality],
+            "media_dir": str(cwd / "media"),
+            "input_file": str(code_file),
+        }
+        if frame_rate:
+            overrides["frame_rate"] = frame_rate  # 必须在 quality 之后设置，quality 会重置帧率
+        with tempconfig(overrides):
+            module = _load_scene_module(code_file)
+            scene_cls = getattr(module, scene_name)
+            scene = scene_cls()
+            scene.render()
+            video_path = scene.renderer.file_writer.movie_file_path
+
+        with open(result_path, "w", encoding="utf-8") as f:
+            json.dump({"video_path": str(video_path) if video_path else None}, f)
+        exit_code = 0
+    except SystemExit as e:
+        exit_code = e.code if isinstance(e.code, int) else 1
+    except BaseException:
+        _print_scene_traceback(code_file)
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        finally:
+            os._exit(exit_code)
+
+
+def _read_text(path) -> str:
+    try:
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            return f.read()
+    except FileNotFoundError:
+        return ""
+
+
+# ---------------------------------------------------------------------------
+# Watchdog: stop renders that are over budget, stalled, or bound to overrun
+# ---------------------------------------------------------------------------
+# Manim 的 tqdm 进度条，如 "Animation 3: Wait(...):  45%|####  | 27/60 [00:01<00:01, 20.10it/s]"
+_PROGRESS = re.compile(r"Animation (\d+)\b[^\r\n]*?\d+%\|[^|\r\n]*\| *(\d+)/(\d+) \[([^\]\r\n]*)\]")
+_RATE = re.compile(r"([\d.]+)(it/s|s/it)")
+PROJECTION_GRACE = 5  # 渲染开始这么多秒后帧率才算稳定，才按进度预测
+KILL_GRACE = 1.0  # SIGABRT 后留给 faulthandler 打印调用栈的时间
+
+
+@dataclass
+class RenderProgress:
+    animation: int
+    frame: int
+    total: int
+    rate: Optional[float] = None  # frames per second
+
+    def describe(self) -> str:
+        return f"animation {self.animation} at frame {self.frame}/{self.total}"
+
+
+def parse_progress(text: str) -> Optional[RenderProgress]:
+    """The most recent progress-bar update in Manim's stderr"""
+    match = None
+    for match in _PROGRESS.finditer(text):
+        pass
+    if match is None:
+        return None
+    rate = None
+    rate_match = _RATE.search(match.group(4))
+    if rate_match:
+        value = float(rate_match.group(1))
+        rate = value if rate_match.group(2) == "it/s" else (1 / value if value else None)
+    return RenderProgress(int(match.group(1)), int(match.group(2)), int(match.group(3)), rate)
+
+
+class _Watchdog:
+    """Decides when a running render is hopeless.
+
+    Three triggers: the time budget is spent; nothing has been written to the output files
+    for `stall_timeout` seconds (an infinite loop in construct or an updater); or the
+    progress bar shows the current animation alone cannot finish within the budget
+    (a `self.wait(1000)`), which is caught seconds into the render instead of at the end.
+    """
+
+    def __init__(self, timeout: Optional[float], stall_timeout: Optional[float] = None, watched=()):
+        self.timeout = timeout
+        self.stall_timeout = stall_timeout
+        self.watched = list(watched)  # [stderr, stdout]: 进度条在 stderr
+        self.start = self.last_change = time.monotonic()
+        self.sizes = None
+        self.progress: Optional[RenderProgress] = None
+
+    def _poll_output(self, now: float) -> None:
+        sizes = []
+        for path in self.watched:
+            try:
+                sizes.append(os.path.getsize(path))
+            except OSError:
+                sizes.append(0)
+        if sizes == self.sizes:
+            return
+        self.sizes, self.last_change = sizes, now
+        if self.watched and sizes[0]:
+            with open(self.watched[0], "rb") as f:
+                f.seek(max(0, sizes[0] - 8192))
+                self.progress = parse_progress(f.read().decode("utf-8", "replace")) or self.progress
+
+    def check(self) -> Optional[str]:
+        """Why the render should be stopped now, or None"""
+        now = time.monotonic()
+        elapsed = now - self.start
+        if self.watched:
+            self._poll_output(now)
+        where = f" ({self.progress.describe()})" if self.progress else ""
+        if self.timeout and elapsed > self.timeout:
+            return f"render exceeded its {self.timeout:.0f}s time budget{where}"
+        if self.stall_timeout and self.watched and now - self.last_change > self.stall_timeout:
+            return f"no render progress for {self.stall_timeout:.0f}s{where}; construct() or an updater never finishes"
+        p = self.progress
+        if self.timeout and p and p.rate and elapsed > PROJECTION_GRACE:
+            remaining = (p.total - p.frame) / p.rate
+            if elapsed + remaining > self.timeout:
+                return (
+                    f"animation {p.animation} needs {p.total} frames, about {remaining:.0f}s more at "
+                    f"{p.rate:.1f} frames/s, beyond the {self.timeout:.0f}s time budget; shorten its run_time or wait()"
+                )
+        return None
+
+
+def _too_slow_error(dump: str, code_file: Path, reason: str, code: Optional[str] = None) -> str:
+    """A traceback-shaped RenderTooSlowError pointing at the scene line that was running when the render was stopped.
+
+    `dump` is the faulthandler stack (most recent call first) the child printed on SIGABRT.
+    """
+    lines = [f"RenderTooSlowError: {reason}"]
+    for path, lineno, func in re.findall(r'File "([^"]+)", line (\d+),? in (\w+)', dump):
+        # faulthandler 把非 ASCII 字符写成 \xNN / \uNNNN / \UNNNNNNNN
+        path = re.sub(r"\\(?:x([0-9a-f]{2})|u([0-9a-f]{4})|U([0-9a-f]{8}))", lambda m: chr(int(m.group(m.lastindex), 16)), path)
+        if path != str(code_file):
+            continue
+        source = code.splitlines() if code is not None else _read_text(code_file).splitlines()
+        n = int(lineno)
+        frame = [f'  File "{path}", line {n}, in {func}']
+        if 1 <= n <= len(source):
+            frame.append(f"    {source[n - 1].strip()}")
+        lines = ["Traceback (most recent call last):"] + frame + lines
+        break
+    return "\n".join(lines)
+
+
+def _abort(pid: int) -> None:
+    """SIGABRT makes faulthandler in the render dump its Python stack to stderr before dying"""
+    try:
+        os.kill(pid, signal.SIGABRT)
+    except ProcessLookupError:
+        pass
+
+
+def _kill_group(pid: int) -> None:
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def _wait_child(pid: int, watchdog: _Watchdog) -> Tuple[Optional[int], Optional[str]]:
+    """(wait status, None) of the forked child, or (None, reason) after the watchdog had its process group killed"""
+    next_check = 0.0
+    while True:
+        done_pid, status = os.waitpid(pid, os.WNOHANG)
+        if done_pid:
+            return status, None
+        now = time.monotonic()
+        if now >= next_check:
+            next_check = now + 0.25
+            reason = watchdog.check()
+            if reason:
+                _abort(pid)
+                deadline = time.monotonic() + KILL_GRACE
+                reaped = False
+                while not reaped and time.monotonic() < deadline:
+                    reaped = bool(os.waitpid(pid, os.WNOHANG)[0])
+                    time.sleep(0.01)
+                # 场景启动的 latex 等子进程也在同一进程组里
+                _kill_group(pid)
+                if not reaped:
+                    os.waitpid(pid, 0)
+                return None, reason
+        time.sleep(0.01)
+
+
+def _render_forked(
+    code_file: Path,
+    scene_name: str,
+    cwd: Path,
+    quality: str,
+    frame_rate: Optional[int],
+    timeout: Optional[float],
+    stall_timeout: Optional[float],
+) -> RenderResult:
+    start = time.time()
+    with tempfile.TemporaryDirectory(prefix="render_") as tmp:
+        out_path = os.path.join(tmp, "stdout")
+        err_path = os.path.join(tmp, "stderr")
+        result_path = os.path.join(tmp, "result.json")
+
+        # Unflushed parent output would otherwise be written twice
+        sys.stdout.flush()
+        sys.stderr.flush()
+        pid = os.fork()
+        if pid == 0:
+            _render_in_child(code_file, scene_name, cwd, quality, frame_rate, out_path, err_path, result_path)
+
+        status, too_slow = _wait_child(pid, _Watchdog(timeout, stall_timeout, (err_path, out_path)))
+        stdout, stderr = _read_text(out_path), _read_text(err_path)
+        if too_slow:
+            return RenderResult(
+                returncode=-9,
+                stdout=stdout + stderr,
+                stderr=_too_slow_error(stderr, code_file, too_slow),
+                duration=time.time() - start,
+                too_slow=too_slow,
+            )
+
+        video_path = None
+        if os.path.exists(result_path):
+            with open(result_path, "r", encoding="utf-8") as f:
+                video_path = json.load(f).get("video_path")
+        return RenderResult(
+            returncode=os.waitstatus_to_exitcode(status),
+            stdout=stdout,
+            stderr=stderr,
+            video_path=video_path,
+            duration=time.time() - start,
+        )
+
+
+def _render_subprocess(
+    code_file: Path,
+    scene_name: str,
+    cwd: Path,
+    quality: str,
+    frame_rate: Optional[int],
+    timeout: Optional[float],
+    stall_timeout: Optional[float],
+) -> RenderResult:
+    start = time.time()
+    cmd = ["manim", f"-q{quality}", str(code_file), scene_name]
+    if frame_rate:
+        cmd[1:1] = ["--frame_rate", str(frame_rate)]
+    # faulthandler 让 manim 在 SIGABRT 时打印调用栈
+    env = dict(os.environ, PYTHONFAULTHANDLER="1")
+    with tempfile.TemporaryDirectory(prefix="render_") as tmp:
+        out_path = os.path.join(tmp, "stdout")
+        err_path = os.path.join(tmp, "stderr")
+        with open(out_path, "wb") as out, open(err_path, "wb") as err:
+            proc = subprocess.Popen(
+                cmd, stdout=out, stderr=err, stdin=subprocess.DEVNULL, cwd=cwd, env=env, start_new_session=os.name != "nt"
+            )
+            watchdog = _Watchdog(timeout, stall_timeout, (err_path, out_path))
+            too_slow = None
+            while proc.poll() is None:
+                too_slow = watchdog.check()
+                if too_slow:
+                    if os.name == "nt":
+                        proc.kill()
+                    else:
+                        _abort(proc.pid)
+                        try:
+                            proc.wait(KILL_GRACE)
+                        except subprocess.TimeoutExpired:
+                            pass
+                        _kill_group(proc.pid)
+                    proc.wait()
+                    break
+                time.sleep(0.25)
+        stdout, stderr = _read_text(out_path), _read_text(err_path)
+    if too_slow:
+        return RenderResult(
+            returncode=-9,
+            stdout=stdout + stderr,
+            stderr=_too_slow_error(stderr, code_file, too_slow),
+            duration=time.time() - start,
+            too_slow=too_slow,
+        )
+    return RenderResult(returncode=proc.returncode, stdout=stdout, stderr=stderr, duration=time.time() - start)
+
+
+def render_scene(
+    code_file,
+    scene_name: str,
+    cwd,
+    quality: str = "l",
+    timeout: Optional[float] = 300,
+    frame_rate: Optional[int] = None,
+    stall_timeout: Optional[float] = None,
+) -> RenderResult:
+    """Render `scene_name` from `code_file` with output under `<cwd>/media`, like `manim -q<quality>` run in cwd.
+
+    `frame_rate` overrides the quality preset's fps (the output directory becomes e.g. 480p5).
+
+    In a process where manim is importable the scene is rendered in a child forked from this
+    (preloaded) process, so only the frames are paid for; the child isolates crashes, global
+    manim state and leaked memory. Elsewhere (Windows, no manim, threaded parent) it falls back
+    to the manim CLI.
+
+    A watchdog follows Manim's progress bar and stops the render once it exceeds `timeout`,
+    prints nothing for `stall_timeout` seconds, or the running animation cannot finish in
+    time. The result then has returncode -9, `too_slow` set, and a RenderTooSlowError
+    traceback in stderr pointing at the scene line that was executing.
+    """
+    cwd = Path(cwd).resolve()
+    code_file = Path(code_file)
+    if not code_file.is_absolute():
+        code_file = cwd / code_file
+    if quality not in QUALITY_FLAGS:
+        raise ValueError(f"未知的渲染质量: {quality}")
+
+    if _can_fork() and preload_manim():
+        return _render_forked(code_file, scene_name, cwd, quality, frame_rate, timeout, stall_timeout)
+    return _render_subprocess(code_file, scene_name, cwd, quality, frame_rate, timeout, stall_timeout)
+
+
+# ---------------------------------------------------------------------------
+# Dry run: execute construct() without producing frames or files
+# ---------------------------------------------------------------------------
+def _skip_frames(scene) -> None:
+    """Make the Cairo renderer treat every play()/wait() as skipped: animations still begin,
+    interpolate to their end and finish (so their errors surface), but no frame is drawn"""
+    renderer = scene.renderer
+    renderer.skip_animations = True
+    # play() restores skip_animations from _original_skipping_status and then re-evaluates it
+    renderer._original_skipping_status = True
+    renderer.update_skipping_status = lambda: None
+
+
+def _execute_dry_run(code: str, scene_name: str, cwd: Path, code_file: Path) -> None:
+    """Run `scene_name` from in-memory `code` as if it were `code_file`; raises what the scene raises"""
+    os.chdir(cwd)
+    sys.path.insert(0, str(cwd))
+    from manim import tempconfig
+
+    # 源码不落盘，登记到 linecache 让 traceback 仍能显示出错的代码行
+    linecache.cache[str(code_file)] = (len(code), None, code.splitlines(True), str(code_file))
+    with tempconfig({"dry_run": True, "disable_caching": True, "media_dir": str(cwd / "media"), "input_file": str(code_file)}):
+        module = types.ModuleType(code_file.stem)
+        module.__file__ = str(code_file)
+        sys.modules[code_file.stem] = module
+        exec(compile(code, str(code_file), "exec"), module.__dict__)
+        scene = getattr(module, scene_name)()
+        _skip_frames(scene)
+        scene.render()
+
+
+def _dry_run_in_child(code: str, scene_name: str, cwd: Path, code_file: Path, err_path):
+    """Runs in the forked child and never returns"""
+    exit_code = 1
+    try:
+        os.setpgid(0, 0)
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        err_fd = os.open(err_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        os.dup2(devnull, 1)
+        os.dup2(err_fd, 2)
+        faulthandler.enable(all_threads=False)
+        _execute_dry_run(code, scene_name, cwd, code_file)
+        exit_code = 0
+    except SystemExit as e:
+        exit_code = e.code if isinstance(e.code, int) else 1
+    except BaseException:
+        _print_scene_traceback(code_file)
+    finally:
+        try:
+            sys.stderr.flush()
+        finally:
+            os._exit(exit_code)
+
+
+def _dry_run_forked(code: str, scene_name: str, cwd: Path, code_file: Path, timeout: Optional[float]) -> RenderResult:
+    start = time.time()
+    with tempfile.TemporaryDirectory(prefix="dry_run_") as tmp:
+        err_path = os.path.join(tmp, "stderr")
+        sys.stdout.flush()
+        sys.stderr.flush()
+        pid = os.fork()
+        if pid == 0:
+            _dry_run_in_child(code, scene_name, cwd, code_file, err_path)
+        status, too_slow = _wait_child(pid, _Watchdog(timeout))
+        stderr = _read_text(err_path)
+    if too_slow:
+        too_slow = f"dry run exceeded {timeout:.0f}s; construct() or an updater never finishes"
+        return RenderResult(
+            returncode=-9, stderr=_too_slow_error(stderr, code_file, too_slow, code), duration=time.time() - start, too_slow=too_slow
+        )
+    return RenderResult(returncode=os.waitstatus_to_exitcode(status), stderr=stderr, duration=time.time() - start)
+
+
+_DRY_RUN_SCRIPT = """
+import sys
+from pathlib import Path
+sys.path.insert(0, sys.argv[1])
+from render_pool import _execute_dry_run, _print_scene_traceback
+code_file = Path(sys.argv[4])
+try:
+    _execute_dry_run(sys.stdin.read(), sys.argv[2], Path(sys.argv[3]), code_file)
+except BaseException:
+    _print_scene_traceback(code_file)
+    sys.exit(1)
+"""
+
+
+def _dry_run_subprocess(code: str, scene_name: str, cwd: Path, code_file: Path, timeout: Optional[float]) -> RenderResult:
+    """Same dry run in a fresh interpreter (pays the manim import), code passed on stdin"""
+    start = time.time()
+    cmd = [sys.executable, "-c", _DRY_RUN_SCRIPT, str(Path(__file__).parent), scene_name, str(cwd), str(code_file)]
+    try:
+        result = subprocess.run(cmd, input=code, capture_output=True, text=True, cwd=cwd, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        too_slow = f"dry run exceeded {timeout:.0f}s; construct() or an updater never finishes"
+        return RenderResult(returncode=-9, stderr=f"RenderTooSlowError: {too_slow}", duration=time.time() - start, too_slow=too_slow)
+    return RenderResult(returncode=result.returncode, stdout=result.stdout, stderr=result.stderr, duration=time.time() - start)
+
+
+def _serve_dry_runs(requests, responses) -> None:
+    """Dry-run helper process: imports manim once, then forks a child per request"""
+    ready = preload_manim()
+    while True:
+        try:
+            code, scene_name, cwd, code_file, timeout = requests.recv()
+        except (EOFError, OSError):
+            return
+        if ready and _can_fork():
+            result = _dry_run_forked(code, scene_name, Path(cwd), Path(code_file), timeout)
+        else:
+            result = _dry_run_subprocess(code, scene_name, Path(cwd), Path(code_file), timeout)
+        responses.send(result)
+
+
+_DRY_RUN_SERVER_SCRIPT = """
+import sys
+sys.path.insert(0, sys.argv[1])
+from multiprocessing.connection import Connection
+from render_pool import _serve_dry_runs
+_serve_dry_runs(Connection(int(sys.argv[2]), writable=False), Connection(int(sys.argv[3]), readable=False))
+"""
+
+
+class _DryRunServer:
+    """Long-lived helper for processes that cannot fork themselves (threads running); requests are serialized.
+
+    Started as a plain interpreter talking over two pipes, so the caller's __main__ is not re-imported.
+    """
+
+    STARTUP_GRACE = 60  # 首个请求要等待 helper 导入 manim
+
+    def __init__(self):
+        request_r, request_w = os.pipe()
+        response_r, response_w = os.pipe()
+        self.process = subprocess.Popen(
+            [sys.executable, "-c", _DRY_RUN_SERVER_SCRIPT, str(Path(__file__).parent), str(request_r), str(response_w)],
+            pass_fds=(request_r, response_w),
+            stdin=subprocess.DEVNULL,
+        )
+        os.close(request_r)
+        os.close(response_w)
+        self.requests = multiprocessing.connection.Connection(request_w, readable=False)
+        self.responses = multiprocessing.connection.Connection(response_r, writable=False)
+        self.lock = threading.Lock()
+
+    def is_alive(self) -> bool:
+        return self.process.poll() is None
+
+    def run(self, code: str, scene_name: str, cwd: Path, code_file: Path, timeout: Optional[float]) -> Optional[RenderResult]:
+        """None when the helper died or hung; the caller reports a failure and the next call starts a new one"""
+        with self.lock:
+            try:
+                self.requests.send((code, scene_name, str(cwd), str(code_file), timeout))
+                if self.responses.poll((timeout or 300) + self.STARTUP_GRACE):
+                    return self.responses.recv()
+            except (EOFError, OSError):
+                pass
+            self.process.kill()
+            return None
+
+    def close(self) -> None:
+        """Close the request pipe (the helper exits on EOF), then make sure the process is gone"""
+        for conn in (self.requests, self.responses):
+            try:
+                conn.close()
+            except OSError:
+                pass
+        try:
+            self.process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+
+
+MAX_DRY_RUN_SERVERS = 4  # 进程内同时进行的试运行（即 helper 进程）上限；渲染工作进程内为 1
+_DRY_RUN_SERVERS = []
+_DRY_RUN_SERVERS_LOCK = threading.Lock()
+_DRY_RUN_SLOTS = threading.BoundedSemaphore(MAX_DRY_RUN_SERVERS)
+
+
+def limit_dry_runs(limit: int) -> None:
+    """Allow at most `limit` concurrent helper dry runs in this process; call before any dry run starts"""
+    global _DRY_RUN_SLOTS
+    _DRY_RUN_SLOTS = threading.BoundedSemaphore(max(1, limit))
+
+
+def _dry_run_server() -> _DryRunServer:
+    """An idle helper, or a new one; the caller holds a dry-run slot, so there are never more helpers than slots"""
+    with _DRY_RUN_SERVERS_LOCK:
+        _DRY_RUN_SERVERS[:] = [s for s in _DRY_RUN_SERVERS if s.is_alive()]
+        for server in _DRY_RUN_SERVERS:
+            if not server.lock.locked():
+                return server
+        _DRY_RUN_SERVERS.append(_DryRunServer())
+        return _DRY_RUN_SERVERS[-1]
+
+
+def shutdown_dry_run_servers() -> None:
+    """Stop this process's dry-run helpers (atexit, render worker exit, scheduler shutdown)"""
+    with _DRY_RUN_SERVERS_LOCK:
+        servers = list(_DRY_RUN_SERVERS)
+        _DRY_RUN_SERVERS.clear()
+    for server in servers:
+        server.close()
+
+
+def _forget_dry_run_servers():
+    """A forked child does not own its parent's helpers and starts with its own slots"""
+    global _DRY_RUN_SERVERS_LOCK
+    _DRY_RUN_SERVERS.clear()
+    _DRY_RUN_SERVERS_LOCK = threading.Lock()
+    limit_dry_runs(MAX_DRY_RUN_SERVERS)
+
+
+atexit.register(shutdown_dry_run_servers)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_forget_dry_run_servers)
+
+
+def dry_run_scene(code: str, scene_name: str, cwd, section_id: str = "dry_run", timeout: Optional[float] = DRY_RUN_TIMEOUT) -> RenderResult:
+    """Execute `scene_name` from `code` end to end without drawing frames or writing media.
+
+    The code is never written to disk, so parallel workers sharing `cwd` cannot race on a test
+    file. In a single-threaded process with manim preloaded (render workers) a child is forked
+    per call; in a threaded parent one of a few helper processes keeps manim imported and forks
+    for it, so candidate fixes validated from several threads run side by side, up to this
+    process's dry-run limit (one in a render worker, see limit_dry_runs).
+    Tracebacks are reported against `<cwd>/<section_id>.py`. Timeouts come back as a failed result carrying a RenderTooSlowError.
+    """
+    cwd = Path(cwd).resolve()
+    code_file = cwd / f"{section_id}.py"
+    if not hasattr(os, "fork"):
+        return _dry_run_subprocess(code, scene_name, cwd, code_file, timeout)
+    if _can_fork() and preload_manim():
+        return _dry_run_forked(code, scene_name, cwd, code_file, timeout)
+
+    with _DRY_RUN_SLOTS:
+        result = _dry_run_server().run(code, scene_name, cwd, code_file, timeout)
+    if result is None:
+        return RenderResult(returncode=-9, stderr="TimeoutError: dry run helper did not answer")
+    return result
@@ -0,0 +1,143 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional
+
+from rate_limiter import interprocess_lock
+
+
+def content_hash(*parts: Any) -> str:
+    """Stable sha256 over JSON-serializable stage inputs"""
+    raw = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _file_sha256(path: Path) -> Optional[str]:
+    try:
+        with open(path, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except OSError:
+        return None
+
+
+def atomic_write_text(path, text: str) -> None:
+    """Write via temp file + os.replace so readers never see a half-written file"""
+    path = Path(path)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def atomic_write_json(path, data) -> None:
+    atomic_write_text(path, json.dumps(data, ensure_ascii=False, indent=2))
+
+
+class RunManifest:
+    """Per-topic ``manifest.json`` recording, for every stage, its inputs hash, outputs and timing.
+
+    A stage is reusable only if it finished (status "done") with the same inputs hash and every
+    recorded output still has the recorded sha256, so an edited, truncated or deleted output, or
+    a changed upstream input, re-runs that stage and — because downstream inputs hash upstream
+    outputs — everything after it. The manifest is rewritten atomically under a file lock, since
+    code stages are updated from threads and render worker processes at the same time.
+    """
+
+    FILENAME = "manifest.json"
+
+    def __init__(self, output_dir):
+        self.output_dir = Path(output_dir)
+        self.path = self.output_dir / self.FILENAME
+        self.lock_path = self.output_dir / f".{self.FILENAME}.lock"
+        # Output directories from before the manifest existed: trust their files once
+        self.legacy = not self.path.exists() and any(self.output_dir.glob("*.json"))
+
+    def _read(self) -> Dict[str, Any]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {"stages": {}}
+
+    def _update(self, stage: str, fn) -> Dict[str, Any]:
+        with interprocess_lock(self.lock_path):
+            data = self._read()
+            entry = data["stages"].setdefault(stage, {})
+            fn(entry)
+            atomic_write_json(self.path, data)
+            return entry
+
+    def _relative(self, path) -> str:
+        path = Path(path)
+        try:
+            return str(path.resolve().relative_to(self.output_dir.resolve()))
+        except ValueError:
+            return str(path)
+
+    def _digests(self, outputs: Iterable) -> Dict[str, Optional[str]]:
+        return {self._relative(p): _file_sha256(self.output_dir / self._relative(p)) for p in outputs}
+
+    def entry(self, stage: str) -> Optional[Dict[str, Any]]:
+        return self._read()["stages"].get(stage)
+
+    def is_fresh(self, stage: str, inputs_hash: str, outputs: Iterable = ()) -> bool:
+        """True if `stage` finished with these inputs and its outputs are intact.
+
+        In a legacy directory a stage with no record is adopted when its `outputs` all exist.
+        """
+        entry = self.entry(stage)
+        if entry is None:
+            if self.legacy and outputs and all((self.output_dir / self._relative(p)).exists() for p in outputs):
+                self.complete(stage, inputs_hash, outputs)
+                return True
+            return False
+        if entry.get("status") != "done" or entry.get("inputs_hash") != inputs_hash:
+            return False
+        for rel_path, digest in entry.get("outputs", {}).items():
+            if digest is None or _file_sha256(self.output_dir / rel_path) != digest:
+                return False
+        return True
+
+    def begin(self, stage: str, inputs_hash: str) -> None:
+        def fn(entry):
+            entry.update({"status": "running", "inputs_hash": inputs_hash, "started": time.time()})
+
+        self._update(stage, fn)
+
+    def complete(self, stage: str, inputs_hash: str, outputs: Iterable) -> None:
+        digests = self._digests(outputs)
+
+        def fn(entry):
+            now = time.time()
+            started = entry.get("started") if entry.get("inputs_hash") == inputs_hash else None
+            entry.update(
+                {
+                    "status": "done",
+                    "inputs_hash": inputs_hash,
+                    "outputs": digests,
+                    "finished": now,
+                    "duration": round(now - started, 3) if started else entry.get("duration"),
+                }
+            )
+            entry.pop("error", None)
+
+        self._update(stage, fn)
+
+    def update_outputs(self, stage: str, outputs: Iterable) -> None:
+        """Re-record outputs that were legitimately rewritten (e.g. fixed code), keeping the inputs hash"""
+        digests = self._digests(outputs)
+
+        def fn(entry):
+            if entry.get("status") == "done":
+                entry.setdefault("outputs", {}).update(digests)
+
+        self._update(stage, fn)
+
+    def fail(self, stage: str, inputs_hash: str, error) -> None:
+        def fn(entry):
+            entry.update({"status": "failed", "inputs_hash": inputs_hash, "error": str(error), "finished": time.time()})
+
+        self._update(stage, fn)
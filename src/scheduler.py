@@ -0,0 +1,137 @@
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Optional
+
+from admission import AdmissionController, create_admission_controller
+from render_pool import init_render_worker, shutdown_dry_run_servers
+
+
+class _BoundedExecutor:
+    """Executor wrapper whose submit() blocks once `workers + queue_size` tasks are in flight.
+
+    The standard executors queue without limit, so a burst of topics would park hundreds of
+    tasks in memory; blocking the submitting topic thread instead gives natural backpressure.
+    With an AdmissionController, submit() also waits until the controller admits a `kind` task.
+    """
+
+    def __init__(
+        self, executor, workers: int, queue_size: int, admission: Optional[AdmissionController] = None, kind: str = ""
+    ):
+        self.executor = executor
+        self.workers = workers
+        self.admission = admission
+        self.kind = kind
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.completed = 0
+
+    def _release(self, _future):
+        with self._lock:
+            self.in_flight -= 1
+            self.completed += 1
+        if self.admission is not None:
+            self.admission.release(self.kind)
+        self._slots.release()
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        self._slots.acquire()
+        try:
+            if self.admission is not None:
+                self.admission.acquire(self.kind)
+            try:
+                future = self.executor.submit(fn, *args, **kwargs)
+            except BaseException:
+                if self.admission is not None:
+                    self.admission.release(self.kind)
+                raise
+        except BaseException:
+            self._slots.release()
+            raise
+        with self._lock:
+            self.in_flight += 1
+        future.add_done_callback(self._release)
+        return future
+
+    def shutdown(self, wait: bool = True):
+        self.executor.shutdown(wait=wait)
+
+
+class WorkScheduler:
+    """One LLM thread pool and one Manim render process pool shared by every topic of a run.
+
+    LLM calls are I/O bound and get many threads; rendering is CPU bound and gets at most one
+    process per usable core, no matter how many topics are in flight. Topics are driven by
+    plain threads that only submit work here, so nothing nests pools inside pools.
+
+    `render_workers` is the ceiling; an AdmissionController (the "admission" section of
+    api_config.json) decides how many of those processes actually render at a time, from
+    the machine's free memory and CPU load.
+    """
+
+    def __init__(
+        self,
+        llm_workers: int = 16,
+        render_workers: Optional[int] = None,
+        queue_size: Optional[int] = None,
+        render_initializer: Callable = init_render_worker,
+        render_initargs: tuple = (),
+    ):
+        render_workers = render_workers or max(1, (os.cpu_count() or 2) - 1)
+        # Fork the render workers right away, while this process is still single-threaded;
+        # each one imports manim once (plus whatever read-only state render_initargs carry)
+        # and then forks a child per render job
+        render_pool = ProcessPoolExecutor(
+            max_workers=render_workers, initializer=render_initializer, initargs=render_initargs
+        )
+        self.render_initargs = render_initargs
+        render_pool.submit(int).result()
+        # 采样线程要在渲染进程 fork 之后再启动
+        self.admission = create_admission_controller(render_workers)
+        self.llm = _BoundedExecutor(
+            ThreadPoolExecutor(max_workers=llm_workers, thread_name_prefix="llm"),
+            llm_workers,
+            queue_size if queue_size is not None else llm_workers * 4,
+            self.admission,
+            "llm",
+        )
+        self.render = _BoundedExecutor(
+            render_pool,
+            render_workers,
+            queue_size if queue_size is not None else render_workers * 2,
+            self.admission,
+            "render",
+        )
+
+    def submit_llm(self, fn: Callable, *args, **kwargs) -> Future:
+        return self.llm.submit(fn, *args, **kwargs)
+
+    def submit_render(self, fn: Callable, *args, **kwargs) -> Future:
+        return self.render.submit(fn, *args, **kwargs)
+
+    def stats(self):
+        stats = {
+            "llm_in_flight": self.llm.in_flight,
+            "llm_completed": self.llm.completed,
+            "render_in_flight": self.render.in_flight,
+            "render_completed": self.render.completed,
+        }
+        if self.admission is not None:
+            stats.update(self.admission.stats())
+        return stats
+
+    def shutdown(self, wait: bool = True):
+        self.llm.shutdown(wait=wait)
+        self.render.shutdown(wait=wait)
+        # 渲染进程退出时各自停掉 helper；本进程（如候选代码生成）的 helper 在这里停
+        shutdown_dry_run_servers()
+        if self.admission is not None:
+            self.admission.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown(wait=True)
+
@@ -2,12 +2,22 @@ import re
 from pathlib import Path
 import json
 from dataclasses import dataclass
-import subprocess
 from typing import Dict, List, Tuple, Optional, Any
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from local_fixer import get_local_fixer
+from fix_memo import get_fix_memo
+from manim_index import get_manim_index
+from render_pool import DRY_RUN_TIMEOUT, dry_run_scene
 
 logger = logging.getLogger(__name__)
 
+# Temperature of the 1st, 2nd, ... speculative candidate (the last one repeats); None keeps the
+# model default and the response cache
+SPECULATIVE_TEMPERATURES = [None, 0.4, 0.8, 1.0]
+
 
 def get_completion_only(result):
     if isinstance(result, tuple) and len(result) >= 1:
@@ -26,6 +36,7 @@ class ManimCodeErrorAnalyzer:
             "ImportError": self._analyze_import_error,
             "SyntaxError": self._analyze_syntax_error,
             "IndentationError": self._analyze_indentation_error,
+            "RenderTooSlowError": self._analyze_too_slow_error,
         }
 
     def analyze_error(self, code: str, error_msg: str) -> Dict:
@@ -91,7 +102,7 @@ class ManimCodeErrorAnalyzer:
             if manim_suggestions:
                 return {
                     "fix_scope": "single_line",
-                    "suggested_fix": f"可能需要导入或创建变量: {', '.join(manim_suggestions)}",
+                    "suggested_fix": f"可能应改为: {'; '.join(manim_suggestions)}",
                     "undefined_variable": undefined_name,
                 }
 
@@ -144,6 +155,14 @@ class ManimCodeErrorAnalyzer:
         """Analyze IndentationError"""
         return {"fix_scope": "single_line", "suggested_fix": "检查缩进是否正确"}
 
+    def _analyze_too_slow_error(self, code: str, error_msg: str, error_info: Dict) -> Dict:
+        """Analyze renders stopped by the render watchdog"""
+        if "frames" in error_msg:
+            fix = "该动画帧数过多：缩短 self.wait() 时长或 run_time"
+        else:
+            fix = "渲染卡住：去掉死循环、永不结束的 updater 或 wait_until"
+        return {"fix_scope": "section" if error_info["line_number"] else "full", "suggested_fix": fix}
+
     def _extract_relevant_code_block(self, code: str, error_info: Dict) -> str:
         """Extract the relevant code block based on the error information"""
         lines = code.split("\n")
@@ -213,52 +232,47 @@ class ManimCodeErrorAnalyzer:
         return self._extract_function_containing_line(code, line_number)
 
     def _get_manim_suggestions(self, undefined_name: str) -> List[str]:
-        """Get suggestions for Manim-related undefined names"""
-        manim_objects = {
-            "Text": "from manim import Text",
-            "Circle": "from manim import Circle",
-            "Square": "from manim import Square",
-            "VGroup": "from manim import VGroup",
-            "Create": "from manim import Create",
-            "Write": "from manim import Write",
-            "FadeIn": "from manim import FadeIn",
-            "FadeOut": "from manim import FadeOut",
-            "Transform": "from manim import Transform",
-        }
-
-        suggestions = []
-        for obj_name, import_stmt in manim_objects.items():
-            if undefined_name.lower() in obj_name.lower() or obj_name.lower() in undefined_name.lower():
-                suggestions.append(import_stmt)
-
-        return suggestions
+        """Closest Manim names, with their signatures, for an undefined name"""
+        index = get_manim_index()
+        return [index.describe(name) for name in index.suggest_names(undefined_name)]
 
     def _get_attribute_suggestion(self, obj_type: str, attr_name: str) -> str:
         """Get suggestions for attributes of a Manim object"""
-        common_fixes = {
-            "Text": {"color": "set_color()", "font": "构造函数中的 font_size 参数"},
-            "Mobject": {"move_to": "move_to() 方法存在", "shift": "shift() 方法存在"},
-        }
-
-        if obj_type in common_fixes and attr_name in common_fixes[obj_type]:
-            return f"尝试使用 {common_fixes[obj_type][attr_name]}"
-
+        index = get_manim_index()
+        close = index.suggest_attributes(obj_type, attr_name)
+        if close:
+            return f"{obj_type} 没有 {attr_name}，请改用: {', '.join(close)}"
+        owners = index.owners(attr_name)
+        if owners:
+            return f"{attr_name} 只存在于 {', '.join(owners)}，检查 {obj_type} 对象的类型"
         return f"检查 {obj_type} 对象是否具有 {attr_name} 属性"
 
 
 class ScopeRefineFixer:
 
-    def __init__(self, gpt_request_func, MAX_CODE_TOKEN_LENGTH):
+    def __init__(self, gpt_request_func, MAX_CODE_TOKEN_LENGTH, speculative_fixes: int = 1):
         self.analyzer = ManimCodeErrorAnalyzer()
         self.request_gpt = gpt_request_func
         self.MAX_CODE_TOKEN_LENGTH = MAX_CODE_TOKEN_LENGTH
+        # > 1: fix_code_with_multi_stage_validation races this many candidate fixes
+        self.speculative_fixes = speculative_fixes
 
         self.common_fixes = self._load_common_fixes()
         self.error_patterns = self._load_error_patterns()
+        self._sent_prompts = set()
+
+    def _request(self, prompt: str, temperature: Optional[float] = None):
+        """Send a fix prompt; a prompt repeated within this run, or sampled at a custom temperature, bypasses the response cache"""
+        use_cache = prompt not in self._sent_prompts and temperature is None
+        self._sent_prompts.add(prompt)
+        if temperature is None:
+            return self.request_gpt(prompt, max_tokens=self.MAX_CODE_TOKEN_LENGTH, use_cache=use_cache)
+        return self.request_gpt(prompt, max_tokens=self.MAX_CODE_TOKEN_LENGTH, use_cache=use_cache, temperature=temperature)
 
     def _load_common_fixes(self) -> Dict[str, str]:
         """Load common error fix patterns"""
         return {
+            "RenderTooSlowError": "渲染超出时间预算。缩短 wait()/run_time，去掉死循环和永不结束的 updater，减少每帧重算的对象。",
             "AttributeError": "对象属性错误。检查方法名和属性名拼写。",
             "NameError": "变量未定义。检查变量声明、拼写和作用域。",
             "TypeError": "类型错误。检查参数类型和数量。",
@@ -271,6 +285,10 @@ class ScopeRefineFixer:
     def _load_error_patterns(self) -> Dict[str, Dict]:
         """Load error patterns and corresponding fix strategies"""
         return {
+            "render_too_slow": {
+                "pattern": r"RenderTooSlowError",
+                "fix": "保持讲解内容不变，只把过长的动画/等待缩短到几秒内",
+            },
             "manim_import_error": {
                 "pattern": r"No module named.*manim",
                 "fix": "确保正确导入: from manim import *",
@@ -337,45 +355,27 @@ class ScopeRefineFixer:
         except Exception as e:
             return False, f"Compilation Error: {e}"
 
-    def dry_run_test(self, code: str, section_id: str, output_dir: Path) -> Tuple[bool, Optional[str]]:
-        """Execute dry run test (do not render video)"""
-        test_file = output_dir / f"test_{section_id}.py"
+    def dry_run_test(self, code: str, section_id: str, output_dir: Path, runner=None) -> Tuple[bool, Optional[str]]:
+        """Execute construct() without drawing frames or writing files (see render_pool.dry_run_scene).
 
-        # Create test version of code (add quick exit)
-        # 1. 动态获取类名：不要假设类名是 SectionXScene，而是从代码中正则提取
-        class_match = re.search(r"class\s+(\w+)\s*\(", code)
-        if class_match:
-            scene_name = class_match.group(1)
-        else:
-            # Fallback (保底策略)
-            scene_name = f"{section_id.title().replace('_', '')}Scene"
-
-        test_code = code.replace(
-            "def construct(self):",
-            "def construct(self):\n        # Dry run test - quick exit\n        self.wait(0.1)\n        return\n        # Original code below:",
-        )
+        `runner` replaces dry_run_scene with a callable of the same signature, e.g. one that
+        sends the dry run to a shared render pool.
+        """
+        # 跳过注入的 TeachingScene 基类，取最后一个带 construct 的场景类
+        scene_names = [
+            name
+            for name in re.findall(r"class\s+(\w+)\s*\(", code)
+            if name != "TeachingScene" and re.search(rf"class\s+{name}\s*\([^)]*\):[\s\S]*?def\s+construct\s*\(", code)
+        ]
+        scene_name = scene_names[-1] if scene_names else f"{section_id.title().replace('_', '')}Scene"
 
         try:
-            with open(test_file, "w", encoding="utf-8") as f:
-                f.write(test_code)
-
-            # 2. 使用提取出的正确类名进行测试
-            cmd = ["python", "-c", f"from test_{section_id} import {scene_name}; scene = {scene_name}(); print('Syntax OK')"]
-
-            result = subprocess.run(cmd, capture_output=True, text=True, cwd=output_dir, timeout=20) # 稍微增加一点超时时间到 20s
-
-            test_file.unlink()  # Clean up test file
-
-            if result.returncode == 0:
-                return True, None
-            else:
-                # 返回具体的错误信息
-                return False, f"Dry Run Error for class '{scene_name}': {result.stderr}"
-
+            result = (runner or dry_run_scene)(code, scene_name, output_dir, section_id=section_id, timeout=DRY_RUN_TIMEOUT)
         except Exception as e:
-            if test_file.exists():
-                test_file.unlink()
             return False, str(e)
+        if result.returncode == 0:
+            return True, None
+        return False, f"Dry Run Error for class '{scene_name}': {result.stderr}"
 
     def _clean_code_format(self, code: str) -> Optional[str]:
         """Clean and format code"""
@@ -406,6 +406,7 @@ class ScopeRefineFixer:
     def generate_fix_prompt(self, section_id: str, current_code: str, error_msg: str, attempt: int) -> str:
         """Generate high-quality fix prompt"""
         error_type, error_category, suggestions = self.classify_error(error_msg)
+        suggestions += get_manim_index().hints_for_error(error_msg)
         error_context = self.extract_error_context(error_msg)
 
         # Adjust fix strategy based on attempt number
@@ -478,6 +479,28 @@ class ScopeRefineFixer:
     def fix_code_smart(self, section_id: str, code: str, error_msg: str, output_dir: Path) -> Optional[str]:
         """Smart fix code, prioritize local fix, fallback to complete rewrite if failed"""
 
+        # Deterministic rules first: renamed APIs, typos, missing imports, bad kwargs cost no tokens
+        local_fixer = get_local_fixer()
+        local_fix = local_fixer.fix(code, error_msg)
+        if local_fix:
+            fixed_code, rule = local_fix
+            print(f"🩹 Local rule '{rule}' fixed {section_id} (hit rate {local_fixer.stats()['hit_rate']*100:.0f}%)")
+            return fixed_code
+
+        # Then patches that already fixed this error signature in another section or topic
+        fix_memo = get_fix_memo()
+        memo_fix = fix_memo.lookup(code, error_msg)
+        if memo_fix:
+            print(f"📒 Fix memo patched {section_id} (hit rate {fix_memo.stats()['hit_rate']*100:.0f}%)")
+            return memo_fix
+
+        fixed_code = self._fix_code_with_llm(section_id, code, error_msg, output_dir)
+        if fixed_code:
+            fix_memo.propose(code, error_msg, fixed_code)
+        return fixed_code
+
+    def _fix_code_with_llm(self, section_id: str, code: str, error_msg: str, output_dir: Path) -> Optional[str]:
+        """Scoped LLM repair of the failing block, falling back to a complete rewrite"""
         # Analyze error
         error_info = self.analyzer.analyze_error(code, error_msg)
         # Decide on fix scope based on error analysis
@@ -510,57 +533,83 @@ class ScopeRefineFixer:
         print("⚠️ The smart repair failed, fallback to complete repair")
         return self.fix_code_with_multi_stage_validation(section_id, code, error_msg, output_dir)
 
+    def _attempt_fix(
+        self,
+        section_id: str,
+        current_code: str,
+        error_msg: str,
+        output_dir: Path,
+        attempt: int,
+        temperature: Optional[float] = None,
+        cancelled: Optional[threading.Event] = None,
+    ) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+        """One LLM fix plus syntax and dry-run validation.
+
+        Returns (passing_code, candidate_code, error): passing_code is set when the candidate
+        validated; otherwise candidate_code/error (either may be None) seed the next attempt.
+        """
+        fix_prompt = self.generate_fix_prompt(section_id, current_code, error_msg, attempt)
+        response = self._request(fix_prompt, temperature=temperature)
+        response = get_completion_only(response)
+
+        if hasattr(response, "choices") and response.choices and len(response.choices) > 0:
+            fixed_code = response.choices[0].message.content
+        elif hasattr(response, "candidates") and response.candidates: # 兼容 Gemini
+            fixed_code = response.candidates[0].content.parts[0].text
+        elif isinstance(response, str):
+            fixed_code = response
+        else:
+            logger.warning(f"Attempt {attempt}: API response format unexpected: {response}")
+            return None, None, None
+
+        fixed_code = self._clean_code_format(fixed_code)
+
+        if not fixed_code:
+            logger.warning(f"Attempt {attempt}: Failed to extract valid code")
+            return None, None, None
+
+        # Stage 1: Syntax validation
+        is_valid_syntax, syntax_error = self.validate_code_syntax(fixed_code)
+        if not is_valid_syntax:
+            logger.warning(f"Attempt {attempt}: Syntax error - {syntax_error}")
+            return None, fixed_code, syntax_error
+
+        logger.info(f"Attempt {attempt}: Syntax validation passed")
+
+        # Another candidate already won; skip the dry run
+        if cancelled is not None and cancelled.is_set():
+            return None, None, None
+
+        # Stage 2: Dry run test
+        is_dry_run_ok, dry_run_error = self.dry_run_test(fixed_code, section_id, output_dir)
+        if not is_dry_run_ok:
+            logger.warning(f"Attempt {attempt}: Dry run failed - {dry_run_error}")
+            return None, fixed_code, dry_run_error
+
+        logger.info(f"Attempt {attempt}: Dry run test passed")
+        return fixed_code, fixed_code, None
+
     def fix_code_with_multi_stage_validation(
         self, section_id: str, current_code: str, error_msg: str, output_dir: Path, max_attempts: int = 3
     ) -> Optional[str]:
         """Multi-stage validation code repair"""
+        if self.speculative_fixes > 1:
+            return self.fix_code_speculatively(section_id, current_code, error_msg, output_dir)
+
         logger.info(f"Start fixing the code errors for {section_id}")
 
         for attempt in range(1, max_attempts + 1):
             logger.info(f"Start fixing the code errors for {section_id} attempt {attempt}/{max_attempts}")
 
             try:
-                fix_prompt = self.generate_fix_prompt(section_id, current_code, error_msg, attempt)
-                response = self.request_gpt(fix_prompt, max_tokens=self.MAX_CODE_TOKEN_LENGTH)
-                response = get_completion_only(response)
-
-                if hasattr(response, "choices") and response.choices and len(response.choices) > 0:
-                    fixed_code = response.choices[0].message.content
-                elif hasattr(response, "candidates") and response.candidates: # 兼容 Gemini
-                    fixed_code = response.candidates[0].content.parts[0].text
-                elif isinstance(response, str):
-                    fixed_code = response
-                else:
-                    logger.warning(f"Attempt {attempt}: API response format unexpected: {response}")
-                    continue # 跳过本次循环，而不是崩溃
-
-                fixed_code = self._clean_code_format(fixed_code)
-
-                if not fixed_code:
-                    logger.warning(f"Attempt {attempt}: Failed to extract valid code")
-                    continue
-
-                # Stage 1: Syntax validation
-                is_valid_syntax, syntax_error = self.validate_code_syntax(fixed_code)
-                if not is_valid_syntax:
-                    logger.warning(f"Attempt {attempt}: Syntax error - {syntax_error}")
-                    error_msg = syntax_error  # Update the error message for the next fix
-                    current_code = fixed_code  # Update the current code
-                    continue
-
-                logger.info(f"Attempt {attempt}: Syntax validation passed")
-
-                # Stage 2: Dry run test
-                is_dry_run_ok, dry_run_error = self.dry_run_test(fixed_code, section_id, output_dir)
-                if not is_dry_run_ok:
-                    logger.warning(f"Attempt {attempt}: Dry run failed - {dry_run_error}")
-                    error_msg = dry_run_error
-                    current_code = fixed_code
-                    continue
-
-                logger.info(f"Attempt {attempt}: Dry run test passed")
-
-                return fixed_code
+                passing_code, candidate_code, candidate_error = self._attempt_fix(
+                    section_id, current_code, error_msg, output_dir, attempt
+                )
+                if passing_code:
+                    return passing_code
+                if candidate_code and candidate_error:
+                    error_msg = candidate_error  # Update the error message for the next fix
+                    current_code = candidate_code  # Update the current code
 
             except Exception as e:
                 logger.error(f"Attempt {attempt} fix process encountered an exception: {e}")
@@ -569,6 +618,45 @@ class ScopeRefineFixer:
         logger.error(f"{section_id} fix failed - Reached maximum attempts")
         return None
 
+    def fix_code_speculatively(self, section_id: str, current_code: str, error_msg: str, output_dir: Path) -> Optional[str]:
+        """Request `speculative_fixes` candidates at once and return the first that passes validation.
+
+        Candidates cycle through the focused / comprehensive / rewrite strategies and each one after
+        the first gets a higher temperature and skips the response cache, so they differ. Candidates
+        still queued when one passes are cancelled, and running ones skip their dry run.
+        """
+        n = self.speculative_fixes
+        logger.info(f"Start {n} speculative fixes for {section_id}")
+        cancelled = threading.Event()
+        executor = ThreadPoolExecutor(max_workers=n, thread_name_prefix=f"fix_{section_id}")
+        futures = {}
+        for i in range(n):
+            attempt = i % 3 + 1
+            temperature = SPECULATIVE_TEMPERATURES[min(i, len(SPECULATIVE_TEMPERATURES) - 1)]
+            future = executor.submit(
+                self._attempt_fix, section_id, current_code, error_msg, output_dir, attempt, temperature, cancelled
+            )
+            futures[future] = (attempt, temperature)
+
+        try:
+            for future in as_completed(futures):
+                attempt, temperature = futures[future]
+                try:
+                    passing_code, _, candidate_error = future.result()
+                except Exception as e:
+                    logger.error(f"Speculative fix (strategy {attempt}, temperature {temperature}) raised: {e}")
+                    continue
+                if passing_code:
+                    logger.info(f"Speculative fix for {section_id} passed with strategy {attempt} (temperature {temperature})")
+                    return passing_code
+                logger.warning(f"Speculative fix (strategy {attempt}, temperature {temperature}) failed: {candidate_error}")
+        finally:
+            cancelled.set()
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        logger.error(f"{section_id} fix failed - no speculative candidate passed")
+        return None
+
     def _fix_code_block(self, section_id: str, code_block: str, error_msg: str, error_info: Dict) -> Optional[str]:
         """Fix the code block"""
         # Enhanced error analysis information
@@ -601,7 +689,7 @@ class ScopeRefineFixer:
         """
 
         try:
-            response = self.request_gpt(prompt, max_tokens=self.MAX_CODE_TOKEN_LENGTH)
+            response = self._request(prompt)
             response = get_completion_only(response)
             if hasattr(response, "choices") and response.choices:
                 fixed_code = response.choices[0].message.content
@@ -1,12 +1,13 @@
 import os
 import subprocess
 from typing import List
-from manim import *
 import multiprocessing
 import re
 import psutil
 from pathlib import Path
 
+from admission import MEMORY_RESERVE_FRACTION, RENDER_MEMORY_MB
+
 
 def extract_json_from_markdown(text):
     # 优先尝试匹配标准的 markdown 代码块 (```json ... ```)
@@ -80,10 +81,10 @@ def get_optimal_workers():
     # 预留 1 个核心给系统/其他进程
     optimal = max(1, cpu_count - 1)
 
-    # 如果是高性能多核机器 (>16 核)，
-    # 适当限制 worker 数量以避免内存溢出
-    if optimal > 16:
-        optimal = 16
+    # 上限由内存决定（按每个渲染约 RENDER_MEMORY_MB 估算），
+    # 运行中实际并发再由 AdmissionController 按实时内存和负载收放
+    memory_cap = int(psutil.virtual_memory().total * (1 - MEMORY_RESERVE_FRACTION) // (RENDER_MEMORY_MB * 2**20))
+    optimal = max(1, min(optimal, memory_cap))
 
     print(f"⚙️ 检测到 {cpu_count} 个核心，将使用 {optimal} 个并行进程")
     return optimal
@@ -0,0 +1,70 @@
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src"))
+sys.path.insert(0, str(ROOT))  # prompts 包在仓库根目录
+
+from code_validator import validate_section_code
+
+
+SCENE = """from manim import *
+
+class Demo(TeachingScene):
+    def construct(self):
+        self.setup_layout("Title", ["line"])
+{body}
+"""
+
+
+def _scene(*lines):
+    return SCENE.format(body="\n".join(" " * 8 + line for line in lines))
+
+
+def test_valid_scene_passes_untouched():
+    code = _scene("c = Circle()", "self.place_at_grid(c, 'B2', scale_factor=0.8)", "self.play(Create(c))")
+    result = validate_section_code(code)
+    assert result.ok and not result.repairs
+    assert result.code == code
+
+
+def test_out_of_range_cells_are_clamped_into_the_grid():
+    result = validate_section_code(_scene(
+        "c = Circle()",
+        "self.place_at_grid(c, 'G7')",
+        "self.place_in_area(c, top_left=\"b0\", bottom_right='Z9')",
+        "self.add(self.grid['H2'])",
+    ))
+    assert result.ok
+    assert "self.place_at_grid(c, 'F6')" in result.code
+    assert "self.place_in_area(c, top_left=\"B1\", bottom_right='F6')" in result.code
+    assert "self.grid['F2']" in result.code
+    assert len(result.repairs) == 1
+
+
+def test_misspelled_self_method_is_repaired():
+    result = validate_section_code(_scene("c = Circle()", "self.place_at_gird(c, 'B2')"))
+    assert result.ok
+    assert "self.place_at_grid(c, 'B2')" in result.code
+    assert result.repairs
+
+
+def test_renamed_manim_api_is_repaired():
+    result = validate_section_code(_scene("c = Circle()", "self.play(ShowCreation(c))"))
+    assert result.ok
+    assert "self.play(Create(c))" in result.code
+
+
+def test_wrong_arity_is_reported_not_repaired():
+    code = _scene("c = Circle()", "self.place_at_grid(c, 'B2', 0.5, 'extra')")
+    result = validate_section_code(code)
+    assert [i.kind for i in result.issues] == ["arity"]
+    assert result.issues[0].line_number == 7
+    assert 'File "scene.py", line 7' in result.error_message()
+    assert result.code == code
+
+
+def test_code_without_a_scene_is_rejected():
+    result = validate_section_code("from manim import *\n\ndef helper():\n    return 1\n")
+    assert result.rejected
+    assert validate_section_code("class Demo(Scene:\n").issues[0].kind == "syntax"
@@ -0,0 +1,88 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from fix_memo import EVICT_FAILURES, FixMemo, apply_patch, error_signature, make_patch
+
+
+BROKEN = """class Demo(Scene):
+    def construct(self):
+        c = Circle()
+        self.play(ShowCreation(c))
+"""
+FIXED = BROKEN.replace("ShowCreation", "Create")
+# 同样的错误出现在另一段代码里，缩进更深
+OTHER = """class Other(Scene):
+    def construct(self):
+        for i in range(3):
+            c = Circle()
+            self.play(ShowCreation(c))
+"""
+ERROR = """Traceback (most recent call last):
+  File "/tmp/run_1/section_1.py", line 4, in construct
+NameError: name 'ShowCreation' is not defined
+"""
+OTHER_ERROR = ERROR.replace("line 4", "line 5").replace("run_1/section_1", "run_2/section_3")
+
+
+def test_error_signature_ignores_paths_and_numbers():
+    assert error_signature(ERROR) == "NameError: name 'ShowCreation' is not defined"
+    assert error_signature("ValueError: bad shape at /a/b/c.py: 12 != 0x7f3a") == "ValueError: bad shape at <path>: N != 0x?"
+    assert error_signature("no exception here") is None
+
+
+def test_patch_round_trip_at_another_indentation():
+    hunks = make_patch(BROKEN, FIXED)
+    assert apply_patch(BROKEN, hunks) == FIXED
+    assert apply_patch(OTHER, hunks) == OTHER.replace("ShowCreation", "Create")
+    # 已修复的代码里找不到 before，补丁不适用
+    assert apply_patch(FIXED, hunks) is None
+
+
+def test_large_rewrites_and_ambiguous_anchors_are_not_patches():
+    rewrite = "\n".join(f"line_{i} = {i}" for i in range(20))
+    assert make_patch(BROKEN, rewrite) is None
+    hunks = make_patch(BROKEN, FIXED)
+    twice = BROKEN + "\n" + BROKEN.replace("Demo", "Again")
+    assert apply_patch(twice, hunks) is None
+
+
+def test_confirmed_fix_is_reused_for_the_same_error(tmp_path):
+    memo = FixMemo(path=tmp_path / "memo.json")
+    assert memo.lookup(BROKEN, ERROR) is None
+
+    memo.propose(BROKEN, ERROR, FIXED)
+    memo.record_outcome(FIXED, success=True)
+    assert memo.stats()["patches"] == 1
+
+    # 另一个进程读同一个文件
+    fixed_other = FixMemo(path=tmp_path / "memo.json").lookup(OTHER, OTHER_ERROR)
+    assert fixed_other == OTHER.replace("ShowCreation", "Create")
+
+
+def test_fix_that_fails_with_the_same_error_is_not_stored(tmp_path):
+    memo = FixMemo(path=tmp_path / "memo.json")
+    memo.propose(BROKEN, ERROR, FIXED)
+    memo.record_outcome(FIXED, success=False, error_msg=ERROR)
+    assert memo.stats()["entries"] == 0
+
+
+def test_patch_that_keeps_failing_is_evicted(tmp_path):
+    memo = FixMemo(path=tmp_path / "memo.json")
+    memo.propose(BROKEN, ERROR, FIXED)
+    memo.record_outcome(FIXED, success=True)
+
+    for _ in range(EVICT_FAILURES):
+        assert memo.stats()["patches"] == 1
+        reused = memo.lookup(OTHER, OTHER_ERROR)
+        memo.record_outcome(reused, success=False, error_msg=OTHER_ERROR)
+    assert memo.stats() == {"entries": 0, "patches": 0, "lookups": 2, "hits": 2, "hit_rate": 1.0}
+
+
+def test_disabled_memo_remembers_nothing(tmp_path):
+    memo = FixMemo(path=tmp_path / "memo.json", enabled=False)
+    memo.propose(BROKEN, ERROR, FIXED)
+    memo.record_outcome(FIXED, success=True)
+    assert memo.lookup(BROKEN, ERROR) is None
+    assert not (tmp_path / "memo.json").exists()
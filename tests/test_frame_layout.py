@@ -0,0 +1,46 @@
+import sys
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from frame_layout import analyze_frame
+
+
+WHITE = (255, 255, 255)
+YELLOW = (0, 255, 255)
+
+
+def _frame(*texts):
+    """A 720p black frame with each (text, (x, y), color) drawn into the grid area"""
+    frame = np.zeros((720, 1280, 3), np.uint8)
+    for text, origin, color in texts:
+        cv2.putText(frame, text, origin, cv2.FONT_HERSHEY_SIMPLEX, 2, color, 5, cv2.LINE_AA)
+    return frame
+
+
+def _overlaps(frame):
+    return [issue for issue in analyze_frame(frame, 1.0) if issue.kind == "overlap"]
+
+
+def test_separate_text_boxes_are_clean():
+    assert _overlaps(_frame(("Pythagoras", (700, 200), WHITE), ("Hypotenuse", (820, 400), WHITE))) == []
+
+
+def test_overlapping_text_boxes_of_different_colors_are_reported():
+    issues = _overlaps(_frame(("Pythagoras", (700, 300), YELLOW), ("Hypotenuse", (820, 330), WHITE)))
+    assert len(issues) == 1
+    assert sorted(issues[0].colors) == ["white", "yellow"]
+
+
+def test_overlapping_text_boxes_of_the_same_color_are_reported():
+    issues = _overlaps(_frame(("Pythagoras", (700, 300), WHITE), ("Hypotenuse", (820, 330), WHITE)))
+    assert len(issues) == 1
+    assert issues[0].colors == ["white", "white"]
+    assert "两个白色元素部分重叠" in issues[0].problem()
+
+
+def test_left_aligned_lines_of_the_same_color_are_not_split():
+    assert _overlaps(_frame(("Pythagoras", (700, 300), WHITE), ("Sides", (700, 360), WHITE))) == []
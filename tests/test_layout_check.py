@@ -0,0 +1,64 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from layout_check import check_layout
+
+
+SCENE = """
+from manim import *
+
+class Demo(TeachingScene):
+    def construct(self):
+{body}
+"""
+
+
+def _scene(*lines):
+    return SCENE.format(body="\n".join(" " * 8 + line for line in lines))
+
+
+def test_straight_line_placements_are_clean():
+    report = check_layout(_scene(
+        "a = Circle(radius=0.3)",
+        "self.place_at_grid(a, 'B2')",
+        "b = Circle(radius=0.3)",
+        "self.place_at_grid(b, 'D4')",
+        "self.play(Create(a), Create(b))",
+    ))
+    assert report.is_clean
+
+
+def test_overlap_is_reported():
+    report = check_layout(_scene(
+        "a = Circle(radius=0.3)",
+        "self.place_at_grid(a, 'B2')",
+        "b = Circle(radius=0.3)",
+        "self.place_at_grid(b, 'B2')",
+        "self.play(Create(a), Create(b))",
+    ))
+    assert not report.is_clean
+    assert [c.kind for c in report.conflicts] == ["overlap"]
+
+
+def test_placement_in_loop_is_unverified():
+    report = check_layout(_scene(
+        "for i in range(2):",
+        "    c = Circle(radius=0.3)",
+        "    self.place_at_grid(c, 'B2')",
+        "    self.play(Create(c))",
+    ))
+    assert not report.is_clean
+    assert "c" in report.unverified
+
+
+def test_placement_in_branch_is_unverified():
+    report = check_layout(_scene(
+        "c = Circle(radius=0.3)",
+        "if True:",
+        "    self.place_at_grid(c, 'B2')",
+        "self.play(Create(c))",
+    ))
+    assert not report.is_clean
+    assert "c" in report.unverified
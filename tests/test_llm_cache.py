@@ -0,0 +1,69 @@
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from llm_cache import LLMResponseCache
+
+
+def test_key_covers_everything_that_determines_the_response(tmp_path):
+    image = tmp_path / "grid.png"
+    image.write_bytes(b"one")
+    key = LLMResponseCache.make_key(model="gpt-4o", prompt="hi", media=[image], max_tokens=100, provider="gpt4o")
+
+    assert key == LLMResponseCache.make_key(model="gpt-4o", prompt="hi", media=[image], max_tokens=100, provider="gpt4o")
+    variants = [
+        dict(model="gpt-4o", prompt="hi", media=[image], max_tokens=100, provider="gpt4o", azure=True),
+        dict(model="gpt-4o", prompt="hi", media=[image], max_tokens=100, provider="gpt4omini"),
+        dict(model="gpt-4o-mini", prompt="hi", media=[image], max_tokens=100, provider="gpt4o"),
+        dict(model="gpt-4o", prompt="hello", media=[image], max_tokens=100, provider="gpt4o"),
+        dict(model="gpt-4o", prompt="hi", media=[image], max_tokens=200, provider="gpt4o"),
+        dict(model="gpt-4o", prompt="hi", media=[image], max_tokens=100, provider="gpt4o", temperature=0.4),
+    ]
+    assert len({LLMResponseCache.make_key(**v) for v in variants} | {key}) == len(variants) + 1
+
+    # 同一路径的文件内容变了，键也要变
+    image.write_bytes(b"two")
+    os.utime(image, ns=(0, 10**9))
+    assert key != LLMResponseCache.make_key(model="gpt-4o", prompt="hi", media=[image], max_tokens=100, provider="gpt4o")
+
+
+def test_put_get_and_stats(tmp_path):
+    cache = LLMResponseCache(cache_dir=tmp_path)
+    assert cache.get("ab" * 32) is None
+    cache.put("ab" * 32, ("answer", {"prompt_tokens": 3}))
+    assert cache.get("ab" * 32) == ("answer", {"prompt_tokens": 3})
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["writes"]) == (1, 1, 1)
+
+
+def test_corrupt_entry_is_a_miss_and_removed(tmp_path):
+    cache = LLMResponseCache(cache_dir=tmp_path)
+    cache.put("cd" * 32, "answer")
+    path = tmp_path / "cd" / f"{'cd' * 32}.pkl"
+    path.write_bytes(b"not a pickle")
+    assert cache.get("cd" * 32) is None
+    assert not path.exists()
+
+
+def test_disabled_cache_stores_nothing(tmp_path):
+    cache = LLMResponseCache(cache_dir=tmp_path, enabled=False)
+    cache.put("ef" * 32, "answer")
+    assert cache.get("ef" * 32) is None
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_eviction_drops_least_recently_used_entries(tmp_path):
+    cache = LLMResponseCache(cache_dir=tmp_path, max_bytes=10**9)
+    keys = [f"{i:02d}" * 32 for i in range(4)]
+    for age, key in enumerate(keys):
+        cache.put(key, "x" * 1000)
+        # 越早写入越旧；之后读一次 keys[0]，它就成了最近使用的
+        os.utime(tmp_path / key[:2] / f"{key}.pkl", (1000 + age, 1000 + age))
+    cache.get(keys[0])
+
+    cache.max_bytes = 2500
+    assert cache.evict() == 2
+    assert [cache.get(k) is not None for k in keys] == [True, False, False, True]
+    assert cache.stats()["evictions"] == 2
@@ -0,0 +1,97 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+import manim_index
+from local_fixer import LocalFixer
+from manim_index import ManimIndex
+
+
+SCENE = """from manim import *
+
+class Demo(Scene):
+    def construct(self):
+{body}
+"""
+
+
+def _scene(*lines):
+    return SCENE.format(body="\n".join(" " * 8 + line for line in lines))
+
+
+def _error(message, line=5):
+    return f'Traceback (most recent call last):\n  File "/tmp/scene.py", line {line}, in construct\n{message}'
+
+
+@pytest.fixture
+def index(monkeypatch):
+    """A tiny Manim API index in place of the one introspected from an installed manim"""
+    data = {
+        "names": {"Circle": {"kind": "class", "signature": "(radius=None, color=RED)"}},
+        "classes": {
+            "Circle": {
+                "methods": ["set_fill", "surround"], "bases": ["Mobject"], "params": ["color", "radius"], "params_closed": True
+            },
+            "Mobject": {"methods": ["move_to", "next_to", "shift"], "bases": [], "params": [], "params_closed": False},
+        },
+    }
+    monkeypatch.setattr(manim_index, "_INDEX", ManimIndex(data))
+
+
+def test_renamed_name_is_replaced():
+    code = _scene("c = Circle()", "self.play(ShowCreation(c))")
+    fixed, rule = LocalFixer().fix(code, _error("NameError: name 'ShowCreation' is not defined", 6))
+    assert rule == "renamed_api"
+    assert "self.play(Create(c))" in fixed
+
+
+def test_renamed_method_is_replaced():
+    code = _scene("ax = Axes()", "graph = ax.get_graph(lambda x: x ** 2)")
+    fixed, rule = LocalFixer().fix(code, _error("AttributeError: 'Axes' object has no attribute 'get_graph'", 6))
+    assert rule == "renamed_method"
+    assert "ax.plot(lambda x: x ** 2)" in fixed
+
+
+def test_missing_import_is_added():
+    code = _scene("xs = np.linspace(0, 1, 5)")
+    fixed, rule = LocalFixer().fix(code, _error("NameError: name 'np' is not defined"))
+    assert rule == "missing_import"
+    assert fixed.startswith("import numpy as np\n")
+
+
+def test_unknown_kwarg_is_dropped():
+    code = _scene("c = Circle(radius=1, glow=True)")
+    error = _error("TypeError: Circle.__init__() got an unexpected keyword argument 'glow'")
+    fixed, rule = LocalFixer().fix(code, error)
+    assert rule == "unexpected_kwarg"
+    assert "c = Circle(radius=1)" in fixed
+
+
+def test_one_letter_typo_in_a_short_name_is_corrected():
+    code = _scene("t = Txet('hi')")
+    fixed, rule = LocalFixer().fix(code, _error("NameError: name 'Txet' is not defined"))
+    assert rule == "misspelled_name"
+    assert "t = Text('hi')" in fixed
+
+
+def test_misspelled_method_and_kwarg_are_corrected(index):
+    code = _scene("c = Circle(radius=1)", "c.sift(UP)")
+    fixed, rule = LocalFixer().fix(code, _error("AttributeError: 'Circle' object has no attribute 'sift'", 6))
+    assert rule == "misspelled_method"
+    assert "c.shift(UP)" in fixed
+
+    code = _scene("c = Circle(radus=1)")
+    error = _error("TypeError: Circle.__init__() got an unexpected keyword argument 'radus'")
+    fixed, rule = LocalFixer().fix(code, error)
+    assert "c = Circle(radius=1)" in fixed
+
+
+def test_fix_is_attributed_to_its_rule():
+    fixer = LocalFixer()
+    fixed, rule = fixer.fix(_scene("self.play(ShowCreation(Circle()))"), _error("NameError: name 'ShowCreation' is not defined"))
+    fixer.record_outcome(fixed, success=True)
+    assert fixer.stats()["succeeded"] == {rule: 1}
+    assert fixer.fix(_scene("self.wait()"), _error("ZeroDivisionError: division by zero")) is None
@@ -0,0 +1,74 @@
+import json
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from rate_limiter import TokenBucketRateLimiter, estimate_tokens
+
+
+def _state(limiter):
+    with open(limiter.state_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _age(limiter, seconds):
+    """Pretend the bucket was last updated `seconds` ago"""
+    state = _state(limiter)
+    state["updated"] -= seconds
+    with open(limiter.state_path, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+
+
+def test_unlimited_provider_never_waits(tmp_path):
+    limiter = TokenBucketRateLimiter("svc", state_dir=tmp_path)
+    assert not limiter.enabled
+    assert limiter.acquire(10**6) == 0.0
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_empty_bucket_waits_and_refills(tmp_path):
+    limiter = TokenBucketRateLimiter("svc", rpm=2, state_dir=tmp_path)
+    assert limiter._try_acquire(0) == 0
+    assert limiter._try_acquire(0) == 0
+    # 每分钟 2 个请求：桶空后要等约 30 秒才有下一个
+    assert limiter._try_acquire(0) == pytest.approx(30, abs=1)
+
+    _age(limiter, 30)
+    assert limiter._try_acquire(0) == 0
+    _age(limiter, 600)
+    assert limiter._load(time.time())["requests"] == 2  # 最多攒一分钟的配额
+
+
+def test_token_budget_and_usage_settlement(tmp_path):
+    limiter = TokenBucketRateLimiter("svc", tpm=1000, state_dir=tmp_path)
+    assert limiter.acquire(800) == 0
+    assert limiter._try_acquire(800) == pytest.approx(36, abs=1)
+
+    # 预估 800，实际只用了 300：退还 500
+    limiter.record_usage(800, 300)
+    assert _state(limiter)["tokens"] == pytest.approx(700, abs=1)
+    # 比整桶还大的请求按整桶计，不会永远等下去
+    assert limiter._clamp(10**6) == 1000
+
+
+def test_429_blocks_every_worker_until_retry_after(tmp_path):
+    limiter = TokenBucketRateLimiter("svc", rpm=60, state_dir=tmp_path)
+    limiter.penalize(5)
+    assert limiter._try_acquire(0) == pytest.approx(5, abs=0.5)
+    # 另一个进程的限流器读写同一个状态文件
+    other = TokenBucketRateLimiter("svc", rpm=60, state_dir=tmp_path)
+    assert other._try_acquire(0) == pytest.approx(5, abs=0.5)
+    # 被挡住的请求不扣配额
+    assert _state(limiter)["requests"] == pytest.approx(60, abs=0.5)
+
+
+def test_estimate_counts_text_media_and_completion_budget():
+    messages = [
+        {"role": "system", "content": "x" * 100},
+        {"role": "user", "content": [{"type": "text", "text": "y" * 50}, {"type": "image_url", "image_url": {}}]},
+    ]
+    assert estimate_tokens(messages, max_tokens=200) == (100 + 50 + 2000) // 2 + 200
@@ -0,0 +1,49 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from render_budget import EWMA_ALPHA, MIN_SAMPLES, STARTUP_SECONDS, RenderBudget
+
+
+def test_default_timeout_until_enough_samples(tmp_path):
+    budget = RenderBudget(path=tmp_path / "stats.json")
+    for _ in range(MIN_SAMPLES - 1):
+        budget.record("l", animations=10, seconds=STARTUP_SECONDS + 20)
+        assert budget.expected_seconds("l", 10) is None
+        assert budget.timeout("l", 10, default=600) == 600
+
+    budget.record("l", animations=10, seconds=STARTUP_SECONDS + 20)
+    assert budget.expected_seconds("l", 10) == pytest.approx(STARTUP_SECONDS + 20)
+    assert budget.expected_seconds("h", 10) is None
+
+
+def test_speed_is_an_ewma_shared_through_the_stats_file(tmp_path):
+    budget = RenderBudget(path=tmp_path / "stats.json")
+    for _ in range(MIN_SAMPLES):
+        budget.record("l", animations=10, seconds=STARTUP_SECONDS + 10)  # 1 秒/动画
+    budget.record("l", animations=10, seconds=STARTUP_SECONDS + 30)  # 3 秒/动画
+
+    per_animation = 1 + EWMA_ALPHA * (3 - 1)
+    other = RenderBudget(path=tmp_path / "stats.json")
+    assert other.expected_seconds("l", 5) == pytest.approx(STARTUP_SECONDS + 5 * per_animation)
+
+
+def test_timeout_is_slack_times_expected_within_bounds(tmp_path):
+    budget = RenderBudget(path=tmp_path / "stats.json", slack=3.0, min_timeout=60)
+    for _ in range(MIN_SAMPLES):
+        budget.record("l", animations=1, seconds=STARTUP_SECONDS + 5)
+
+    assert budget.timeout("l", 10, default=600) == pytest.approx(3.0 * (STARTUP_SECONDS + 50))
+    assert budget.timeout("l", 1, default=600) == 60  # 不低于 min_timeout
+    assert budget.timeout("l", 1000, default=600) == 600  # 不超过调用方的固定超时
+
+
+def test_disabled_budget_records_nothing(tmp_path):
+    budget = RenderBudget(path=tmp_path / "stats.json", enabled=False)
+    for _ in range(MIN_SAMPLES):
+        budget.record("l", animations=10, seconds=100)
+    assert budget.timeout("l", 10, default=600) == 600
+    assert not (tmp_path / "stats.json").exists()
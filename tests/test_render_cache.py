@@ -0,0 +1,59 @@
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from render_cache import RenderCache
+
+
+CODE = """
+class Demo(Scene):
+    def construct(self):
+        icon = ImageMobject("car.png")
+        self.add(icon)
+"""
+
+
+def test_key_ignores_formatting_but_not_code_scene_or_quality(tmp_path):
+    key = RenderCache.make_key(CODE, "Demo", "l", tmp_path)
+    reformatted = "# 注释\n" + CODE.replace("self.add(icon)", "self.add( icon )  # 显示图标")
+    assert RenderCache.make_key(reformatted, "Demo", "l", tmp_path) == key
+    assert RenderCache.make_key(CODE.replace("add", "remove"), "Demo", "l", tmp_path) != key
+    assert RenderCache.make_key(CODE, "Other", "l", tmp_path) != key
+    assert RenderCache.make_key(CODE, "Demo", "h", tmp_path) != key
+
+
+def test_key_changes_when_an_asset_changes(tmp_path):
+    icon = tmp_path / "car.png"
+    icon.write_bytes(b"v1")
+    key = RenderCache.make_key(CODE, "Demo", "l", tmp_path)
+    icon.write_bytes(b"v2")
+    os.utime(icon, ns=(0, 10**9))
+    assert RenderCache.make_key(CODE, "Demo", "l", tmp_path) != key
+
+
+def test_hit_until_the_video_is_rewritten_or_removed(tmp_path):
+    cache = RenderCache(cache_dir=tmp_path / "cache")
+    video = tmp_path / "Demo.mp4"
+    video.write_bytes(b"frames")
+    key = RenderCache.make_key(CODE, "Demo", "l", tmp_path)
+
+    assert cache.get(key) is None
+    cache.put(key, video)
+    assert cache.get(key) == str(video.resolve())
+
+    video.write_bytes(b"other frames")
+    assert cache.get(key) is None
+    video.unlink()
+    assert cache.get(key) is None
+    assert (cache.stats()["hits"], cache.stats()["misses"]) == (1, 3)
+
+
+def test_disabled_cache_never_hits(tmp_path):
+    cache = RenderCache(cache_dir=tmp_path / "cache", enabled=False)
+    video = tmp_path / "Demo.mp4"
+    video.write_bytes(b"frames")
+    cache.put("ab" * 32, video)
+    assert cache.get("ab" * 32) is None
+    assert not (tmp_path / "cache").exists()
@@ -0,0 +1,83 @@
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from run_manifest import RunManifest, atomic_write_json, content_hash
+
+
+def test_completed_stage_is_fresh_until_inputs_or_outputs_change(tmp_path):
+    outline = tmp_path / "outline.json"
+    outline.write_text('{"sections": []}', encoding="utf-8")
+    manifest = RunManifest(tmp_path)
+    inputs = content_hash("topic", "prompt v1")
+
+    manifest.begin("outline", inputs)
+    assert not manifest.is_fresh("outline", inputs, [outline])
+    manifest.complete("outline", inputs, [outline])
+    assert manifest.is_fresh("outline", inputs, [outline])
+    assert manifest.entry("outline")["outputs"] == {"outline.json": manifest._digests([outline])["outline.json"]}
+
+    # 上游输入变了
+    assert not manifest.is_fresh("outline", content_hash("topic", "prompt v2"), [outline])
+    # 输出被改写或删除
+    outline.write_text('{"sections": [1]}', encoding="utf-8")
+    assert not manifest.is_fresh("outline", inputs, [outline])
+    outline.unlink()
+    assert not manifest.is_fresh("outline", inputs, [outline])
+
+
+def test_rewritten_outputs_stay_fresh_once_recorded(tmp_path):
+    code = tmp_path / "section_1.py"
+    code.write_text("broken", encoding="utf-8")
+    manifest = RunManifest(tmp_path)
+    manifest.complete("code:section_1", "h", [code])
+
+    code.write_text("fixed", encoding="utf-8")
+    manifest.update_outputs("code:section_1", [code])
+    assert manifest.is_fresh("code:section_1", "h", [code])
+
+
+def test_failed_stage_is_not_fresh_and_completion_clears_the_error(tmp_path):
+    video = tmp_path / "section_1.mp4"
+    video.write_bytes(b"frames")
+    manifest = RunManifest(tmp_path)
+
+    manifest.begin("render:section_1", "h")
+    manifest.fail("render:section_1", "h", RuntimeError("manim crashed"))
+    assert manifest.entry("render:section_1")["error"] == "manim crashed"
+    assert not manifest.is_fresh("render:section_1", "h", [video])
+
+    manifest.begin("render:section_1", "h")
+    manifest.complete("render:section_1", "h", [video])
+    entry = manifest.entry("render:section_1")
+    assert entry["status"] == "done" and "error" not in entry
+    assert entry["duration"] >= 0
+
+
+def test_legacy_directory_adopts_existing_outputs_once(tmp_path):
+    outline = tmp_path / "outline.json"
+    outline.write_text("{}", encoding="utf-8")
+    manifest = RunManifest(tmp_path)
+    assert manifest.legacy
+
+    assert not manifest.is_fresh("storyboard", "h", [tmp_path / "storyboard.json"])
+    assert manifest.is_fresh("outline", "h", [outline])
+    assert manifest.entry("outline")["status"] == "done"
+    # 写出 manifest.json 之后就不再是旧目录
+    assert not RunManifest(tmp_path).legacy
+
+
+def test_new_directory_does_not_adopt(tmp_path):
+    (tmp_path / "notes.txt").write_text("x", encoding="utf-8")
+    manifest = RunManifest(tmp_path)
+    assert not manifest.legacy
+    assert not manifest.is_fresh("outline", "h", [tmp_path / "notes.txt"])
+
+
+def test_atomic_write_leaves_no_temp_files(tmp_path):
+    atomic_write_json(tmp_path / "data.json", {"知识点": 1})
+    assert json.loads((tmp_path / "data.json").read_text(encoding="utf-8")) == {"知识点": 1}
+    assert [p.name for p in tmp_path.iterdir()] == ["data.json"]
+    assert content_hash({"a": 1, "b": 2}) == content_hash({"b": 2, "a": 1})